@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait as wait_futures
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ===============================================
+# Gemini 策略分析 (磁碟快取、共用 client、非同步佇列)
+# ===============================================
+MODEL_ID = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+# 回應依提示內容的雜湊存到 AI_CACHE_DIR，同樣的標的 / 期間 / 矩陣在 TTL 內不會重複呼叫
+AI_CACHE_DIR = os.getenv("AI_CACHE_DIR", ".ai_cache")
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL_HOURS", "168")) * 3600
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", "120"))
+# 同時進行的 AI 請求上限 (批次回測整個清單時避免一次送出過多請求)
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "4"))
+# 可用 GEMINI_BASE_URL 指向本地的假模型伺服器做測試
+BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+HINT = "提示：如需 AI 自動化分析，請在 .env 中設定 GEMINI_API_KEY 並安裝 google-genai。"
+
+_client = None
+_executor = None
+_lock = threading.Lock()
+
+
+def build_prompt(stock_code, period, matrix_text, best_b, roi_a):
+    return f"""
+你是一位專業、客觀且具備深厚實戰經驗的「首席量化策略官 (Chief Investment Officer)」。
+請針對以下這檔股票的 2D 門檻優化獲利矩陣進行深度分析。
+
+【交易環境】
+- 股票代碼: {stock_code}
+- 測試期間: {period}
+- 基準報酬 (Strategy A - 長期持有): {roi_a:.1f}%
+- 最佳波段組合報酬 (Strategy B): {best_b:.1f}%
+
+【策略邏輯提醒】
+- 買入門檻 (Buy_t)：當股價自最近「谷底」回升 X% 時買入。
+- 賣出門檻 (Sell_t)：當股價自買入後的「高峰」回落 Y% 時賣出。
+
+【獲利矩陣數據 (買進入門檻 \\ 賣出門檻)】
+{matrix_text}
+(註：標註 * 代表該組合「勝過」長期持有報酬率)
+
+【請提供專業且具建設性的策略分析 (繁體中文)】：
+1. **策略價值評估 (Alpha vs Beta)**：
+   - 觀察最佳組合 B 與基準 A 的差異。
+   - **空頭市場特別注意**：如果 A 是大賠，而 B 能減輕虧損甚至轉正，代表策略具有極佳的「避險/防禦價值」，請給予肯定分析。
+   - **多頭市場特別注意**：B 是否能有效放大獲益，還是只是被動隨大盤上漲。
+2. **參數平原與穩健性診斷**：
+   - 觀察 * 標記的分佈。如果是「整片聚集 (Plateau)」，代表策略具備高容錯率與實戰價值；如果是「零星散佈 (Islands)」，請警告過度擬合 (Overfitting) 的風險。
+3. **最終實戰結論與建議**：
+   - 總結這檔股票的股性（波動大、適合趨勢跟隨，還是穩健增長適合存股）。
+   - 給出具體的參數建議或風險提示。如果策略確實無效，請坦誠建議維持長期持有。
+"""
+
+
+def format_matrix(buy_thresholds, sell_thresholds, grid, roi_a, dec=0):
+    """Matrix text in the format of the --optimize output (報酬%(交易次數), * = beats A), used as prompt input."""
+    header = "買\\賣 | " + " | ".join([f"{t*100:>7.{dec}f}%" for t in sell_thresholds])
+    lines = [header, "-" * (8 + len(sell_thresholds)*11)]
+    k = 0
+    for bt in buy_thresholds:
+        row_str = f"{bt*100:>3.{dec}f}%  | "
+        for _ in sell_thresholds:
+            val = (grid['final'][k]/10000 - 1) * 100
+            mark = "*" if val > roi_a else " "
+            cell = f"{val:>3.0f}%({grid['trades'][k]:>2}){mark}" if grid['trades'][k] >= 0 else f"{'--':>4}"
+            row_str += f"{cell:<8}| "
+            k += 1
+        lines.append(row_str)
+    return "\n".join(lines) + "\n"
+
+
+def cache_key(prompt, model=MODEL_ID):
+    return hashlib.blake2b(f"{model}\n{prompt}".encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(AI_CACHE_DIR, f"{key}.json")
+
+
+def cache_get(key, ttl=AI_CACHE_TTL):
+    """Returns the cached response text, or None when missing or older than `ttl` seconds."""
+    try:
+        with open(_cache_path(key), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - entry.get('created', 0) > ttl:
+        return None
+    return entry.get('text')
+
+
+def cache_put(key, text, model=MODEL_ID):
+    os.makedirs(AI_CACHE_DIR, exist_ok=True)
+    tmp = _cache_path(key) + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'created': time.time(), 'model': model, 'text': text}, f, ensure_ascii=False)
+    os.replace(tmp, _cache_path(key))
+
+
+def get_client():
+    """Returns the shared genai.Client (created once; honours GEMINI_BASE_URL), or None without key / SDK."""
+    global _client
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return None
+    with _lock:
+        if _client is None:
+            # New Gemini SDK (google-genai)，只在真的要呼叫時才載入
+            try:
+                from google import genai
+            except ImportError:
+                return None
+            http_options = {'timeout': int(AI_TIMEOUT * 1000)}
+            if BASE_URL:
+                http_options['base_url'] = BASE_URL
+            _client = genai.Client(api_key=api_key, http_options=http_options)
+    return _client
+
+
+def get_ai_analysis(stock_code, period, matrix_text, best_b, roi_a, ttl=AI_CACHE_TTL):
+    """Returns the Gemini analysis text, served from the disk cache when the same prompt was answered within `ttl`."""
+    prompt = build_prompt(stock_code, period, matrix_text, best_b, roi_a)
+    key = cache_key(prompt)
+    cached = cache_get(key, ttl)
+    if cached is not None:
+        return cached
+
+    client = get_client()
+    if client is None:
+        return HINT
+    try:
+        response = client.models.generate_content(
+            model=MODEL_ID,
+            contents=prompt
+        )
+        text = response.text
+    except Exception as e:
+        return f"AI 分析失敗: {str(e)}"
+    # 只快取成功的回應
+    if text:
+        cache_put(key, text)
+    return text
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=AI_CONCURRENCY, thread_name_prefix="ai")
+    return _executor
+
+
+def warm_up():
+    """
+    Loads the SDK and creates the client on the shared pool, so the import
+    (about 0.6 s) overlaps the computation that produces the prompt.
+    """
+    return _get_executor().submit(get_client)
+
+
+def submit_analysis(stock_code, period, matrix_text, best_b, roi_a):
+    """Queues get_ai_analysis on the shared pool (at most AI_CONCURRENCY in flight) and returns its Future."""
+    return _get_executor().submit(get_ai_analysis, stock_code, period, matrix_text, best_b, roi_a)
+
+
+def wait(future, timeout=AI_TIMEOUT):
+    """
+    Result of a submitted analysis; a timeout becomes a message instead of an
+    exception. Only a request still queued behind AI_CONCURRENCY is dropped: a
+    request already in flight cannot be interrupted from here and ends at the
+    client's own HTTP timeout (also AI_TIMEOUT, see get_client).
+    """
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        # cancel() 對已在執行的請求無效，只會移除還在佇列中的請求
+        future.cancel()
+        return f"AI 分析逾時 (超過 {timeout:g} 秒)"
+
+
+def wait_all(futures, timeout=AI_TIMEOUT):
+    """
+    Results of several submitted analyses ({key: future} -> {key: text}) under
+    one shared deadline, so the worst case is `timeout` rather than one timeout
+    per future. Unfinished requests are handled as in wait().
+    """
+    done, _ = wait_futures(futures.values(), timeout=timeout)
+    results = {}
+    for key, future in futures.items():
+        if future in done:
+            results[key] = future.result()
+        else:
+            future.cancel()
+            results[key] = f"AI 分析逾時 (超過 {timeout:g} 秒)"
+    return results
@@ -0,0 +1,62 @@
+import os
+import json
+from datetime import datetime
+
+# ===============================================
+# 跨次執行的標的狀態記錄 (只通知狀態變化)
+# ===============================================
+# 狀態檔位置可由環境變數 ALERT_STATE_FILE 覆寫
+STATE_FILE = os.getenv("ALERT_STATE_FILE", ".alert_state.json")
+
+# 下載或計算失敗只是暫時狀況，不覆寫上次記錄的狀態，也不視為狀態改變
+TRANSIENT_STATUSES = ("資料下載異常", "計算失敗")
+
+
+def state_key(item):
+    return f"{item['ticker']}|{item['name']}"
+
+
+def load_state(path=None):
+    """Returns {key: {"status", "price", "updated"}} from the last run, or {} if none."""
+    path = path or STATE_FILE
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"讀取狀態檔 '{path}' 失敗，視為首次執行: {e}")
+        return {}
+
+
+def save_state(state, path=None):
+    path = path or STATE_FILE
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def is_transition(state, item, status_tag):
+    """
+    True if the status differs from the last run. A ticker seen for the first time
+    only counts when it is not "正常", so a fresh state file does not flood the topic.
+    Transient statuses never count, so a failed download does not alert on every run.
+    """
+    if status_tag in TRANSIENT_STATUSES:
+        return False
+    previous = state.get(state_key(item))
+    if previous is None:
+        return status_tag != "正常"
+    return previous["status"] != status_tag
+
+
+def record(state, item, status_tag, price=None):
+    """Stores the status for the next run; transient statuses keep the previous record."""
+    if status_tag in TRANSIENT_STATUSES:
+        return
+    state[state_key(item)] = {
+        "status": status_tag,
+        "price": None if price is None else float(price),
+        "updated": datetime.now().isoformat(timespec='seconds')
+    }
@@ -0,0 +1,191 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import ai_analysis
+import charts
+import data_cache
+import data_provider
+import engine
+import profiling
+import results_store
+from data_provider import parse_date
+from engine import normalize_ticker
+from optimizer import DEFAULT_RANGE, build_thresholds, optimize_grid, pct_decimals
+from stock_monitor import load_stock_list
+from strategy_kernel import HoldStrategy, TrendStrategy, as_close_array, run_strategies, run_trend_kernel
+
+# ===============================================
+# 全清單批次回測 (依 stock_monitor 的股票設定)
+# ===============================================
+
+
+def backtest_one(item, close, buy_thresholds, sell_thresholds, optimize=True, initial_capital=10000, matrix=False,
+                 dates=None, chart_dir=None, results_db=None):
+    """
+    Runs Strategy A, Strategy B at the configured (rec, drop) thresholds and,
+    optionally, the threshold grid for one ticker. Returns one result row;
+    with `matrix` it also carries the grid as 'matrix_text' for the AI analysis.
+    With `chart_dir` (and the bar `dates`) the equity chart is rendered here,
+    inside the worker process. With `results_db` the grid goes through the
+    results store, each worker opening its own connection.
+    """
+    ticker = item['ticker']
+    costs = engine.fee_model(ticker)
+    fee, tax, slippage = costs['fee'], costs['tax'], costs['slippage']
+    # 設定檔中 rec = 自谷底回升 % (買入)，drop = 自高點回落 % (賣出)
+    buy_t = item['rec'] / 100.0
+    sell_t = item['drop'] / 100.0
+
+    res_a, res_b = run_strategies(close, [HoldStrategy(), TrendStrategy(buy_t, sell_t)], costs['buy_cost'],
+                                  costs['sell_keep'], initial_capital=initial_capital,
+                                  record_equity=chart_dir is not None)
+    final_a = float(res_a['final'])
+
+    row = {
+        'name': item['name'],
+        'ticker': ticker,
+        'bars': len(close),
+        'roi_a': (final_a / initial_capital - 1) * 100,
+        'buy_t': buy_t,
+        'sell_t': sell_t,
+        'roi_b': (float(res_b['final']) / initial_capital - 1) * 100,
+        'trans_b': int(res_b['trades'])
+    }
+
+    if optimize:
+        store = None
+        if results_db:
+            store = results_store.cell_store(results_store.connect(results_db), ticker, 'b', [close], fee, tax, dates,
+                                             slippage)
+        grid = optimize_grid(close, buy_thresholds, sell_thresholds, fee, tax, workers=1, progress=False, store=store)
+        if store:
+            store.conn.close()
+        best = int(np.argmax(grid['final']))
+        row.update({
+            'best_buy_t': grid['buy'][best],
+            'best_sell_t': grid['sell'][best],
+            'best_roi_b': (grid['final'][best] / initial_capital - 1) * 100,
+            'best_trans_b': int(grid['trades'][best]),
+            'plateau_pct': float(np.mean(grid['final'] > final_a) * 100)
+        })
+        if matrix:
+            dec = max(pct_decimals(buy_thresholds), pct_decimals(sell_thresholds))
+            row['matrix_text'] = ai_analysis.format_matrix(buy_thresholds, sell_thresholds, grid, row['roi_a'], dec)
+
+    if chart_dir is not None:
+        series = [
+            ('Strategy A (Hold)', res_a['equity'], {'alpha': 0.5}),
+            (f'Strategy B ({buy_t*100:.1f}%/{sell_t*100:.1f}%)', res_b['equity'], {})
+        ]
+        if optimize:
+            best_b = run_trend_kernel(close, row['best_buy_t'], row['best_sell_t'], fee, tax, slippage=slippage,
+                                      initial_capital=initial_capital, record_equity=True)
+            series.append((f"Best B ({row['best_buy_t']*100:.1f}%/{row['best_sell_t']*100:.1f}%)",
+                           best_b['equity'], {'linestyle': '--'}))
+        row['chart'] = charts.render_equity(charts.chart_path(ticker, chart_dir), dates, series, f"Backtest: {ticker}")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch backtest for every ticker in STOCK_CONFIG_JSON / stock_list.txt')
+    parser.add_argument('--start', type=str, help='Start date (YYYY-MM-DD), defaults to 5 years before end date')
+    parser.add_argument('--end', type=str, help='End date (YYYY-MM-DD), defaults to today')
+    parser.add_argument('--buy_range', type=float, nargs=3, default=list(DEFAULT_RANGE), metavar=('MIN', 'MAX', 'STEP'),
+                        help='Buy threshold grid for the optimization')
+    parser.add_argument('--sell_range', type=float, nargs=3, default=list(DEFAULT_RANGE), metavar=('MIN', 'MAX', 'STEP'),
+                        help='Sell threshold grid for the optimization')
+    parser.add_argument('--no_optimize', action='store_true', help='Only run the configured thresholds')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (default: all cores)')
+    parser.add_argument('--output', type=str, default='backtest_batch_results.csv', help='Consolidated results CSV')
+    parser.add_argument('--ai', action='store_true', help='Queue a Gemini analysis of every ticker\'s grid (at most AI_CONCURRENCY at once)')
+    parser.add_argument('--ai_output', type=str, default='backtest_batch_ai.md', help='File collecting the AI analyses')
+    parser.add_argument('--charts', type=str, nargs='?', const=charts.CHART_DIR, default=None, metavar='DIR',
+                        help='Render backtest_result_<ticker>.png for every ticker in the worker processes')
+    parser.add_argument('--results_db', type=str, default=results_store.RESULTS_DB,
+                        help='SQLite results store; grid cells already computed on the same data are reused')
+    parser.add_argument('--no_store', action='store_true', help='Do not read or write the results store')
+    data_provider.add_provider_argument(parser)
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiling.setup(args)
+    if args.provider:
+        data_provider.set_provider(args.provider)
+
+    end_dt = parse_date(args.end) if args.end else datetime.now()
+    start_dt = parse_date(args.start) if args.start else (end_dt - timedelta(days=5*365))
+    if not end_dt or not start_dt:
+        print(f"錯誤: 無法解析日期 '{args.start}' / '{args.end}'")
+        return
+
+    stocks = load_stock_list()
+    if not stocks:
+        return
+    for item in stocks:
+        item['ticker'] = normalize_ticker(item['ticker'])
+
+    tickers = [s['ticker'] for s in stocks]
+    print(f"正在抓取 {len(tickers)} 支標的數據 ({start_dt.date()} ~ {end_dt.date()})...")
+    frames = data_cache.load_many(tickers, start=start_dt, end=end_dt)
+
+    buy_thresholds = build_thresholds(*args.buy_range)
+    sell_thresholds = build_thresholds(*args.sell_range)
+    workers = args.workers or os.cpu_count() or 1
+
+    rows = []
+    use_ai = args.ai and not args.no_optimize
+    period = f"{start_dt.date()}~{end_dt.date()}"
+    ai_futures = {}
+    with profiling.phase('batch_backtest'), ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for item in stocks:
+            df = frames.get(item['ticker'])
+            if df is None or len(df) < 2:
+                print(f"警告：{item['name']} ({item['ticker']}) 沒有足夠資料，略過。")
+                continue
+            futures[pool.submit(backtest_one, item, as_close_array(df), buy_thresholds,
+                                sell_thresholds, not args.no_optimize, matrix=use_ai,
+                                dates=df.index.to_numpy(), chart_dir=args.charts,
+                                results_db=None if args.no_store else args.results_db)] = item
+        for k, future in enumerate(as_completed(futures), 1):
+            item = futures[future]
+            try:
+                row = future.result()
+                rows.append(row)
+                print(f"  [{k}/{len(futures)}] {item['name']} ({item['ticker']}) 完成")
+                # 每支標的算完就排入 AI 佇列，與其餘標的的回測同時進行
+                if use_ai:
+                    ai_futures[row['ticker']] = ai_analysis.submit_analysis(
+                        row['ticker'], period, row.pop('matrix_text'), row['best_roi_b'], row['roi_a'])
+            except Exception as e:
+                print(f"  [{k}/{len(futures)}] {item['name']} ({item['ticker']}) 失敗: {e}")
+
+    if not rows:
+        print("沒有任何回測結果。")
+        return
+
+    order = {t: i for i, t in enumerate(tickers)}
+    result = pd.DataFrame(sorted(rows, key=lambda r: order[r['ticker']]))
+    result.to_csv(args.output, index=False, encoding='utf-8-sig')
+
+    print("\n" + result.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    print(f"\n結果已儲存至: {args.output}")
+
+    if ai_futures:
+        print(f"\n正在等待 {len(ai_futures)} 份 Gemini AI 分析...")
+        # 所有分析共用同一個截止時間，最慢只等 AI_TIMEOUT 秒而不是每份各等一次
+        with profiling.phase('ai_analysis'):
+            reports = ai_analysis.wait_all(ai_futures)
+        with open(args.ai_output, 'w', encoding='utf-8') as f:
+            for row in result.itertuples():
+                if row.ticker in reports:
+                    f.write(f"## {row.name} ({row.ticker})\n\n{reports[row.ticker]}\n\n")
+        print(f"AI 分析已儲存至: {args.ai_output}")
+
+
+if __name__ == "__main__":
+    main()
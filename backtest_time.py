@@ -1,112 +1,175 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
-from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
-def run_backtest(df, stock_code, buy_threshold=0.1, sell_threshold=0.1, initial_capital=10000):
+import data_cache
+import data_provider
+import profiling
+import results_store
+from data_provider import parse_date
+from engine import market_costs, normalize_ticker
+from optimizer import DEFAULT_RANGE, build_thresholds
+from rolling import STEPS, run_rolling, window_bounds, window_ranges
+from strategy_kernel import as_close_array, threshold_grid
+
+def walk_forward(df_full, stock, ranges, end_all, buy_thresholds, sell_thresholds,
+                 test_length, workers=None, conn=None):
     """
-    精簡版回測邏輯，包含 0.1% 滑價與期末清算
+    Optimizes the (buy_t, sell_t) grid on every training window, applies the best
+    pair to the window that follows it and returns (one row per test window with
+    the in-sample and out-of-sample ROI, training windows reused). With a results
+    database `conn`, training grids already evaluated on the same prices are reused.
     """
-    if df.empty or len(df) < 2:
-        return None
+    close = as_close_array(df_full)
+    fee, tax = market_costs(stock)
+    test_ranges = [(end, end + test_length) for _, end in ranges]
+    i0, i1 = window_bounds(df_full.index, ranges)
+    t0, t1 = window_bounds(df_full.index, test_ranges)
+    valid = ((i1 - i0) > 20) & ((t1 - t0) >= 2) & np.array([r[1] <= end_all for r in test_ranges], dtype=bool)
+    if not valid.any():
+        return [], 0
 
-    is_taiwan = ".TW" in stock_code or ".TWO" in stock_code
-    if is_taiwan:
-        trading_fee_rate = 0.001425 * 0.65
-        sell_tax_rate = 0.003
+    buy_grid, sell_grid = threshold_grid(buy_thresholds, sell_thresholds)
+    train = lambda a, b: run_rolling(close, a, b, buy_grid, sell_grid, fee, tax, workers=workers)
+    if conn is None:
+        grid, cached = train(i0[valid], i1[valid]), 0
     else:
-        trading_fee_rate = 0.005
-        sell_tax_rate = 0.0
-
-    slippage = 0.001 # 0.1% 滑價
-
-    # Strategy A: Buy and Hold
-    first_price = float(df['Close'].iloc[0])
-    last_price = float(df['Close'].iloc[-1])
-    shares_a = (initial_capital / (1 + trading_fee_rate + slippage)) / first_price
-    final_a = (shares_a * last_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
-
-    # Strategy B: Trend Following
-    cap_b = initial_capital
-    shares_b = (cap_b / (1 + trading_fee_rate + slippage)) / first_price
-    cap_b = 0
-    in_pos_b = True
-    peak_price = first_price
-    valley_price = first_price
-    
-    for _, row in df.iterrows():
-        current_price = float(row['Close'])
-        if in_pos_b:
-            if current_price > peak_price: peak_price = current_price
-            if current_price <= peak_price * (1 - sell_threshold):
-                sell_proceeds = shares_b * current_price
-                cap_b = sell_proceeds * (1 - trading_fee_rate - sell_tax_rate - slippage)
-                shares_b = 0
-                in_pos_b = False
-                valley_price = current_price
-        else:
-            if current_price < valley_price: valley_price = current_price
-            if current_price >= valley_price * (1 + buy_threshold):
-                cap_b = (cap_b / (1 + trading_fee_rate + slippage))
-                shares_b = cap_b / current_price
-                cap_b = 0
-                in_pos_b = True
-                peak_price = current_price
-
-    final_val_b = cap_b
-    if in_pos_b:
-        final_val_b = (shares_b * last_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
-
-    return {
-        'roi_a': (final_a / initial_capital - 1) * 100,
-        'roi_b': (final_val_b / initial_capital - 1) * 100
-    }
+        grid, cached = results_store.incremental_rolling(conn, stock, close, df_full.index, i0[valid], i1[valid],
+                                                         buy_grid, sell_grid, fee, tax, train)
+    roi_grid = grid['roi_b']
+    best = np.argmax(roi_grid, axis=1)
+    best_bt, best_st = buy_grid[best], sell_grid[best]
+    oos = run_rolling(close, t0[valid], t1[valid], best_bt, best_st, fee, tax, workers=workers, per_window=True)
+
+    rows = []
+    kept = [(r, t) for r, t, v in zip(ranges, test_ranges, valid) if v]
+    for k, ((train_start, _), (test_start, _)) in enumerate(kept):
+        rows.append({
+            'train_start': train_start,
+            'test_start': test_start,
+            'buy_t': best_bt[k],
+            'sell_t': best_st[k],
+            'roi_is': roi_grid[k, best[k]],
+            'roi_a': oos['roi_a'][k],
+            'roi_b': oos['roi_b'][k],
+            'win': oos['roi_b'][k] > oos['roi_a'][k]
+        })
+    return rows, cached
+
+def print_walk_forward(rows, cached, date_fmt, tiled):
+    print("\n" + "="*84)
+    print(f"{'訓練起點':<8} | {'測試起點':<8} | {'最佳門檻 買/賣':>10} | {'樣本內 B':>8} | {'樣本外 A':>8} | {'樣本外 B':>8} | 勝負")
+    print("-" * 84)
+    for r in rows:
+        pair = f"{r['buy_t']*100:.1f}%/{r['sell_t']*100:.1f}%"
+        win_str = "勝" if r['win'] else " "
+        print(f"{r['train_start'].strftime(date_fmt):<12} | {r['test_start'].strftime(date_fmt):<12} | {pair:>16} | "
+              f"{r['roi_is']:>9.1f}% | {r['roi_a']:>9.1f}% | {r['roi_b']:>9.1f}% | {win_str}")
+    print("="*84)
+    wins = sum(r['win'] for r in rows)
+    total = len(rows)
+    print(f"樣本外測試次數: {total} (訓練視窗沿用結果資料庫: {cached})")
+    print(f"樣本外 B 打敗 A 次數: {wins}")
+    print(f"樣本外勝率: {(wins / total * 100) if total else 0:.1f}%")
+    print(f"樣本外平均報酬: A {np.mean([r['roi_a'] for r in rows]):.2f}% / B {np.mean([r['roi_b'] for r in rows]):.2f}%")
+    if tiled:
+        # 測試區間首尾相接時，可把各段報酬串接成整段樣本外績效
+        compound_a = (np.prod([1 + r['roi_a'] / 100 for r in rows]) - 1) * 100
+        compound_b = (np.prod([1 + r['roi_b'] / 100 for r in rows]) - 1) * 100
+        print(f"樣本外累積報酬 (逐段複利): A {compound_a:.1f}% / B {compound_b:.1f}%")
+    print("="*84)
 
 def main():
-    print("=== 進入 2 年期滾動回測模式 ===")
-    user_stock = input("請輸入股票代號 (例如 2330, QQQ) [預設 2330]: ").strip() or "2330"
-    user_buy_t = float(input("請輸入買入門檻 % (例如 10) [預設 10]: ").strip() or "10") / 100.0
-    user_sell_t = float(input("請輸入賣出門檻 % (例如 10) [預設 10]: ").strip() or "10") / 100.0
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Rolling-Window Dual-Threshold Backtest')
+    parser.add_argument('--stock', type=str, default='2330', help='Stock code (e.g. 2330, QQQ)')
+    parser.add_argument('--start', type=str, default='2010-01-01', help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--end', type=str, default='2025-12-20', help='End date (YYYY-MM-DD)')
+    parser.add_argument('--buy_t', type=float, default=0.1, help='Buy threshold (e.g. 0.1 for 10 percent)')
+    parser.add_argument('--sell_t', type=float, default=0.1, help='Sell threshold (e.g. 0.1 for 10 percent)')
+    parser.add_argument('--window_months', type=int, default=24, help='Window length in months')
+    parser.add_argument('--step', choices=sorted(STEPS), default='monthly', help='Distance between window starts')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (default: all cores)')
+    parser.add_argument('--walk_forward', action='store_true', help='Optimize thresholds on each window and test them on the next period')
+    parser.add_argument('--test_months', type=int, default=None, help='Walk-forward test window in months (default: one --step)')
+    parser.add_argument('--buy_range', type=float, nargs=3, default=list(DEFAULT_RANGE), metavar=('MIN', 'MAX', 'STEP'),
+                        help='Buy threshold grid for --walk_forward')
+    parser.add_argument('--sell_range', type=float, nargs=3, default=list(DEFAULT_RANGE), metavar=('MIN', 'MAX', 'STEP'),
+                        help='Sell threshold grid for --walk_forward')
+    parser.add_argument('--results_db', type=str, default=results_store.RESULTS_DB,
+                        help='SQLite results store; windows already evaluated on the same prices are reused')
+    parser.add_argument('--no_store', action='store_true', help='Do not read or write the results store')
+    data_provider.add_provider_argument(parser)
+    profiling.add_profile_arguments(parser)
+
+    args = parser.parse_args()
+    profiling.setup(args)
+    if args.provider:
+        data_provider.set_provider(args.provider)
+
+    # 沒有任何參數時維持互動式輸入
+    if len(sys.argv) == 1:
+        print("=== 進入 2 年期滾動回測模式 ===")
+        args.stock = input("請輸入股票代號 (例如 2330, QQQ) [預設 2330]: ").strip() or "2330"
+        args.buy_t = float(input("請輸入買入門檻 % (例如 10) [預設 10]: ").strip() or "10") / 100.0
+        args.sell_t = float(input("請輸入賣出門檻 % (例如 10) [預設 10]: ").strip() or "10") / 100.0
+
+    stock = normalize_ticker(args.stock)
+
+    start_all = parse_date(args.start)
+    end_all = parse_date(args.end)
+    if not start_all or not end_all:
+        print(f"錯誤: 無法解析日期 '{args.start}' / '{args.end}'")
+        return
 
-    stock = f"{user_stock}.TW" if user_stock.isdigit() and len(user_stock) == 4 else user_stock
-    
-    start_all = datetime(2010, 1, 1)
-    end_all = datetime(2025, 12, 20)
-    
     print(f"正在抓取 {stock} 完整數據 ({start_all.date()} ~ {end_all.date()})...")
-    df_full = yf.download(stock, start=start_all, end=end_all)
+    df_full = data_cache.load_history(stock, start=start_all, end=end_all)
     if isinstance(df_full.columns, pd.MultiIndex):
         df_full.columns = df_full.columns.get_level_values(0)
 
+    # 滾動視窗：一次以二分搜尋找出所有視窗邊界，再平行計算
+    ranges = window_ranges(start_all, end_all, args.window_months, args.step)
+    date_fmt = '%Y-%m-%d' if args.step == 'weekly' else '%Y-%m'
+
+    if args.walk_forward:
+        test_length = relativedelta(months=args.test_months) if args.test_months else STEPS[args.step]
+        buy_thresholds = build_thresholds(*args.buy_range)
+        sell_thresholds = build_thresholds(*args.sell_range)
+        print(f"Walk-forward: 每個訓練視窗搜尋 {len(buy_thresholds)} x {len(sell_thresholds)} 組門檻，套用到下一段測試區間...")
+        conn = None if args.no_store else results_store.connect(args.results_db)
+        rows, cached = walk_forward(df_full, stock, ranges, end_all, buy_thresholds, sell_thresholds,
+                                    test_length, workers=args.workers, conn=conn)
+        print_walk_forward(rows, cached, date_fmt, tiled=args.test_months is None)
+        return
+    i0, i1 = window_bounds(df_full.index, ranges)
+    valid = (i1 - i0) > 20
+    fee, tax = market_costs(stock)
+    close = as_close_array(df_full)
+    if args.no_store:
+        res = run_rolling(close, i0[valid], i1[valid], args.buy_t, args.sell_t, fee, tax, workers=args.workers)
+    else:
+        # 只重算價格有變動的視窗 (通常只有最新幾個)，其餘從結果資料庫取用
+        res, reused = results_store.incremental_rolling(
+            results_store.connect(args.results_db), stock, close, df_full.index, i0[valid], i1[valid],
+            args.buy_t, args.sell_t, fee, tax,
+            lambda a, b: run_rolling(close, a, b, args.buy_t, args.sell_t, fee, tax, workers=args.workers))
+        print(f"結果資料庫: 沿用 {reused} / {int(valid.sum())} 個視窗")
+
     results = []
-    current_start = start_all
-    
-    # 滾動視窗：每個月一次，每次兩年
-    while current_start + relativedelta(years=2) <= end_all:
-        window_end = current_start + relativedelta(years=2)
-        
-        # 取得該範圍的數據
-        mask = (df_full.index >= current_start) & (df_full.index < window_end)
-        df_window = df_full.loc[mask]
-        
-        if not df_window.empty and len(df_window) > 20:
-            res = run_backtest(df_window, stock, buy_threshold=user_buy_t, sell_threshold=user_sell_t)
-            if res:
-                win = res['roi_b'] > res['roi_a']
-                results.append({
-                    'start': current_start.strftime('%Y-%m'),
-                    'roi_a': res['roi_a'],
-                    'roi_b': res['roi_b'],
-                    'win': win
-                })
-        
-        # 下一個月
-        current_start += relativedelta(months=1)
+    for (current_start, _), roi_a, roi_b in zip([r for r, v in zip(ranges, valid) if v], res['roi_a'], res['roi_b']):
+        results.append({
+            'start': current_start.strftime(date_fmt),
+            'roi_a': roi_a,
+            'roi_b': roi_b,
+            'win': roi_b > roi_a
+        })
 
     # 輸出結果表格
+    label = f"時間區間 ({args.window_months // 12}年)" if args.window_months % 12 == 0 else f"時間區間 ({args.window_months}月)"
     print("\n" + "="*60)
-    print(f"{'時間區間 (2年)':<15} | {'盤後 (A)':>10} | {'策略 (B)':>10} | {'勝負':<5}")
+    print(f"{label:<15} | {'盤後 (A)':>10} | {'策略 (B)':>10} | {'勝負':<5}")
     print("-" * 60)
     
     wins = 0
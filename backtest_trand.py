@@ -1,250 +1,77 @@
-import yfinance as yf
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import os
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
-# New Gemini SDK (google-genai)
-try:
-    from google import genai
-    AI_AVAILABLE = True
-except ImportError:
-    AI_AVAILABLE = False
+import ai_analysis
+import charts
+import data_cache
+import data_provider
+import profiling
+import engine
+import results_store
+import streaming
+from strategy_kernel import as_close_array
+from optimizer import (DEFAULT_ATR_RANGE, DEFAULT_COOLDOWN_RANGE, DEFAULT_MULT_RANGE, DEFAULT_RANGE,
+                       DEFAULT_SMA_RANGE, SEARCH_MODES, build_thresholds, optimize_grid, pct_decimals,
+                       search_summary, sweep_atr, sweep_sma)
 
 load_dotenv()
 
-def run_backtest(df, stock_code, buy_threshold=0.1, sell_threshold=0.1, initial_capital=10000):
+def run_backtest(df, stock_code, buy_threshold=0.1, sell_threshold=0.1, initial_capital=10000,
+                 sma_window=20, cooldown=3, atr_window=14, atr_multiplier=3.0, record_history=True):
     """
-    Runs a backtest comparing Strategy A (Hold), Strategy B (Trend), and Strategy C (SMA).
+    Runs a backtest comparing Strategy A (Hold), Strategy B (Trend), Strategy C (SMA) and Strategy D (ATR).
+    history_b/c/d are float64 arrays, or None when record_history is False.
     """
     # Ensure columns are flat
     if isinstance(df.columns, pd.MultiIndex):
         df.columns = df.columns.get_level_values(0)
 
-    is_taiwan = ".TW" in stock_code or ".TWO" in stock_code
-    
-    if is_taiwan:
-        trading_fee_rate = 0.001425 * 0.65
-        sell_tax_rate = 0.003
-    else:
-        trading_fee_rate = 0.005 # 0.5%
-        sell_tax_rate = 0.0
-
-    slippage = 0.001 # 0.1% 滑價
-
-    # Strategy A: Buy and Hold
-    first_price = float(df['Close'].iloc[0])
-    last_price = float(df['Close'].iloc[-1])
-    # 買入時考慮手續費與滑價
-    shares_a = (initial_capital / (1 + trading_fee_rate + slippage)) / first_price
-    # 期末清算考慮手續費與稅金
-    final_a = (shares_a * last_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
-
-    # Strategy B: Trend Following (Dual Threshold)
-    cap_b = initial_capital
-    # 初始買入
-    shares_b = (cap_b / (1 + trading_fee_rate + slippage)) / first_price
-    cap_b = 0
-    in_pos_b = True
-    peak_price = first_price
-    valley_price = first_price
-    
-    history_b = []
-    trans_b = 1
-    
-    for _, row in df.iterrows():
-        current_price = float(row['Close'])
-        if in_pos_b:
-            if current_price > peak_price: peak_price = current_price
-            if current_price <= peak_price * (1 - sell_threshold):
-                sell_proceeds = shares_b * current_price
-                cap_b = sell_proceeds * (1 - trading_fee_rate - sell_tax_rate - slippage)
-                shares_b = 0
-                in_pos_b = False
-                valley_price = current_price
-                trans_b += 1
-        else:
-            if current_price < valley_price: valley_price = current_price
-            if current_price >= valley_price * (1 + buy_threshold):
-                cap_b = (cap_b / (1 + trading_fee_rate + slippage))
-                shares_b = cap_b / current_price
-                cap_b = 0
-                in_pos_b = True
-                peak_price = current_price
-                trans_b += 1
-        
-        # 紀錄歷史價值 (若持有中，紀錄扣除預期清算後的價值)
-        current_val = cap_b
-        if in_pos_b:
-            current_val = (shares_b * current_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
-        history_b.append(current_val)
-
-    # Strategy C: SMA 20 with 3-day cool-down
-    df_c = df.copy()
-    df_c['SMA20'] = df_c['Close'].rolling(window=20).mean()
-    cap_c = initial_capital
-    shares_c = 0
-    in_pos_c = False
-    last_trans_day_c = -999
-    history_c = []
-    trans_c = 0
-    
-    for i, (idx, row) in enumerate(df_c.iterrows()):
-        current_price = float(row['Close'])
-        current_sma = float(row['SMA20'])
-        if pd.isna(current_sma):
-            pass
-        else:
-            if (i - last_trans_day_c) >= 3:
-                if current_price > current_sma and not in_pos_c:
-                    cap_c = (cap_c / (1 + trading_fee_rate + slippage))
-                    shares_c = cap_c / current_price
-                    cap_c = 0
-                    in_pos_c = True
-                    trans_c += 1
-                    last_trans_day_c = i
-                elif current_price < current_sma and in_pos_c:
-                    sell_proceeds = shares_c * current_price
-                    cap_c = sell_proceeds * (1 - trading_fee_rate - sell_tax_rate - slippage)
-                    shares_c = 0
-                    in_pos_c = False
-                    trans_c += 1
-                    last_trans_day_c = i
-        
-        current_val_c = cap_c
-        if in_pos_c:
-            current_val_c = (shares_c * current_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
-        history_c.append(current_val_c)
-
-    # Strategy D: ATR Adaptive Volatility
-    df_d = df.copy()
-    high_low = df_d['High'] - df_d['Low']
-    high_close = (df_d['High'] - df_d['Close'].shift()).abs()
-    low_close = (df_d['Low'] - df_d['Close'].shift()).abs()
-    ranges = pd.concat([high_low, high_close, low_close], axis=1)
-    true_range = ranges.max(axis=1)
-    df_d['ATR'] = true_range.rolling(14).mean()
-    
-    cap_d = initial_capital
-    shares_d = (cap_d / (1 + trading_fee_rate + slippage)) / first_price
-    cap_d = 0
-    in_pos_d = True
-    peak_price = first_price
-    valley_price = first_price
-    history_d = []
-    trans_d = 1
-    multiplier = 3.0
-    
-    for i, (idx, row) in enumerate(df_d.iterrows()):
-        current_price = float(row['Close'])
-        current_atr = float(row['ATR'])
-        
-        if pd.isna(current_atr):
-            pass
-        else:
-            dynamic_t = (current_atr * multiplier) / current_price
-            if in_pos_d:
-                if current_price > peak_price: peak_price = current_price
-                if current_price <= peak_price * (1 - dynamic_t):
-                    sell_proceeds = shares_d * current_price
-                    cap_d = sell_proceeds * (1 - trading_fee_rate - sell_tax_rate - slippage)
-                    shares_d = 0
-                    in_pos_d = False
-                    valley_price = current_price
-                    trans_d += 1
-            else:
-                if current_price < valley_price: valley_price = current_price
-                if current_price >= valley_price * (1 + dynamic_t):
-                    cap_d = (cap_d / (1 + trading_fee_rate + slippage))
-                    shares_d = cap_d / current_price
-                    cap_d = 0
-                    in_pos_d = True
-                    peak_price = current_price
-                    trans_d += 1
-        
-        current_val_d = cap_d
-        if in_pos_d:
-            current_val_d = (shares_d * current_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
-        history_d.append(current_val_d)
-
-    # Final Net Values (Ensure everything is liquidated at the very end)
-    final_val_b = cap_b
-    if in_pos_b:
-        final_val_b = (shares_b * last_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
-        
-    final_val_c = cap_c
-    if in_pos_c:
-        final_val_c = (shares_c * last_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
-        
-    final_val_d = cap_d
-    if in_pos_d:
-        final_val_d = (shares_d * last_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
+    # A / B / C / D 由共用引擎在同一次走訪中計算，指標依 (標的, 期間, 參數) 快取
+    strategies = engine.standard_strategies(buy_threshold, sell_threshold, sma_window=sma_window, cooldown=cooldown,
+                                            atr_window=atr_window, atr_multiplier=atr_multiplier)
+    res = engine.run_backtest(df, stock_code, strategies, initial_capital=initial_capital, record_equity=record_history)
+    costs = res['costs']
 
     return {
-        'final_a': final_a,
-        'final_b': final_val_b,
-        'trans_b': trans_b,
-        'history_b': history_b,
-        'final_c': final_val_c,
-        'trans_c': trans_c,
-        'history_c': history_c,
-        'final_d': final_val_d,
-        'trans_d': trans_d,
-        'history_d': history_d,
-        'market': '台股' if is_taiwan else '美股/複委託',
-        'fee': trading_fee_rate,
-        'tax': sell_tax_rate
+        'final_a': float(res['a']['final']),
+        'final_b': float(res['b']['final']),
+        'trans_b': int(res['b']['trades']),
+        'history_b': res['b']['equity'],
+        'final_c': float(res['c']['final']),
+        'trans_c': int(res['c']['trades']),
+        'history_c': res['c']['equity'],
+        'final_d': float(res['d']['final']),
+        'trans_d': int(res['d']['trades']),
+        'history_d': res['d']['equity'],
+        'market': costs['market'],
+        'fee': costs['fee'],
+        'tax': costs['tax']
     }
 
-def get_ai_analysis(stock_code, period, matrix_text, best_b, roi_a):
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key or not AI_AVAILABLE:
-        return "提示：如需 AI 自動化分析，請在 .env 中設定 GEMINI_API_KEY 並安裝 google-genai。"
-    
-    try:
-        client = genai.Client(api_key=api_key)
-        
-        # Use a widely supported model name
-        model_id = "gemini-2.0-flash" 
-        
-        prompt = f"""
-你是一位專業、客觀且具備深厚實戰經驗的「首席量化策略官 (Chief Investment Officer)」。
-請針對以下這檔股票的 2D 門檻優化獲利矩陣進行深度分析。
-
-【交易環境】
-- 股票代碼: {stock_code}
-- 測試期間: {period}
-- 基準報酬 (Strategy A - 長期持有): {roi_a:.1f}%
-- 最佳波段組合報酬 (Strategy B): {best_b:.1f}%
-
-【策略邏輯提醒】
-- 買入門檻 (Buy_t)：當股價自最近「谷底」回升 X% 時買入。
-- 賣出門檻 (Sell_t)：當股價自買入後的「高峰」回落 Y% 時賣出。
-
-【獲利矩陣數據 (買進入門檻 \\ 賣出門檻)】
-{matrix_text}
-(註：標註 * 代表該組合「勝過」長期持有報酬率)
-
-【請提供專業且具建設性的策略分析 (繁體中文)】：
-1. **策略價值評估 (Alpha vs Beta)**：
-   - 觀察最佳組合 B 與基準 A 的差異。
-   - **空頭市場特別注意**：如果 A 是大賠，而 B 能減輕虧損甚至轉正，代表策略具有極佳的「避險/防禦價值」，請給予肯定分析。
-   - **多頭市場特別注意**：B 是否能有效放大獲益，還是只是被動隨大盤上漲。
-2. **參數平原與穩健性診斷**：
-   - 觀察 * 標記的分佈。如果是「整片聚集 (Plateau)」，代表策略具備高容錯率與實戰價值；如果是「零星散佈 (Islands)」，請警告過度擬合 (Overfitting) 的風險。
-3. **最終實戰結論與建議**：
-   - 總結這檔股票的股性（波動大、適合趨勢跟隨，還是穩健增長適合存股）。
-   - 給出具體的參數建議或風險提示。如果策略確實無效，請坦誠建議維持長期持有。
-"""
-        response = client.models.generate_content(
-            model=model_id,
-            contents=prompt
-        )
-        return response.text
-    except Exception as e:
-        return f"AI 分析失敗: {str(e)}"
+def print_param_matrix(title, row_values, col_values, finals, trades, roi_a, row_fmt, col_fmt):
+    """
+    印出參數掃描矩陣 (列優先排列的 finals / trades)，標註 * 代表勝過長期持有
+    """
+    divider = "-" * (8 + len(col_values)*11)
+    print(f"\n{title} [格式: 報酬%(交易次數)]:")
+    print(divider)
+    print("列\\欄 | " + " | ".join([f"{col_fmt.format(v):>8}" for v in col_values]))
+    print(divider)
+    k = 0
+    for rv in row_values:
+        row_str = f"{row_fmt.format(rv):>5}  | "
+        for _ in col_values:
+            val = (finals[k]/10000 - 1) * 100
+            mark = "*" if val > roi_a else " "
+            cell = f"{val:>3.0f}%({trades[k]:>2}){mark}" if trades[k] >= 0 else f"{'--':>4}"
+            row_str += f"{cell:<8}| "
+            k += 1
+        print(row_str)
+    print(divider)
+    best = int(np.nanargmax(finals))
+    print(f"最佳組合: {row_fmt.format(row_values[best // len(col_values)])} / {col_fmt.format(col_values[best % len(col_values)])} -> {(finals[best]/10000 - 1)*100:.1f}%")
 
 def parse_date(date_str):
     if not date_str:
@@ -268,8 +95,55 @@ def main():
     parser.add_argument('--buy_t', type=float, default=0.1, help='Buy threshold (e.g. 0.1 for 10 percent)')
     parser.add_argument('--sell_t', type=float, default=0.1, help='Sell threshold (e.g. 0.1 for 10 percent)')
     parser.add_argument('--optimize', action='store_true', help='Search for best (Buy, Sell) threshold pair')
+    parser.add_argument('--buy_range', type=float, nargs=3, default=list(DEFAULT_RANGE), metavar=('MIN', 'MAX', 'STEP'),
+                        help='Buy threshold grid for --optimize (e.g. 0.01 0.30 0.005)')
+    parser.add_argument('--sell_range', type=float, nargs=3, default=list(DEFAULT_RANGE), metavar=('MIN', 'MAX', 'STEP'),
+                        help='Sell threshold grid for --optimize (e.g. 0.01 0.30 0.005)')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size for --optimize (default: all cores)')
+    parser.add_argument('--search', choices=SEARCH_MODES, default='grid',
+                        help='grid evaluates every cell; adaptive refines a coarse grid around the best cells')
+    parser.add_argument('--budget', type=int, default=None,
+                        help='Max evaluations per grid for --search adaptive (default: a quarter of the grid, at least 64)')
+    parser.add_argument('--sma_window', type=int, default=20, help='Strategy C SMA window')
+    parser.add_argument('--cooldown', type=int, default=3, help='Strategy C cool-down in bars')
+    parser.add_argument('--atr_window', type=int, default=14, help='Strategy D ATR window')
+    parser.add_argument('--atr_mult', type=float, default=3.0, help='Strategy D ATR multiplier')
+    parser.add_argument('--sweep_cd', action='store_true', help='With --optimize, also sweep Strategy C and D parameters')
+    parser.add_argument('--sma_range', type=float, nargs=3, default=list(DEFAULT_SMA_RANGE), metavar=('MIN', 'MAX', 'STEP'),
+                        help='SMA window grid for --sweep_cd')
+    parser.add_argument('--cooldown_range', type=float, nargs=3, default=list(DEFAULT_COOLDOWN_RANGE), metavar=('MIN', 'MAX', 'STEP'),
+                        help='Cool-down grid for --sweep_cd')
+    parser.add_argument('--atr_range', type=float, nargs=3, default=list(DEFAULT_ATR_RANGE), metavar=('MIN', 'MAX', 'STEP'),
+                        help='ATR window grid for --sweep_cd')
+    parser.add_argument('--mult_range', type=float, nargs=3, default=list(DEFAULT_MULT_RANGE), metavar=('MIN', 'MAX', 'STEP'),
+                        help='ATR multiplier grid for --sweep_cd')
+    data_provider.add_provider_argument(parser)
+    profiling.add_profile_arguments(parser)
+    parser.add_argument('--stream', type=str, help='Stream a .npy/.parquet bar file (e.g. minute bars) in chunks instead of loading it')
+    parser.add_argument('--chunk_size', type=int, default=streaming.DEFAULT_CHUNK_SIZE, help='Bars per chunk for --stream')
+    parser.add_argument('--chart_dir', type=str, default=charts.CHART_DIR, help='Directory for backtest_result_<ticker>.png')
+    parser.add_argument('--results_db', type=str, default=results_store.RESULTS_DB,
+                        help='SQLite results store; --optimize reuses grid cells already computed on the same data')
+    parser.add_argument('--no_store', action='store_true', help='Do not read or write the results store')
     
     args = parser.parse_args()
+    profiling.setup(args)
+    if args.provider:
+        data_provider.set_provider(args.provider)
+
+    # 串流模式：分段讀取大型 K 棒檔案，不經過下載與 DataFrame
+    if args.stream:
+        stock = args.stock or ""
+        stock = f"{stock}.TW" if stock.isdigit() and len(stock) == 4 else stock
+        # 只有收盤價的檔案 (例如一維 .npy) 無法計算 ATR，略過 Strategy D
+        atr_window = args.atr_window
+        if not {'high', 'low'} <= set(streaming.available_fields(args.stream)):
+            print("串流檔案沒有 High/Low 欄位，略過 Strategy D (ATR)")
+            atr_window = None
+        strategies = engine.standard_strategies(args.buy_t, args.sell_t, sma_window=args.sma_window, cooldown=args.cooldown,
+                                                atr_window=atr_window, atr_multiplier=args.atr_mult)
+        streaming.report(args.stream, stock, strategies, chunk_size=args.chunk_size)
+        return
 
     # Interactive mode if no arguments or missing key ones
     if len(sys.argv) == 1:
@@ -297,8 +171,8 @@ def main():
     stock = f"{args.stock}.TW" if args.stock.isdigit() and len(args.stock) == 4 else args.stock
     
     print(f"正在抓取 {stock} 數據 ({start_date_str} ~ {end_date_str})...")
-    # Set group_by='column' to handle potential MultiIndex more explicitly if needed, but we flatten it anyway
-    df = yf.download(stock, start=start_date_str, end=end_date_str)
+    # 透過本地快取取得資料，只會下載快取中缺少的區段
+    df = data_cache.load_history(stock, start=start_date_str, end=end_date_str)
     if df.empty: return
 
     # Flatten columns right after download to avoid index errors
@@ -307,70 +181,120 @@ def main():
 
     if args.optimize:
         print(f"\n===== 2D 門檻優化搜尋 ({start_date_str} ~ {end_date_str}) =====")
-        market_test = run_backtest(df.head(10), stock_code=stock)
+        market_test = run_backtest(df.head(10), stock_code=stock, record_history=False)
         print(f"模式: {market_test['market']} (手續費: {market_test['fee']*100:.3f}%, 稅: {market_test['tax']*100:.1f}%)")
         print("-" * 60)
         
-        thresholds = np.arange(0.03, 0.16, 0.02)
+        buy_thresholds = build_thresholds(*args.buy_range)
+        sell_thresholds = build_thresholds(*args.sell_range)
         matrix_data = {}
         best_roi_b = -999
         best_buy_t = 0
         best_sell_t = 0
         
-        for bt in thresholds:
-            matrix_data[bt] = {}
-            for st in thresholds:
-                res = run_backtest(df, stock_code=stock, buy_threshold=bt, sell_threshold=st)
-                roi = (res['final_b']/10000 - 1) * 100
-                matrix_data[bt][st] = (roi, res['trans_b'])
-                if roi > best_roi_b:
-                    best_roi_b = roi
-                    best_buy_t = bt
-                    best_sell_t = st
+        # 所有 (買, 賣) 組合分成多個 chunk，由 process pool 平行計算
+        print(f"搜尋 {len(buy_thresholds)} x {len(sell_thresholds)} = {len(buy_thresholds)*len(sell_thresholds)} 組門檻...")
+        # 同一份資料、同樣門檻與成本已算過的格子直接從結果資料庫取用
+        conn = None if args.no_store else results_store.connect(args.results_db)
+        store = results_store.cell_store(conn, stock, 'b', [as_close_array(df)], market_test['fee'],
+                                         market_test['tax'], df.index) if conn else None
+        grid = optimize_grid(as_close_array(df), buy_thresholds, sell_thresholds,
+                             market_test['fee'], market_test['tax'], workers=args.workers,
+                             search=args.search, budget=args.budget, store=store)
+        if args.search == 'adaptive':
+            print(f"自適應搜尋: {search_summary(grid)}")
+        if store:
+            print(store.summary())
+        for bt, st, final_b, trans_b in zip(grid['buy'], grid['sell'], grid['final'], grid['trades']):
+            roi = (final_b/10000 - 1) * 100
+            matrix_data.setdefault(bt, {})[st] = (roi, int(trans_b))
+            if roi > best_roi_b:
+                best_roi_b = roi
+                best_buy_t = bt
+                best_sell_t = st
 
-        res_a = run_backtest(df, stock_code=stock, buy_threshold=0.1, sell_threshold=0.1)
+        res_a = run_backtest(df, stock_code=stock, buy_threshold=0.1, sell_threshold=0.1,
+                             sma_window=args.sma_window, cooldown=args.cooldown,
+                             atr_window=args.atr_window, atr_multiplier=args.atr_mult, record_history=False)
         roi_a = (res_a['final_a']/10000 - 1) * 100
 
         # Construct Matrix Text for AI
-        matrix_header = "買\\賣 | " + " | ".join([f"{t*100:>7.0f}%" for t in thresholds])
-        matrix_divider = "-" * (8 + len(thresholds)*11)
+        dec = max(pct_decimals(buy_thresholds), pct_decimals(sell_thresholds))
+        matrix_header = "買\\賣 | " + " | ".join([f"{t*100:>7.{dec}f}%" for t in sell_thresholds])
+        matrix_divider = "-" * (8 + len(sell_thresholds)*11)
         matrix_text = matrix_header + "\n" + matrix_divider + "\n"
         
-        res_c = run_backtest(df, stock_code=stock)
-        roi_c = (res_c['final_c']/10000 - 1) * 100
-        
-        res_d = run_backtest(df, stock_code=stock)
-        roi_d = (res_d['final_d']/10000 - 1) * 100
+        # C / D 已在同一次 run_backtest 中算出，不需要重跑
+        roi_c = (res_a['final_c']/10000 - 1) * 100
+        roi_d = (res_a['final_d']/10000 - 1) * 100
         
         print("\n獲利矩陣 (獲利高原分析) [格式: 報酬%(交易次數)]:")
         print(f"基準對照 Strategy A (長期持有): {roi_a:.1f}%")
-        print(f"對手策略 Strategy C (月線趨勢): {roi_c:.1f}%")
-        print(f"自適應策略 Strategy D (ATR 3.0): {roi_d:.1f}%")
+        print(f"對手策略 Strategy C (SMA{args.sma_window}, 冷卻 {args.cooldown} 天): {roi_c:.1f}%")
+        print(f"自適應策略 Strategy D (ATR{args.atr_window} x {args.atr_mult}): {roi_d:.1f}%")
         print(matrix_divider)
         print(matrix_header)
         print(matrix_divider)
 
-        for bt in thresholds:
-            row_str = f"{bt*100:>3.0f}%  | "
-            for st in thresholds:
+        for bt in buy_thresholds:
+            row_str = f"{bt*100:>3.{dec}f}%  | "
+            for st in sell_thresholds:
                 val, trans = matrix_data[bt][st]
                 mark = "*" if val > roi_a else " "
-                cell = f"{val:>3.0f}%({trans:>2}){mark}"
+                # 自適應搜尋略過的格子以 -- 表示
+                cell = f"{val:>3.0f}%({trans:>2}){mark}" if trans >= 0 else f"{'--':>4}"
                 row_str += f"{cell:<8}| "
             print(row_str)
             matrix_text += row_str + "\n"
         
         print(matrix_divider)
-        print(f"基準報酬 (Hold): {roi_a:.1f}% | 最佳組合 (B): 買回升 {best_buy_t*100:.0f}% / 賣回落 {best_sell_t*100:.0f}% -> {best_roi_b:.1f}%")
+        print(f"基準報酬 (Hold): {roi_a:.1f}% | 最佳組合 (B): 買回升 {best_buy_t*100:.{dec}f}% / 賣回落 {best_sell_t*100:.{dec}f}% -> {best_roi_b:.1f}%")
+        # 矩陣完成後立即在背景送出 AI 分析 (有快取時直接取用)，同時繼續輸出與後續計算
+        ai_future = ai_analysis.submit_analysis(stock, f"{start_date_str}~{end_date_str}", matrix_text, best_roi_b, roi_a)
         
-        # AI Analysis Call
-        print("\n正在傳送到 Gemini AI 進行深度量化分析...")
-        ai_report = get_ai_analysis(stock, f"{start_date_str}~{end_date_str}", matrix_text, best_roi_b, roi_a)
+        if args.sweep_cd:
+            close = as_close_array(df)
+            sma_windows = build_thresholds(*args.sma_range)
+            cooldowns = build_thresholds(*args.cooldown_range)
+            print(f"\n搜尋 Strategy C 參數 {len(sma_windows)} x {len(cooldowns)} 組...")
+            store_c = results_store.cell_store(conn, stock, 'c', [close], market_test['fee'],
+                                               market_test['tax'], df.index) if conn else None
+            grid_c = sweep_sma(close, sma_windows, cooldowns, market_test['fee'], market_test['tax'], workers=args.workers,
+                               search=args.search, budget=args.budget, store=store_c)
+            if args.search == 'adaptive':
+                print(f"自適應搜尋: {search_summary(grid_c)}")
+            if store_c:
+                print(store_c.summary())
+            print_param_matrix("Strategy C 參數矩陣 [列: SMA 天數, 欄: 冷卻天數]", sma_windows, cooldowns,
+                               grid_c['final'], grid_c['trades'], roi_a, "{:.0f}", "{:.0f}")
+
+            atr_windows = build_thresholds(*args.atr_range)
+            multipliers = build_thresholds(*args.mult_range)
+            print(f"\n搜尋 Strategy D 參數 {len(atr_windows)} x {len(multipliers)} 組...")
+            high = df['High'].to_numpy(dtype=np.float64)
+            low = df['Low'].to_numpy(dtype=np.float64)
+            store_d = results_store.cell_store(conn, stock, 'd', [high, low, close], market_test['fee'],
+                                               market_test['tax'], df.index) if conn else None
+            grid_d = sweep_atr(high, low, close, atr_windows, multipliers, market_test['fee'], market_test['tax'],
+                               workers=args.workers, search=args.search, budget=args.budget, store=store_d)
+            if args.search == 'adaptive':
+                print(f"自適應搜尋: {search_summary(grid_d)}")
+            if store_d:
+                print(store_d.summary())
+            print_param_matrix("Strategy D 參數矩陣 [列: ATR 天數, 欄: 倍數]", atr_windows, multipliers,
+                               grid_d['final'], grid_d['trades'], roi_a, "{:.0f}", "{:.1f}")
+
+        # AI Analysis Call (已在背景執行，這裡等待結果)
+        print("\n正在等待 Gemini AI 深度量化分析...")
+        with profiling.phase('ai_analysis'):
+            ai_report = ai_analysis.wait(ai_future)
         print("\n===== Gemini 量化分析報告 =====")
         print(ai_report)
         print("================================")
     else:
-        res = run_backtest(df, stock_code=stock, buy_threshold=args.buy_t, sell_threshold=args.sell_t)
+        res = run_backtest(df, stock_code=stock, buy_threshold=args.buy_t, sell_threshold=args.sell_t,
+                           sma_window=args.sma_window, cooldown=args.cooldown,
+                           atr_window=args.atr_window, atr_multiplier=args.atr_mult)
         print(f"\n回測結果: {stock} ({res['market']})")
         print(f"區間: {start_date_str} ~ {end_date_str}")
         print(f"模式: 手續費 {res['fee']*100:.3f}%, 稅 {res['tax']*100:.1f}%")
@@ -382,17 +306,17 @@ def main():
         print(f"數字 B (趨勢策略): ${res['final_b']:.2f} ({(res['final_b']/10000-1)*100:.1f}%) | 交易 {res['trans_b']} 次")
         print("-" * 50)
 
-        plt.figure(figsize=(12, 6))
         first_price_val = float(df['Close'].iloc[0])
-        plt.plot(df.index, (10000/first_price_val) * df['Close'], label='Strategy A (Hold)', alpha=0.5)
-        plt.plot(df.index, res['history_c'], label='Strategy C (SMA20)', linestyle='--')
-        plt.plot(df.index, res['history_d'], label='Strategy D (ATR)', linestyle='-.')
-        plt.plot(df.index, res['history_b'], label=f'Strategy B ({args.buy_t*100:.0f}%/{args.sell_t*100:.0f}%)')
-        plt.title(f"Backtest: {stock} ({res['market']})")
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        plt.savefig("backtest_result.png")
-        print(f"圖表已儲存至: backtest_result.png")
+        series = [
+            ('Strategy A (Hold)', (10000/first_price_val) * df['Close'].to_numpy(), {'alpha': 0.5}),
+            (f'Strategy C (SMA{args.sma_window})', res['history_c'], {'linestyle': '--'}),
+            (f'Strategy D (ATR{args.atr_window} x {args.atr_mult})', res['history_d'], {'linestyle': '-.'}),
+            (f'Strategy B ({args.buy_t*100:.0f}%/{args.sell_t*100:.0f}%)', res['history_b'], {})
+        ]
+        with profiling.phase('savefig'):
+            path = charts.render_equity(charts.chart_path(stock, args.chart_dir), df.index, series,
+                                        f"Backtest: {stock} ({res['market']})")
+        print(f"圖表已儲存至: {path}")
 
 if __name__ == "__main__":
     main()
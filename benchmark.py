@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+import indicators
+from data_provider import synthetic_ohlcv
+from optimizer import DEFAULT_ATR_RANGE, DEFAULT_MULT_RANGE, DEFAULT_SMA_RANGE, build_thresholds, optimize_grid, sweep_atr, sweep_sma
+from portfolio import run_portfolio
+from rolling import run_rolling
+from strategy_kernel import trade_factors
+
+# ===============================================
+# 回測引擎效能基準 (離線合成資料)
+# ===============================================
+BASELINE_FILE = "benchmark_baseline.json"
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+# 單一案例的工作量上限 (K 棒數 x 參數組數)，超過就跳過，避免 1M 根 x 大網格跑上數小時
+DEFAULT_MAX_WORK = 5e8
+# run_backtest 以純量迴圈逐根推進 A/B/C/D，每根 K 棒的成本約等於向量化網格 10 組參數的一根 K 棒
+LOOP_BAR_WEIGHT = 10
+TW_FEE = 0.001425 * 0.65
+TW_TAX = 0.003
+# 投資組合案例的標的數；(K 棒 x 標的) 的價格與持股矩陣只在 PORTFOLIO_MAX_BARS 以內建立
+PORTFOLIO_TICKERS = 200
+PORTFOLIO_MAX_BARS = 100_000
+
+# 各入口腳本的冷啟動時間上限 (毫秒)：--help 只載入模組並建立參數，stock_monitor 另測未設定 NTFY_TOPIC 時的提早結束
+STARTUP_BUDGETS_MS = {
+    'backtest.py --help': 800,
+    'backtest_trand.py --help': 800,
+    'backtest_time.py --help': 800,
+    'backtest_batch.py --help': 800,
+    'robustness.py --help': 800,
+    'portfolio.py --help': 800,
+    'stock_monitor.py --help': 200,
+    'stock_monitor.py (no NTFY_TOPIC)': 200
+}
+
+
+def _best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        # 每次都從空的指標快取開始，計時才包含指標計算
+        indicators.clear_cache()
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def build_cases(df, workers):
+    """Returns [(case name, parameter cells, callable)] for one synthetic series."""
+    from backtest_trand import run_backtest
+
+    close = df['Close'].to_numpy()
+    high = df['High'].to_numpy()
+    low = df['Low'].to_numpy()
+    n_bars = len(close)
+
+    cases = [('run_backtest', 1, lambda: run_backtest(df, "BENCH.TW", 0.1, 0.1))]
+
+    for step in (0.02, 0.005):
+        thresholds = build_thresholds(0.03, 0.15, step)
+        cells = len(thresholds) ** 2
+        cases.append((f'optimize_grid[{len(thresholds)}x{len(thresholds)}]', cells,
+                      lambda t=thresholds: optimize_grid(close, t, t, TW_FEE, TW_TAX,
+                                                         workers=workers, progress=False)))
+
+    sma_windows = build_thresholds(*DEFAULT_SMA_RANGE)
+    cooldowns = np.arange(0, 6)
+    cases.append((f'sweep_sma[{len(sma_windows)}x{len(cooldowns)}]', len(sma_windows) * len(cooldowns),
+                  lambda: sweep_sma(close, sma_windows, cooldowns, TW_FEE, TW_TAX, workers=workers, progress=False)))
+
+    atr_windows = build_thresholds(*DEFAULT_ATR_RANGE)
+    multipliers = build_thresholds(*DEFAULT_MULT_RANGE)
+    cases.append((f'sweep_atr[{len(atr_windows)}x{len(multipliers)}]', len(atr_windows) * len(multipliers),
+                  lambda: sweep_atr(high, low, close, atr_windows, multipliers, TW_FEE, TW_TAX,
+                                    workers=workers, progress=False)))
+
+    # 約 2 年 (504 根) 的視窗、每月 (21 根) 滾動一次，與 backtest_time 預設相同
+    window, step = min(504, n_bars), 21
+    i0 = np.arange(0, n_bars - window + 1, step)
+    i1 = i0 + window
+    cases.append((f'rolling[{len(i0)} windows]', len(i0),
+                  lambda: run_rolling(close, i0, i1, 0.1, 0.1, TW_FEE, TW_TAX, workers=workers)))
+
+    # 整份觀察清單：同一價格序列依比例縮放成多檔標的，各自使用不同門檻
+    if n_bars <= PORTFOLIO_MAX_BARS:
+        n = PORTFOLIO_TICKERS
+        panel = close[:, None] * np.linspace(0.5, 1.5, n)
+        thresholds = np.linspace(0.03, 0.15, n)
+        buy_cost, sell_keep = trade_factors(TW_FEE, TW_TAX)
+        cases.append((f'portfolio[{n} tickers]', n,
+                      lambda: run_portfolio(panel, np.zeros(n, dtype=np.int64), thresholds, thresholds[::-1],
+                                            buy_cost, sell_keep, allocation='pool')))
+    return cases
+
+
+def case_work(name, n_bars, cells):
+    """Bars touched by one run of a case; rolling windows only cover `window` bars each."""
+    if name.startswith('rolling'):
+        return cells * min(504, n_bars)
+    return cells * n_bars
+
+
+def case_weight(name):
+    """Relative cost of one unit of case_work, compared against --max_work."""
+    return LOOP_BAR_WEIGHT if name == 'run_backtest' else 1
+
+
+def run_suite(sizes, repeat=3, workers=1, max_work=DEFAULT_MAX_WORK, seed=0):
+    """Times every case on every size; returns a list of result dicts."""
+    results = []
+    for n_bars in sizes:
+        df = synthetic_ohlcv(n_bars, seed=seed)
+        for name, cells, func in build_cases(df, workers):
+            work = case_work(name, n_bars, cells)
+            cost = work * case_weight(name)
+            if cost > max_work:
+                print(f"  略過 {name} @ {n_bars:,} 根 (工作量 {cost:.1e} > {max_work:.1e})")
+                continue
+            func()  # 暖機：載入模組與第一次配置記憶體
+            seconds = _best_of(func, repeat)
+            row = {
+                'case': name,
+                'bars': n_bars,
+                'cells': cells,
+                'seconds': seconds,
+                'bars_per_sec': n_bars / seconds,
+                'bar_cells_per_sec': work / seconds,
+                'cells_per_sec': cells / seconds
+            }
+            results.append(row)
+            print(f"  {name:<26} {n_bars:>10,} 根 {seconds:>9.4f}s {row['bars_per_sec']:>12,.0f} bars/s "
+                  f"{row['bar_cells_per_sec']:>14,.0f} bar-cells/s {row['cells_per_sec']:>12,.1f} cells/s")
+    return results
+
+
+def _startup_command(case):
+    script, _, rest = case.partition(' ')
+    return [sys.executable, script] + (['--help'] if rest == '--help' else [])
+
+
+def measure_startup(repeat=5, budgets=STARTUP_BUDGETS_MS):
+    """Best-of-`repeat` wall time of a fresh interpreter per entry point; returns result dicts with 'over_budget'."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {k: v for k, v in os.environ.items() if k != 'NTFY_TOPIC'}
+    results = []
+    for case, budget in budgets.items():
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            subprocess.run(_startup_command(case), cwd=here, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            best = min(best, time.perf_counter() - t0)
+        row = {'case': case, 'ms': best * 1000, 'budget_ms': budget, 'over_budget': best * 1000 > budget}
+        results.append(row)
+        print(f"  {case:<34} {row['ms']:>8.0f} ms (上限 {budget} ms){' <- 超出' if row['over_budget'] else ''}")
+    return results
+
+
+def result_key(row):
+    return f"{row['case']}@{row['bars']}"
+
+
+def environment_info(workers):
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'workers': workers
+    }
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path, results, workers):
+    baseline = {
+        'environment': environment_info(workers),
+        'results': {result_key(r): r['seconds'] for r in results}
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=1)
+
+
+def compare(results, baseline, tolerance):
+    """Returns [(key, baseline seconds, seconds, ratio)] for cases slower than baseline * (1 + tolerance)."""
+    regressions = []
+    for row in results:
+        base = baseline['results'].get(result_key(row))
+        if base is None:
+            continue
+        ratio = row['seconds'] / base
+        if ratio > 1 + tolerance:
+            regressions.append((result_key(row), base, row['seconds'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the backtest engines on synthetic OHLCV data')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Series lengths in bars')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the fastest is reported')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for grids and rolling windows')
+    parser.add_argument('--max_work', type=float, default=DEFAULT_MAX_WORK, help='Skip cases above bars x cells')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic series')
+    parser.add_argument('--baseline', type=str, default=BASELINE_FILE, help='Baseline JSON file')
+    parser.add_argument('--save_baseline', action='store_true', help='Write these timings as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown vs baseline (0.25 = +25%%)')
+    parser.add_argument('--output', type=str, help='Also write the raw results to this JSON file')
+    parser.add_argument('--startup', action='store_true', help='Measure entry-point cold start against STARTUP_BUDGETS_MS instead')
+    args = parser.parse_args()
+
+    if args.startup:
+        print(f"--- 冷啟動時間 (repeat={args.repeat}) ---")
+        results = measure_startup(args.repeat)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({'environment': environment_info(args.workers), 'startup': results}, f, indent=1)
+        if any(r['over_budget'] for r in results):
+            sys.exit(1)
+        return
+
+    print(f"--- 效能基準 (sizes={args.sizes}, repeat={args.repeat}, workers={args.workers}) ---")
+    results = run_suite(args.sizes, repeat=args.repeat, workers=args.workers,
+                        max_work=args.max_work, seed=args.seed)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment_info(args.workers), 'results': results}, f, indent=1)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results, args.workers)
+        print(f"已寫入基準檔: {args.baseline}")
+        return
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"找不到基準檔 '{args.baseline}'，可用 --save_baseline 建立。")
+        return
+
+    if baseline.get('environment') != environment_info(args.workers):
+        print("注意：基準檔的執行環境與目前不同，比較結果僅供參考。")
+    regressions = compare(results, baseline, args.tolerance)
+    if not regressions:
+        print(f"沒有超過容許值 (+{args.tolerance:.0%}) 的效能退步。")
+        return
+    print(f"效能退步 (超過 +{args.tolerance:.0%}):")
+    for key, base, seconds, ratio in regressions:
+        print(f"  {key}: {base:.4f}s -> {seconds:.4f}s (x{ratio:.2f})")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
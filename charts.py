@@ -0,0 +1,85 @@
+import os
+import re
+
+import numpy as np
+
+# ===============================================
+# 回測圖表輸出 (無視窗 Agg 後端、LTTB 降採樣、每檔標的獨立檔名)
+# ===============================================
+# 每條曲線最多畫出的點數；12 吋寬的圖約 1200 像素，再多也看不出差異
+MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "2000"))
+CHART_DIR = os.getenv("CHART_DIR", ".")
+
+
+def lttb(y, n_out, x=None):
+    """
+    Largest-Triangle-Three-Buckets decimation: returns the indices of `n_out`
+    points of `y` (first and last included) that keep the visual shape of the
+    curve, peaks and troughs in particular. `x` defaults to the positions.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    # 第一與最後一點固定保留，中間分成 n_out - 2 個桶
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    # 各桶的平均點一次算好；桶 i 的三角形用下一個桶的平均點 (最後一個桶改用最後一點)
+    counts = np.diff(np.append(edges, n))
+    avg_x = (np.add.reduceat(x, edges) / counts)[1:].tolist()
+    avg_y = (np.add.reduceat(y, edges) / counts)[1:].tolist()
+
+    # 每個桶只有少數幾個點，逐點的純量迴圈比每個桶呼叫多次 NumPy 快一個數量級
+    xs, ys, bounds = x.tolist(), y.tolist(), edges.tolist()
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        xa, ya = xs[a], ys[a]
+        dx, dy = xa - avg_x[i], avg_y[i] - ya
+        best = -1.0
+        for j in range(bounds[i], bounds[i + 1]):
+            area = abs(dx * (ys[j] - ya) - (xa - xs[j]) * dy)
+            if area > best:
+                best, a = area, j
+        out[i + 1] = a
+    return out
+
+
+def chart_path(stock_code, directory=None, prefix="backtest_result"):
+    """Per-ticker PNG path, e.g. ./backtest_result_2330.TW.png, so runs for different tickers never overwrite each other."""
+    safe = re.sub(r'[^0-9A-Za-z._-]+', '_', stock_code) or "chart"
+    return os.path.join(directory or CHART_DIR, f"{prefix}_{safe}.png")
+
+
+def render_equity(path, dates, series, title, max_points=MAX_POINTS):
+    """
+    Draws equity curves [(label, values, plot kwargs)] against `dates` and saves
+    them to `path`. Uses the Agg canvas directly (no pyplot, no GUI backend), so
+    it is safe in worker processes; curves longer than `max_points` are
+    LTTB-decimated to `max_points`.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    dates = np.asarray(dates)
+    x = dates.astype('datetime64[ns]').astype(np.int64) if np.issubdtype(dates.dtype, np.datetime64) else None
+    fig = Figure(figsize=(12, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    for label, values, style in series:
+        if values is None:
+            continue
+        idx = lttb(values, max_points, x) if len(values) > max_points else slice(None)
+        ax.plot(dates[idx], np.asarray(values)[idx], label=label, **style)
+    ax.set_title(title)
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fig.savefig(path)
+    return path
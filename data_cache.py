@@ -0,0 +1,231 @@
+import os
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import data_provider
+import profiling
+
+# ===============================================
+# 本地 OHLCV 快取 (每檔標的一個可 mmap 的 .npy 檔)
+# ===============================================
+# 快取目錄可由環境變數 OHLCV_CACHE_DIR 覆寫
+CACHE_DIR = os.getenv("OHLCV_CACHE_DIR", ".ohlcv_cache")
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+RECORD_DTYPE = np.dtype([('date', 'i8')] + [(c, 'f8') for c in COLUMNS])
+
+# 同一段資料在多久之內視為最新 (避免同一小時內重複下載)
+FRESHNESS = timedelta(hours=1)
+# 還原權值 (auto_adjust) 的價格在除權息或分割後會整段改變；重抓的 K 棒與快取收盤價相差超過此比例時重建快取
+ADJUST_TOLERANCE = 1e-4
+
+
+def _to_datetime(value):
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert(None)
+    return ts.to_pydatetime()
+
+
+def _paths(ticker):
+    safe = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in ticker)
+    base = os.path.join(CACHE_DIR, safe)
+    return base + ".npy", base + ".json"
+
+
+def _read(ticker, mmap=True):
+    """Returns (records, meta) for a cached ticker, or (None, None) if absent."""
+    data_path, meta_path = _paths(ticker)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None, None
+    try:
+        records = np.load(data_path, mmap_mode='r' if mmap else None)
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return records, meta
+    except Exception as e:
+        print(f"讀取 {ticker} 快取失敗，將重新下載: {e}")
+        return None, None
+
+
+def _write(ticker, records, meta):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    data_path, meta_path = _paths(ticker)
+    # 先寫暫存檔再 rename，避免中斷時留下半個檔案
+    tmp_data = data_path + ".tmp.npy"
+    tmp_meta = meta_path + ".tmp"
+    np.save(tmp_data, records)
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_data, data_path)
+    os.replace(tmp_meta, meta_path)
+
+
+def records_to_frame(records):
+    """Converts cached records into an OHLCV DataFrame indexed by date."""
+    index = pd.DatetimeIndex(np.asarray(records['date']).astype('datetime64[ns]'), name='Date')
+    return pd.DataFrame({c: np.asarray(records[c]) for c in COLUMNS}, index=index)
+
+
+def frame_to_records(df):
+    records = np.empty(len(df), dtype=RECORD_DTYPE)
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_convert(None)
+    records['date'] = index.as_unit('ns').asi8
+    for c in COLUMNS:
+        records[c] = df[c].to_numpy(dtype='f8') if c in df else np.nan
+    return records
+
+
+def _download(provider, tickers, start, end):
+    print(f"正在下載 {len(tickers)} 支標的缺少的資料 ({start.date()} ~ {end.date()})...")
+    with profiling.phase('download'):
+        return provider.fetch(list(tickers), start, end)
+
+
+def _plan(ticker, start, end, now):
+    """Decides which [start, end) range, if any, has to be fetched for a ticker."""
+    records, meta = _read(ticker)
+    if records is None or len(records) == 0:
+        return (start, end)
+
+    covered_from = datetime.fromisoformat(meta['covered_from'])
+    fetched_until = datetime.fromisoformat(meta['fetched_until'])
+    # 與快取重疊一根已完成的 K 棒，_merge 藉此檢查還原權值的基準是否改變
+    first_overlap = pd.Timestamp(int(records['date'][min(1, len(records) - 1)])).to_pydatetime()
+    last_overlap = pd.Timestamp(int(records['date'][max(0, len(records) - 2)])).to_pydatetime()
+
+    need_head = start < covered_from
+    need_tail = min(end, now) - fetched_until > FRESHNESS
+    if need_head and need_tail:
+        return (start, end)
+    if need_head:
+        return (start, max(covered_from, first_overlap))
+    if need_tail:
+        # 從倒數第二根 K 棒重新抓起，盤中產生的未完成 K 棒會被覆蓋
+        return (last_overlap, end)
+    return None
+
+
+def _basis_changed(old_df, new_df, tolerance=ADJUST_TOLERANCE):
+    """
+    True when bars present in both frames disagree on Close by more than
+    `tolerance` (relative), i.e. the provider re-adjusted the history after a
+    split or dividend. The last cached bar is skipped: it may have been an
+    unfinished intraday bar.
+    """
+    common = old_df.index[:-1].intersection(new_df.index)
+    if common.empty:
+        return False
+    old = old_df.loc[common, 'Close'].to_numpy(dtype=np.float64)
+    new = new_df.loc[common, 'Close'].to_numpy(dtype=np.float64)
+    return not np.allclose(new, old, rtol=tolerance, atol=0, equal_nan=True)
+
+
+def _merge(ticker, new_df, fetch_start, fetch_end, now):
+    """
+    Merges fetched bars into the cache. Returns False, leaving the cache
+    untouched, when the overlapping bars show a new adjustment basis.
+    """
+    records, meta = _read(ticker, mmap=False)
+    if records is not None and len(records) > 0:
+        old_df = records_to_frame(records)
+        if _basis_changed(old_df, new_df):
+            return False
+        merged = pd.concat([old_df, new_df[COLUMNS]])
+        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+        covered_from = min(datetime.fromisoformat(meta['covered_from']), fetch_start)
+        fetched_until = max(datetime.fromisoformat(meta['fetched_until']), min(fetch_end, now))
+    else:
+        merged = new_df[COLUMNS].sort_index()
+        covered_from = fetch_start
+        fetched_until = min(fetch_end, now)
+
+    _write(ticker, frame_to_records(merged), {
+        'covered_from': covered_from.isoformat(),
+        'fetched_until': fetched_until.isoformat()
+    })
+    return True
+
+
+def _rebuild(provider, ticker, end, now):
+    """Discards a ticker's cache and downloads its whole covered range again on the current adjustment basis."""
+    _, meta = _read(ticker, mmap=False)
+    covered_from = datetime.fromisoformat(meta['covered_from'])
+    end = max(end, datetime.fromisoformat(meta['fetched_until']))
+    for path in _paths(ticker):
+        os.remove(path)
+    fetched = _download(provider, [ticker], covered_from, end)
+    if ticker in fetched:
+        _merge(ticker, fetched[ticker], covered_from, end, now)
+    else:
+        print(f"警告：{ticker} 重新下載失敗，下次執行時再試。")
+
+
+def load_many(tickers, start, end=None):
+    """
+    Returns {ticker: OHLCV DataFrame} for [start, end), served from the local cache.
+    Only the bars missing from the cache are downloaded, batched into one request
+    per distinct missing range (normally a single request for the whole list).
+    Providers that already read local or generated data bypass the cache.
+    """
+    now = datetime.now()
+    start = _to_datetime(start)
+    end = _to_datetime(end) if end is not None else now + timedelta(days=1)
+
+    provider = data_provider.get_provider()
+    if not provider.cacheable:
+        with profiling.phase('download'):
+            frames = provider.fetch(list(dict.fromkeys(tickers)), start, end)
+        # 與快取路徑一致：檔案沒有的欄位 (例如 Open、Volume) 以 NaN 補上
+        return {t: df.reindex(columns=COLUMNS).rename_axis('Date') for t, df in frames.items()}
+
+    # 依缺少的區間分組，同一區間的標的一次下載
+    groups = {}
+    for ticker in dict.fromkeys(tickers):
+        rng = _plan(ticker, start, end, now)
+        if rng is not None:
+            groups.setdefault(rng, []).append(ticker)
+
+    for (fetch_start, fetch_end), group in groups.items():
+        fetched = _download(provider, group, fetch_start, fetch_end)
+        for ticker in group:
+            if ticker in fetched:
+                if not _merge(ticker, fetched[ticker], fetch_start, fetch_end, now):
+                    print(f"{ticker} 的還原價格基準已改變 (除權息或分割)，重新下載完整歷史...")
+                    _rebuild(provider, ticker, end, now)
+            else:
+                print(f"警告：{ticker} 沒有下載到新資料，改用既有快取。")
+
+    frames = {}
+    lo = np.datetime64(start, 'ns').astype('i8')
+    hi = np.datetime64(end, 'ns').astype('i8')
+    for ticker in dict.fromkeys(tickers):
+        records, _ = _read(ticker)
+        if records is None:
+            continue
+        dates = np.asarray(records['date'])
+        i0, i1 = np.searchsorted(dates, [lo, hi], side='left')
+        frames[ticker] = records_to_frame(records[i0:i1])
+    return frames
+
+
+def load_history(ticker, start, end=None):
+    """Returns the OHLCV DataFrame of one ticker for [start, end); empty if unavailable."""
+    frames = load_many([ticker], start, end)
+    if ticker in frames:
+        return frames[ticker]
+    return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], name='Date'))
+
+
+def as_wide(frames):
+    """Combines per-ticker frames into the (field, ticker) column layout of yf.download."""
+    if not frames:
+        return pd.DataFrame()
+    wide = pd.concat(frames, axis=1)
+    return wide.swaplevel(0, 1, axis=1).sort_index(axis=1)
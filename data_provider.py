@@ -0,0 +1,228 @@
+import os
+import zlib
+from datetime import datetime
+
+# ===============================================
+# 市場資料來源 (yfinance / 本地 CSV、Parquet / 合成資料)
+# ===============================================
+# 來源可由 --provider 或環境變數 MARKET_DATA_PROVIDER 選擇，預設 yfinance
+# numpy / pandas 只在實際取資料時載入，讓 stock_monitor 在檢查設定前不必付出載入成本
+DEFAULT_PROVIDER = "yfinance"
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def synthetic_ohlcv(n_bars, seed=0, start_price=100.0, mu=0.0002, sigma=0.02, index=None):
+    """
+    Geometric Brownian motion OHLCV frame with `n_bars` rows, reproducible per seed.
+    High/Low bracket Open/Close by a random intraday range. Without `index` the
+    frame is minute based so a million bars stay inside pandas' timestamp range.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    log_ret = (mu - 0.5 * sigma ** 2) + sigma * rng.standard_normal(n_bars)
+    close = start_price * np.exp(np.cumsum(log_ret))
+    open_ = np.empty(n_bars)
+    open_[0] = start_price
+    open_[1:] = close[:-1]
+    spread = np.abs(rng.normal(0, sigma / 2, (2, n_bars)))
+    high = np.maximum(open_, close) * (1 + spread[0])
+    low = np.minimum(open_, close) * (1 - spread[1])
+    volume = rng.integers(1_000, 1_000_000, n_bars).astype(np.float64)
+    if index is None:
+        index = pd.date_range("2000-01-03 09:00", periods=n_bars, freq="min")
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}, index=index)
+
+
+def _slice(df, start, end):
+    """Rows with start <= date < end, like yf.download(start=..., end=...)."""
+    import pandas as pd
+
+    index = df.index
+    i0, i1 = index.searchsorted([pd.Timestamp(start), pd.Timestamp(end)], side='left')
+    return df.iloc[i0:i1]
+
+
+def split_download(data, tickers):
+    """Splits a yf.download result into {ticker: flat OHLCV frame}."""
+    import pandas as pd
+
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    if isinstance(data.columns, pd.MultiIndex):
+        available = set(data.columns.get_level_values(1))
+        for ticker in tickers:
+            if ticker in available:
+                frames[ticker] = data.xs(ticker, axis=1, level=1)
+    elif len(tickers) == 1:
+        frames[tickers[0]] = data
+    for ticker, df in list(frames.items()):
+        df = df.dropna(subset=['Close'])
+        if df.empty:
+            del frames[ticker]
+        else:
+            frames[ticker] = df
+    return frames
+
+
+class YFinanceProvider:
+    """Downloads from Yahoo Finance; results go through the local OHLCV cache."""
+
+    name = "yfinance"
+    cacheable = True
+
+    def fetch(self, tickers, start, end):
+        """Returns {ticker: OHLCV DataFrame} for [start, end) daily bars."""
+        import yfinance as yf
+
+        try:
+            data = yf.download(tickers=list(tickers), start=start.strftime('%Y-%m-%d'),
+                               end=end.strftime('%Y-%m-%d'), auto_adjust=True,
+                               progress=False, group_by='column')
+        except Exception as e:
+            print(f"下載失敗: {e}")
+            return {}
+        return split_download(data, list(tickers))
+
+    def intraday(self, tickers):
+        """Returns {ticker: today's 1-minute OHLCV DataFrame}."""
+        import yfinance as yf
+
+        try:
+            data = yf.download(tickers=list(tickers), period='1d', interval='1m',
+                               auto_adjust=True, progress=False, group_by='column')
+        except Exception as e:
+            print(f"取得即時報價失敗: {e}")
+            return {}
+        return split_download(data, list(tickers))
+
+
+class LocalFileProvider:
+    """
+    Reads <dir>/<ticker>.parquet or <dir>/<ticker>.csv with a date column (or index)
+    and OHLCV columns. The directory comes from MARKET_DATA_DIR (default "market_data").
+    """
+
+    name = "local"
+    cacheable = False
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.getenv("MARKET_DATA_DIR", "market_data")
+
+    def _read(self, ticker):
+        import pandas as pd
+
+        base = os.path.join(self.directory, ticker)
+        if os.path.exists(base + ".parquet"):
+            df = pd.read_parquet(base + ".parquet")
+        elif os.path.exists(base + ".csv"):
+            df = pd.read_csv(base + ".csv")
+        else:
+            print(f"警告：找不到 {ticker} 的本地資料 ({base}.parquet / .csv)")
+            return None
+
+        if not isinstance(df.index, pd.DatetimeIndex):
+            date_col = next((c for c in df.columns if str(c).lower() in ('date', 'datetime', 'timestamp')), df.columns[0])
+            df = df.set_index(pd.DatetimeIndex(pd.to_datetime(df[date_col]), name='Date')).drop(columns=[date_col])
+        df.columns = [str(c).capitalize() for c in df.columns]
+        if df.index.tz is not None:
+            df.index = df.index.tz_convert(None)
+        return df.sort_index()
+
+    def fetch(self, tickers, start, end):
+        frames = {}
+        for ticker in tickers:
+            df = self._read(ticker)
+            if df is None:
+                continue
+            df = _slice(df, start, end).dropna(subset=['Close'])
+            if not df.empty:
+                frames[ticker] = df
+        return frames
+
+    def intraday(self, tickers):
+        """The rows of each file's last date, standing in for today's bars."""
+        frames = {}
+        for ticker in tickers:
+            df = self._read(ticker)
+            if df is None or df.empty:
+                continue
+            last_day = df.index[-1].normalize()
+            frames[ticker] = df[df.index >= last_day]
+        return frames
+
+
+class SyntheticProvider:
+    """
+    Seeded GBM daily bars on business days. Each ticker gets its own seed derived
+    from MARKET_DATA_SEED and the ticker name, and its path always starts at EPOCH,
+    so any requested range is a consistent slice of the same series.
+    """
+
+    name = "synthetic"
+    cacheable = False
+    EPOCH = "1990-01-01"
+
+    def __init__(self, seed=None):
+        self.seed = int(seed if seed is not None else os.getenv("MARKET_DATA_SEED", "0"))
+
+    def _series(self, ticker, end):
+        import pandas as pd
+
+        index = pd.bdate_range(self.EPOCH, pd.Timestamp(end), name='Date')
+        seed = self.seed + zlib.crc32(ticker.encode('utf-8'))
+        return synthetic_ohlcv(len(index), seed=seed, index=index)
+
+    def fetch(self, tickers, start, end):
+        return {ticker: _slice(self._series(ticker, end), start, end) for ticker in tickers}
+
+    def intraday(self, tickers):
+        import pandas as pd
+
+        today = pd.Timestamp.now().normalize()
+        return {ticker: self._series(ticker, today).tail(1) for ticker in tickers}
+
+
+PROVIDERS = {
+    YFinanceProvider.name: YFinanceProvider,
+    LocalFileProvider.name: LocalFileProvider,
+    SyntheticProvider.name: SyntheticProvider
+}
+
+_active = None
+
+
+def set_provider(name):
+    """Selects the provider used by data_cache and the monitor for this process."""
+    global _active
+    if name not in PROVIDERS:
+        raise ValueError(f"未知的資料來源 '{name}'，可用: {', '.join(sorted(PROVIDERS))}")
+    _active = PROVIDERS[name]()
+    return _active
+
+
+def get_provider():
+    """Returns the selected provider, defaulting to MARKET_DATA_PROVIDER or yfinance."""
+    if _active is None:
+        return set_provider(os.getenv("MARKET_DATA_PROVIDER", DEFAULT_PROVIDER))
+    return _active
+
+
+def parse_date(date_str):
+    """Parses a YYYY-MM-DD or YYYYMMDD command-line date; returns None when it cannot."""
+    if not date_str:
+        return None
+    date_str = date_str.strip()
+    for fmt in ('%Y-%m-%d', '%Y%m%d'):
+        try:
+            return datetime.strptime(date_str, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def add_provider_argument(parser):
+    parser.add_argument('--provider', choices=sorted(PROVIDERS), default=None,
+                        help='Market data source (default: $MARKET_DATA_PROVIDER or yfinance)')
@@ -0,0 +1,95 @@
+import numpy as np
+
+import indicators
+import profiling
+from strategy_kernel import AtrStrategy, HoldStrategy, SmaStrategy, TrendStrategy, as_close_array, run_strategies, trade_factors
+
+# ===============================================
+# 共用回測引擎 (市場成本模型 + 多策略單次走訪)
+# ===============================================
+
+SLIPPAGE = 0.001  # 0.1% 滑價
+
+
+def _market(label, fee, tax, slippage=SLIPPAGE):
+    buy_cost, sell_keep = trade_factors(fee, tax, slippage)
+    return {
+        'market': label,
+        'fee': fee,
+        'tax': tax,
+        'slippage': slippage,
+        'buy_cost': buy_cost,
+        'sell_keep': sell_keep
+    }
+
+
+# 每個市場的成本因子只計算一次
+MARKETS = {
+    'tw': _market('台股', 0.001425 * 0.65, 0.003),
+    'us': _market('美股/複委託', 0.005, 0.0)
+}
+
+
+def is_taiwan(stock_code):
+    return ".TW" in stock_code or ".TWO" in stock_code
+
+
+def normalize_ticker(ticker):
+    """A bare 4-digit code is a TWSE listing (2330 -> 2330.TW); other tickers are kept."""
+    return f"{ticker}.TW" if ticker.isdigit() and len(ticker) == 4 else ticker
+
+
+def fee_model(stock_code, slippage=SLIPPAGE):
+    """Returns the precomputed cost model ('fee', 'tax', 'buy_cost', 'sell_keep', ...) of a ticker's market."""
+    model = MARKETS['tw' if is_taiwan(stock_code) else 'us']
+    if slippage != model['slippage']:
+        model = _market(model['market'], model['fee'], model['tax'], slippage)
+    return model
+
+
+def market_costs(stock_code):
+    """
+    回傳 (手續費率, 賣出交易稅率)
+    """
+    costs = fee_model(stock_code)
+    return costs['fee'], costs['tax']
+
+
+def run_backtest(df, stock_code, strategies, initial_capital=10000, record_equity=True, slippage=SLIPPAGE,
+                 equity_dtype=np.float64):
+    """
+    Runs the named strategy plugins ({name: plugin}) over one price frame in a
+    single pass. Returns {name: StrategyResult} plus 'costs' with the market cost
+    model. record_equity=False skips the per-bar curves when only finals and
+    trade counts are needed.
+    """
+    costs = fee_model(stock_code, slippage)
+    close = as_close_array(df)
+    high = df['High'].to_numpy(dtype=np.float64) if 'High' in df else None
+    low = df['Low'].to_numpy(dtype=np.float64) if 'Low' in df else None
+    # 只有需要指標的策略才計算資料指紋
+    key = indicators.frame_key(df, stock_code) if high is not None and any(
+        isinstance(s, (SmaStrategy, AtrStrategy)) for s in strategies.values()) else None
+
+    names = list(strategies)
+    with profiling.phase('run_backtest'):
+        results = run_strategies(close, [strategies[n] for n in names], costs['buy_cost'], costs['sell_keep'],
+                                 initial_capital=initial_capital, record_equity=record_equity,
+                                 high=high, low=low, key=key, equity_dtype=equity_dtype)
+    out = dict(zip(names, results))
+    out['costs'] = costs
+    return out
+
+
+def standard_strategies(buy_threshold=0.1, sell_threshold=0.1, sma_window=None, cooldown=3,
+                        atr_window=None, atr_multiplier=3.0):
+    """Strategy A and B, plus C / D when their window is given."""
+    strategies = {
+        'a': HoldStrategy(),
+        'b': TrendStrategy(buy_threshold, sell_threshold)
+    }
+    if sma_window is not None:
+        strategies['c'] = SmaStrategy(sma_window, cooldown)
+    if atr_window is not None:
+        strategies['d'] = AtrStrategy(atr_window, atr_multiplier)
+    return strategies
@@ -0,0 +1,161 @@
+import os
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# ===============================================
+# 指標快取層 (SMA、ATR)
+# ===============================================
+# 記憶體 LRU 上限 (MB) 可由 INDICATOR_CACHE_MB 設定；
+# 設定 INDICATOR_CACHE_DIR 時另外啟用磁碟快取 (跨執行、跨 process 共用)
+CACHE_MB = float(os.getenv("INDICATOR_CACHE_MB", "256"))
+CACHE_DIR = os.getenv("INDICATOR_CACHE_DIR")
+
+
+class LRUCache:
+    """In-process LRU of NumPy arrays bounded by total nbytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if value.nbytes > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self._items[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self._items.clear()
+        self.nbytes = 0
+
+
+_cache = LRUCache(int(CACHE_MB * 1024 * 1024))
+
+
+def compute_sma(close, window):
+    return pd.Series(close).rolling(window=int(window)).mean().to_numpy()
+
+
+def compute_true_range(high, low, close):
+    h, l, c = pd.Series(high), pd.Series(low), pd.Series(close)
+    ranges = pd.concat([h - l, (h - c.shift()).abs(), (l - c.shift()).abs()], axis=1)
+    return ranges.max(axis=1).to_numpy()
+
+
+def compute_atr(high, low, close, window):
+    return compute_sma(compute_true_range(high, low, close), window)
+
+
+def _true_range_entry(high, low, close, window):
+    # 真實波幅沒有窗口參數，window 只為了與其他指標共用介面
+    return compute_true_range(high, low, close)
+
+
+# 名稱 -> (計算函式, 需要的欄位)
+INDICATORS = {
+    'sma': (compute_sma, ('close',)),
+    'atr': (compute_atr, ('high', 'low', 'close')),
+    'true_range': (_true_range_entry, ('high', 'low', 'close')),
+}
+
+
+def fingerprint(*arrays):
+    """Content hash of price arrays, used as the data key when no ticker/range is given."""
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a, dtype=np.float64)
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def _disk_path(key):
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, digest + ".npy")
+
+
+def get(name, window, data, key=None):
+    """
+    Returns indicator `name` with `window` over `data` ({'close', 'high', 'low'} arrays).
+
+    `key` identifies the data, e.g. (ticker, first_date, last_date); without it the
+    arrays' content fingerprint is used. Each (key, name, window) is computed once
+    and then served from the in-process LRU, or from disk if INDICATOR_CACHE_DIR is set.
+    """
+    func, fields = INDICATORS[name]
+    arrays = [data[f] for f in fields]
+    if key is None:
+        key = fingerprint(*arrays)
+    return _get(name, window, arrays, key)
+
+
+def _get(name, window, arrays, key):
+    func, _ = INDICATORS[name]
+    full_key = (key, name, int(window))
+
+    value = _cache.get(full_key)
+    if value is not None:
+        return value
+
+    if CACHE_DIR:
+        path = _disk_path(full_key)
+        if os.path.exists(path):
+            try:
+                value = np.load(path)
+            except Exception:
+                value = None
+    if value is None:
+        if name == 'atr':
+            # 真實波幅與窗口無關，所有 ATR 窗口共用同一份
+            value = compute_sma(_get('true_range', 0, arrays, key), window)
+        else:
+            value = func(*arrays, window)
+        if CACHE_DIR:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp = _disk_path(full_key) + ".tmp.npy"
+            np.save(tmp, value)
+            os.replace(tmp, _disk_path(full_key))
+
+    value.setflags(write=False)
+    _cache.put(full_key, value)
+    return value
+
+
+def frame_data(df):
+    """Extracts the arrays used by the indicators from an OHLC DataFrame."""
+    return {
+        'close': df['Close'].to_numpy(dtype=np.float64),
+        'high': df['High'].to_numpy(dtype=np.float64),
+        'low': df['Low'].to_numpy(dtype=np.float64)
+    }
+
+
+def frame_key(df, ticker):
+    """
+    (ticker, first date, last date, content hash) key for a price frame. The hash
+    keeps re-adjusted or re-downloaded prices for the same range from reusing stale values.
+    """
+    data = frame_data(df)
+    return (ticker, str(df.index[0]), str(df.index[-1]), fingerprint(data['high'], data['low'], data['close']))
+
+
+def clear_cache():
+    """Drops the in-process tier (the disk tier, if any, is kept)."""
+    _cache.clear()
+
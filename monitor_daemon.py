@@ -0,0 +1,156 @@
+import time
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+import data_cache
+import data_provider
+from stock_monitor import evaluate_status, format_report_block, send_ntfy_notification
+
+# ===============================================
+# 盤中常駐監控 (輪詢報價 + O(1) 滾動高低點)
+# ===============================================
+
+
+class RollingExtremes:
+    """
+    Rolling peak/valley over the last `lookback` daily bars, today's partial bar
+    included, kept in monotonic deques so each new tick costs amortized O(1).
+    """
+
+    def __init__(self, lookback=30):
+        self.lookback = lookback
+        self._seq = 0
+        self._max = deque()  # (seq, high)，high 由大到小
+        self._min = deque()  # (seq, low)，low 由小到大
+        self.prev_close = None
+        self.day = None
+        self.day_high = None
+        self.day_low = None
+        self.day_close = None
+
+    def push_bar(self, high, low, close):
+        """Appends one completed daily bar and evicts bars that fell out of the window."""
+        seq = self._seq
+        self._seq += 1
+        while self._max and self._max[-1][1] <= high:
+            self._max.pop()
+        self._max.append((seq, high))
+        while self._min and self._min[-1][1] >= low:
+            self._min.pop()
+        self._min.append((seq, low))
+
+        # 已完成的 K 棒只保留 lookback - 1 根，另一根是今天盤中的 K 棒
+        oldest = seq - (self.lookback - 2)
+        while self._max and self._max[0][0] < oldest:
+            self._max.popleft()
+        while self._min and self._min[0][0] < oldest:
+            self._min.popleft()
+        self.prev_close = close
+
+    def update(self, day, price, high=None, low=None):
+        """Feeds a tick for `day`; a new day first rolls the previous day into the window."""
+        if self.day is not None and day != self.day:
+            self.push_bar(self.day_high, self.day_low, self.day_close)
+            self.day = None
+
+        high = price if high is None else max(high, price)
+        low = price if low is None else min(low, price)
+        if self.day is None:
+            self.day, self.day_high, self.day_low = day, high, low
+        else:
+            self.day_high = max(self.day_high, high)
+            self.day_low = min(self.day_low, low)
+        self.day_close = price
+
+    def seed(self, df):
+        """Seeds the window from daily High/Low/Close history; the last row becomes the current day."""
+        df = df[['High', 'Low', 'Close']].dropna().tail(self.lookback)
+        if df.empty:
+            return
+        for high, low, close in df.iloc[:-1].itertuples(index=False):
+            self.push_bar(high, low, close)
+        last = df.iloc[-1]
+        self.day = df.index[-1].date()
+        self.day_high, self.day_low, self.day_close = last['High'], last['Low'], last['Close']
+
+    def trends(self):
+        """Returns the same fields as one row of stock_monitor.calculate_wide_trends, or None before two bars exist."""
+        if self.day is None or self.prev_close is None:
+            return None
+        peak = max(self._max[0][1], self.day_high) if self._max else self.day_high
+        valley = min(self._min[0][1], self.day_low) if self._min else self.day_low
+        price = self.day_close
+        return {
+            "price": price,
+            "daily_change": ((price - self.prev_close) / self.prev_close) * 100,
+            "peak": peak,
+            "valley": valley,
+            "drop": ((price - peak) / peak) * 100,
+            "recovery": ((price - valley) / valley) * 100
+        }
+
+
+def fetch_latest_quotes(tickers):
+    """Returns {ticker: (day, price, day_high, day_low)} from today's 1-minute bars."""
+    quotes = {}
+    for ticker, df in data_provider.get_provider().intraday(list(tickers)).items():
+        last_ts = df.index[-1]
+        quotes[ticker] = (last_ts.date(), float(df['Close'].iloc[-1]),
+                          float(df['High'].max()), float(df['Low'].min()))
+    return quotes
+
+
+def _evaluate(item, res):
+    is_drop_hit = res["drop"] <= -item["drop"]
+    is_rec_hit = res["recovery"] >= item["rec"]
+    return evaluate_status(item.get("cost"), is_drop_hit, is_rec_hit)
+
+
+def run_daemon(config, topic, interval=300, lookback=30, iterations=None):
+    """
+    Polls prices every `interval` seconds and sends an alert as soon as a ticker
+    crosses into a drop/recovery status. Runs forever unless `iterations` is set.
+    """
+    tickers = list(dict.fromkeys(s["ticker"] for s in config))
+    start_dt = datetime.now() - pd.DateOffset(months=3)
+    history = data_cache.load_many(tickers, start=start_dt)
+
+    windows = {}
+    for ticker in tickers:
+        windows[ticker] = RollingExtremes(lookback)
+        if ticker in history:
+            windows[ticker].seed(history[ticker])
+
+    # 啟動時的狀態只做記錄，之後「新跨越」門檻才發送警示
+    last_status = {}
+    for i, item in enumerate(config):
+        res = windows[item["ticker"]].trends()
+        if res is not None:
+            last_status[i] = _evaluate(item, res)[0]
+
+    print(f"--- 盤中監控啟動 (標的數量: {len(tickers)}, 每 {interval} 秒輪詢) ---")
+    polls = 0
+    while iterations is None or polls < iterations:
+        quotes = fetch_latest_quotes(tickers)
+        for ticker, (day, price, high, low) in quotes.items():
+            windows[ticker].update(day, price, high, low)
+
+        alert_blocks = []
+        for i, item in enumerate(config):
+            res = windows[item["ticker"]].trends()
+            if res is None:
+                continue
+            status_tag, advice = _evaluate(item, res)
+            if status_tag != last_status.get(i) and status_tag != "正常":
+                alert_blocks.append(format_report_block(item["name"], item["ticker"], res,
+                                                        item.get("cost"), status_tag, advice))
+            last_status[i] = status_tag
+
+        if alert_blocks:
+            send_ntfy_notification(topic, "盤中即時警示", alert_blocks)
+
+        polls += 1
+        if iterations is None or polls < iterations:
+            time.sleep(interval)
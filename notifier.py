@@ -0,0 +1,127 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ===============================================
+# ntfy 通知傳送層 (連線池、逾時、重試、自動分段)
+# ===============================================
+
+# 可用環境變數 NTFY_SERVER 指向自架或測試用的 ntfy 伺服器
+DEFAULT_SERVER = "https://ntfy.sh"
+# ntfy 單則訊息上限為 4096 bytes，超過會被轉成附件，保留一點空間給分段標記
+MAX_MESSAGE_BYTES = 4000
+TIMEOUT = (5, 15)  # (連線, 讀取) 秒
+RETRIES = 3
+BACKOFF = 1.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size=8):
+    """Returns the shared pooled HTTP session used for all ntfy requests."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def _split_oversized(text, limit):
+    """Splits a single block that exceeds the limit on line boundaries (or bytes as a last resort)."""
+    parts = []
+    current = ""
+    for line in text.split("\n"):
+        candidate = line if not current else current + "\n" + line
+        if len(candidate.encode('utf-8')) <= limit:
+            current = candidate
+            continue
+        if current:
+            parts.append(current)
+        # 單行仍過長時，依 UTF-8 位元組切開且不切斷字元
+        data = line.encode('utf-8')
+        while len(data) > limit:
+            piece = data[:limit].decode('utf-8', errors='ignore')
+            parts.append(piece)
+            data = data[len(piece.encode('utf-8')):]
+        current = data.decode('utf-8')
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_message(blocks, limit=MAX_MESSAGE_BYTES, separator="\n\n"):
+    """
+    Packs report blocks into as few messages as possible, each at most `limit`
+    bytes of UTF-8. Blocks are never split unless a single block is too large.
+    """
+    if isinstance(blocks, str):
+        blocks = [blocks]
+    messages = []
+    current = ""
+    for block in blocks:
+        for piece in ([block] if len(block.encode('utf-8')) <= limit else _split_oversized(block, limit)):
+            candidate = piece if not current else current + separator + piece
+            if len(candidate.encode('utf-8')) <= limit:
+                current = candidate
+            else:
+                messages.append(current)
+                current = piece
+    if current:
+        messages.append(current)
+    return messages
+
+
+def post_with_retry(url, data, headers, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """POSTs with bounded timeouts, retrying connection errors and 429/5xx with exponential backoff."""
+    session = get_session()
+    for attempt in range(retries + 1):
+        try:
+            response = session.post(url, data=data, headers=headers, timeout=timeout)
+            if response.status_code not in RETRY_STATUS or attempt == retries:
+                response.raise_for_status()
+                return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries:
+                raise
+        time.sleep(backoff * (2 ** attempt))
+
+
+def send_report(topic, title, blocks, server=None, max_workers=4, priority="high",
+                tags="chart_with_upwards_trend"):
+    """
+    Sends report blocks to an ntfy topic, split into messages under the size
+    limit and delivered concurrently. Returns the number of messages that failed.
+    """
+    server = (server or os.getenv("NTFY_SERVER") or DEFAULT_SERVER).rstrip("/")
+    url = f"{server}/{topic}"
+    messages = split_message(blocks)
+    total = len(messages)
+
+    def send(index, message):
+        part_title = title if total == 1 else f"{title} ({index}/{total})"
+        post_with_retry(url, message.encode('utf-8'), {
+            "Title": part_title.encode('utf-8'),
+            "Priority": priority,
+            "Tags": tags
+        })
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as pool:
+        futures = [pool.submit(send, i, m) for i, m in enumerate(messages, 1)]
+        for i, future in enumerate(futures, 1):
+            try:
+                future.result()
+            except requests.exceptions.RequestException as e:
+                failed += 1
+                print(f"發送第 {i}/{total} 則 ntfy 通知時發生錯誤: {e}")
+    return failed
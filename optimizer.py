@@ -0,0 +1,271 @@
+import os
+import itertools
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import profiling
+from strategy_kernel import run_atr_kernel, run_sma_kernel, run_trend_kernel, threshold_grid
+
+# ===============================================
+# 平行化 2D 參數優化 (Strategy B / C / D)
+# ===============================================
+
+DEFAULT_RANGE = (0.03, 0.15, 0.02)
+DEFAULT_SMA_RANGE = (10, 60, 10)
+DEFAULT_COOLDOWN_RANGE = (0, 5, 1)
+DEFAULT_ATR_RANGE = (7, 28, 7)
+DEFAULT_MULT_RANGE = (1.5, 4.5, 0.5)
+SEARCH_MODES = ('grid', 'adaptive')
+# 自適應搜尋每一輪往下細化的候選格數
+DEFAULT_KEEP = 3
+
+
+def build_thresholds(start, stop, step):
+    """Returns thresholds from start to stop (inclusive) in increments of step."""
+    if step <= 0:
+        raise ValueError("step must be positive")
+    return np.arange(start, stop + step / 2, step)
+
+
+def pct_decimals(values):
+    """Number of decimals needed to print thresholds as percentages (0 or 1)."""
+    pct = np.asarray(values) * 100
+    return 0 if np.allclose(pct, np.round(pct)) else 1
+
+
+def _evaluate_trend_chunk(data, buy_t, sell_t, fee, tax):
+    res = run_trend_kernel(data, buy_t, sell_t, fee, tax)
+    return res['final'], res['trades']
+
+
+def _evaluate_sma_chunk(data, windows, cooldowns, fee, tax):
+    res = run_sma_kernel(data, windows, cooldowns, fee, tax)
+    return res['final'], res['trades']
+
+
+def _evaluate_atr_chunk(data, windows, multipliers, fee, tax):
+    high, low, close = data
+    res = run_atr_kernel(high, low, close, windows, multipliers, fee, tax)
+    return res['final'], res['trades']
+
+
+_DATA = None
+
+
+def _init_worker(data):
+    global _DATA
+    _DATA = data
+
+
+def _evaluate_shared(evaluate, param_a, param_b, fee, tax):
+    return evaluate(_DATA, param_a, param_b, fee, tax)
+
+
+def _pool(data, workers):
+    """Process pool whose workers receive `data` once, when they start."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,))
+
+
+def _run_cells(evaluate, data, param_a, param_b, fee, tax, workers, chunk_size, progress, pool=None):
+    """
+    Splits flat parameter vectors into chunks and evaluates them in-process or
+    across a process pool; `pool` (from _pool with the same data) is reused
+    instead of starting a new one.
+    """
+    n_cells = len(param_a)
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        # 每個 worker 約分到 4 個 chunk，讓進度回報與負載平衡都夠細
+        chunk_size = max(64, -(-n_cells // (workers * 4)))
+
+    bounds = [(i, min(i + chunk_size, n_cells)) for i in range(0, n_cells, chunk_size)]
+    final = np.empty(n_cells)
+    trades = np.empty(n_cells, dtype=np.int64)
+
+    def report(done_cells, done_chunks):
+        if progress:
+            print(f"  進度: chunk {done_chunks}/{len(bounds)} ({done_cells}/{n_cells} 組)")
+
+    done_cells = 0
+    if workers == 1 or len(bounds) == 1:
+        for k, (i0, i1) in enumerate(bounds, 1):
+            final[i0:i1], trades[i0:i1] = evaluate(data, param_a[i0:i1], param_b[i0:i1], fee, tax)
+            done_cells += i1 - i0
+            report(done_cells, k)
+    else:
+        with _pool(data, workers) if pool is None else nullcontext(pool) as executor:
+            futures = {
+                executor.submit(_evaluate_shared, evaluate, param_a[i0:i1], param_b[i0:i1], fee, tax): (i0, i1)
+                for i0, i1 in bounds
+            }
+            for k, future in enumerate(as_completed(futures), 1):
+                i0, i1 = futures[future]
+                final[i0:i1], trades[i0:i1] = future.result()
+                done_cells += i1 - i0
+                report(done_cells, k)
+    return final, trades
+
+
+def default_budget(n_cells):
+    """Evaluation budget of the adaptive search when none is given: a quarter of the grid, at least 64 cells."""
+    return min(n_cells, max(64, n_cells // 4))
+
+
+def adaptive_search(shape, evaluate, budget=None, keep=DEFAULT_KEEP, progress=True):
+    """
+    Coarse-to-fine search over a parameter lattice of `shape` (any number of axes).
+
+    A coarse sub-grid (every s-th index, endpoints included) is evaluated first;
+    each round then halves s and evaluates the 3^D neighbours of the `keep` best
+    cells so far, and at s = 1 keeps climbing until the neighbourhoods of the
+    best cells (the plateau around the optimum) are fully mapped or `budget`
+    evaluations are spent. `evaluate` receives an (n, D) array of lattice
+    indices and returns (final, trades). Returns flat C-order arrays with NaN /
+    -1 for cells never evaluated, plus the number of evaluations.
+    """
+    shape = tuple(int(n) for n in shape)
+    n_cells = int(np.prod(shape))
+    budget = default_budget(n_cells) if budget is None else max(1, min(int(budget), n_cells))
+    final = np.full(n_cells, np.nan)
+    trades = np.full(n_cells, -1, dtype=np.int64)
+    done = np.zeros(n_cells, dtype=bool)
+    used = 0
+
+    def run(cells, stride):
+        nonlocal used
+        cells = cells[:budget - used]
+        idx = np.column_stack(np.unravel_index(cells, shape))
+        final[cells], trades[cells] = evaluate(idx)
+        done[cells] = True
+        used += len(cells)
+        if progress:
+            print(f"  間隔 {stride}: 評估 {len(cells)} 組 (累計 {used}/{n_cells})")
+
+    # 粗網格的格數控制在預算的一半以內，剩下的留給細化
+    stride = 1
+    while np.prod([-(-n // stride) for n in shape]) > budget // 2 and stride < max(shape):
+        stride *= 2
+    axes = [np.unique(np.r_[np.arange(0, n, stride), n - 1]) for n in shape]
+    run(np.ravel_multi_index(np.meshgrid(*axes, indexing='ij'), shape).ravel(), stride)
+
+    offsets = np.array(list(itertools.product((-1, 0, 1), repeat=len(shape))))
+    upper = np.array(shape) - 1
+    while used < budget:
+        stride = max(1, stride // 2)
+        evaluated = np.flatnonzero(done)
+        parents = evaluated[np.argsort(-final[evaluated], kind='stable')[:keep]]
+        # 依母格排名排列，預算不足時先評估最佳格的鄰居
+        coords = np.column_stack(np.unravel_index(parents, shape))
+        neighbours = np.clip(coords[:, None, :] + offsets * stride, 0, upper).reshape(-1, len(shape))
+        cells = np.ravel_multi_index(neighbours.T, shape)
+        _, first = np.unique(cells, return_index=True)
+        cells = cells[np.sort(first)]
+        cells = cells[~done[cells]]
+        if len(cells):
+            run(cells, stride)
+        elif stride == 1:
+            break
+    return final, trades, used
+
+
+def _stored_cells(evaluate, data, param_a, param_b, fee, tax, workers, chunk_size, progress, store, pool=None):
+    """_run_cells that first takes the cells already in `store` (results_store.CellStore) and saves the new ones."""
+    if store is None:
+        return _run_cells(evaluate, data, param_a, param_b, fee, tax, workers, chunk_size, progress, pool)
+    final, trades, found = store.lookup(param_a, param_b)
+    missing = ~found
+    if missing.any():
+        final[missing], trades[missing] = _run_cells(evaluate, data, param_a[missing], param_b[missing], fee, tax,
+                                                     workers, chunk_size, progress, pool)
+        store.save(param_a[missing], param_b[missing], final[missing], trades[missing])
+    return final, trades
+
+
+def _search(evaluate, data, axis_a, axis_b, fee, tax, workers, chunk_size, progress, search, budget, store=None):
+    """Evaluates the (axis_a x axis_b) grid exhaustively or adaptively; returns (final, trades, evaluations)."""
+    with profiling.phase('grid_search'):
+        if search == 'grid':
+            # 保留參數軸的型別 (SMA / ATR 天數為整數)
+            grid_a, grid_b = (g.ravel() for g in np.meshgrid(axis_a, axis_b, indexing='ij'))
+            final, trades = _stored_cells(evaluate, data, grid_a, grid_b, fee, tax, workers, chunk_size, progress, store)
+            return final, trades, len(final)
+        if search != 'adaptive':
+            raise ValueError(f"未知的搜尋方式 '{search}'，可用: {', '.join(SEARCH_MODES)}")
+        # 每一輪細化共用同一個 process pool (worker 在第一次送出工作時才啟動，資料只傳送一次)
+        workers = workers or os.cpu_count() or 1
+        with _pool(data, workers) if workers > 1 else nullcontext() as pool:
+            return adaptive_search(
+                (len(axis_a), len(axis_b)),
+                lambda idx: _stored_cells(evaluate, data, axis_a[idx[:, 0]], axis_b[idx[:, 1]], fee, tax,
+                                          workers, chunk_size, False, store, pool),
+                budget=budget, progress=progress)
+
+
+def search_summary(grid):
+    """One-line report of evaluations spent versus the exhaustive grid."""
+    total = len(grid['final'])
+    return f"評估 {grid['evaluations']} / {total} 組 ({grid['evaluations'] / total:.0%} 的完整網格)"
+
+
+def optimize_grid(close, buy_thresholds, sell_thresholds, fee, tax,
+                  workers=None, chunk_size=None, progress=True, search='grid', budget=None, store=None):
+    """
+    Evaluates Strategy B on the (buy_t, sell_t) grid.
+
+    The flattened grid is split into chunks that are evaluated by the vectorized
+    kernel across a process pool (`workers` processes, all cores by default;
+    1 runs in-process). search='adaptive' evaluates only the cells picked by
+    adaptive_search within `budget`. Returns a dict of flat arrays 'buy', 'sell',
+    'final' and 'trades' in buy-major order (NaN / -1 for skipped cells) plus
+    'evaluations'. With a results_store.CellStore as `store`, cells already in
+    the database are reused and new ones are saved.
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    buy_thresholds = np.asarray(buy_thresholds, dtype=np.float64)
+    sell_thresholds = np.asarray(sell_thresholds, dtype=np.float64)
+    buy_grid, sell_grid = threshold_grid(buy_thresholds, sell_thresholds)
+    final, trades, evaluations = _search(_evaluate_trend_chunk, close, buy_thresholds, sell_thresholds, fee, tax,
+                                         workers, chunk_size, progress, search, budget, store)
+    return {
+        'buy': buy_grid,
+        'sell': sell_grid,
+        'final': final,
+        'trades': trades,
+        'evaluations': evaluations
+    }
+
+
+def sweep_sma(close, sma_windows, cooldowns, fee, tax, workers=None, chunk_size=None, progress=True,
+              search='grid', budget=None, store=None):
+    """Evaluates Strategy C on the (sma_window, cooldown) grid; returns 'window', 'cooldown', 'final', 'trades', 'evaluations'."""
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    window_grid, cooldown_grid = threshold_grid(sma_windows, cooldowns)
+    final, trades, evaluations = _search(_evaluate_sma_chunk, close, np.rint(sma_windows).astype(np.int64),
+                                         np.rint(cooldowns).astype(np.int64), fee, tax,
+                                         workers, chunk_size, progress, search, budget, store)
+    return {
+        'window': window_grid,
+        'cooldown': cooldown_grid,
+        'final': final,
+        'trades': trades,
+        'evaluations': evaluations
+    }
+
+
+def sweep_atr(high, low, close, atr_windows, multipliers, fee, tax, workers=None, chunk_size=None, progress=True,
+              search='grid', budget=None, store=None):
+    """Evaluates Strategy D on the (atr_window, multiplier) grid; returns 'window', 'multiplier', 'final', 'trades', 'evaluations'."""
+    data = tuple(np.ascontiguousarray(v, dtype=np.float64) for v in (high, low, close))
+    window_grid, mult_grid = threshold_grid(atr_windows, multipliers)
+    final, trades, evaluations = _search(_evaluate_atr_chunk, data, np.rint(atr_windows).astype(np.int64),
+                                         np.asarray(multipliers, dtype=np.float64), fee, tax,
+                                         workers, chunk_size, progress, search, budget, store)
+    return {
+        'window': window_grid,
+        'multiplier': mult_grid,
+        'final': final,
+        'trades': trades,
+        'evaluations': evaluations
+    }
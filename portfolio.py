@@ -0,0 +1,288 @@
+import os
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import charts
+import data_cache
+import data_provider
+import engine
+import profiling
+from data_provider import parse_date
+from engine import normalize_ticker
+from stock_monitor import load_stock_list
+from strategy_kernel import HoldStrategy
+
+# ===============================================
+# 全清單投資組合回測 (所有標的對齊同一日期軸，雙門檻狀態機以欄向量一起前進)
+# ===============================================
+# sleeve: 每檔標的分到固定比例的資金，各自複利 (等同分開跑 Strategy B 再加總)
+# pool:   共用現金池，買入訊號依權重 x 當下組合淨值配置資金，現金不足時等比例縮減
+ALLOCATIONS = ('sleeve', 'pool')
+INITIAL_CAPITAL = 1_000_000
+TRADING_DAYS = 252
+
+
+def align_closes(frames, tickers):
+    """
+    Aligns the Close columns of `frames` on the union of their dates. Returns
+    (dates, close (T, N), first (N,)): holidays of one market repeat the
+    previous close, and bars before a ticker's first quote carry that first
+    quote (the ticker only enters the portfolio at bar `first`).
+    """
+    import pandas as pd
+
+    closes = pd.concat({t: frames[t]['Close'] for t in tickers}, axis=1).sort_index()
+    first = np.array([closes.index.get_loc(closes[t].first_valid_index()) for t in tickers], dtype=np.int64)
+    close = closes.ffill().bfill().to_numpy(dtype=np.float64)
+    return closes.index, np.ascontiguousarray(close), first
+
+
+class PortfolioStrategy:
+    """
+    Strategy B on every column of a (T, N) close matrix, sharing one account.
+    Each column keeps its own peak/valley/in-position state and enters at bar
+    first[k] like Strategy B's initial buy; `allocation` decides how much cash
+    every entry receives (see ALLOCATIONS). Costs may differ per column.
+    """
+
+    def __init__(self, buy_thresholds, sell_thresholds, first, weights=None, allocation='sleeve'):
+        if allocation not in ALLOCATIONS:
+            raise ValueError(f"未知的資金配置 '{allocation}'，可用: {', '.join(ALLOCATIONS)}")
+        self.buy_t = np.asarray(buy_thresholds, dtype=np.float64)
+        self.sell_t = np.asarray(sell_thresholds, dtype=np.float64)
+        self.first = np.asarray(first, dtype=np.int64)
+        self.weights = weights
+        self.allocation = allocation
+
+    def start(self, ctx):
+        close = ctx['close']
+        shape = close.shape[1:]
+        self.shape = shape
+        weights = np.ones(shape) if self.weights is None else np.broadcast_to(np.asarray(self.weights, dtype=np.float64), shape)
+        self.weights = weights / weights.sum()
+        self.buy_cost = np.broadcast_to(ctx['buy_cost'], shape)
+        self.sell_keep = np.broadcast_to(ctx['sell_keep'], shape)
+        self.buy_level = np.broadcast_to(1 + self.buy_t, shape)
+        self.sell_level = np.broadcast_to(1 - self.sell_t, shape)
+
+        capital = float(ctx['initial_capital'])
+        self.cash = self.weights * capital if self.allocation == 'sleeve' else np.array(capital)
+        self.shares = np.zeros(shape)
+        self.in_pos = np.zeros(shape, dtype=bool)
+        self.peak = np.array(close[0], dtype=np.float64)
+        self.valley = self.peak.copy()
+        self.trades = np.zeros(shape, dtype=np.int64)
+        # 當根 K 棒的成交金額 (買入花費 + 賣出所得)
+        self.traded = 0.0
+
+    def step(self, i, price):
+        in_pos, peak, valley, shares = self.in_pos, self.peak, self.valley, self.shares
+        waiting = ~in_pos & (self.first < i)
+        entries = self.first == i
+
+        # 持有中：更新高峰，跌破高峰 * (1 - 賣出門檻) 則賣出
+        np.copyto(peak, price, where=in_pos & (price > peak))
+        sell = in_pos & (price <= peak * self.sell_level)
+        proceeds = np.where(sell, shares * price * self.sell_keep, 0.0)
+        np.copyto(shares, 0.0, where=sell)
+        np.copyto(valley, price, where=sell)
+
+        # 空手中：更新谷底，自谷底回升 * (1 + 買入門檻) 則買入；新上市的標的在第一根 K 棒進場
+        np.copyto(valley, price, where=waiting & (price < valley))
+        entries |= waiting & (price >= valley * self.buy_level)
+
+        if self.allocation == 'sleeve':
+            self.cash += proceeds
+            spend = np.where(entries, self.cash, 0.0)
+            self.cash -= spend
+        else:
+            self.cash += proceeds.sum()
+            spend = np.zeros(self.shape)
+            if entries.any():
+                equity = self.cash + (shares * price * self.sell_keep).sum()
+                spend = np.where(entries, self.weights * equity, 0.0)
+                total = spend.sum()
+                if total > self.cash:
+                    spend *= self.cash / total
+                self.cash -= spend.sum()
+        np.copyto(shares, spend / self.buy_cost / price, where=entries)
+        np.copyto(peak, price, where=entries)
+
+        self.trades += sell
+        self.trades += entries
+        in_pos ^= sell
+        in_pos |= entries
+        self.traded = proceeds.sum() + spend.sum()
+
+    def value(self, price, out):
+        # 各欄持股扣除預期清算成本後的價值 (現金另計於 self.cash)
+        np.multiply(self.shares, price, out=out)
+        out *= self.sell_keep
+
+    def finish(self, last_price):
+        final = np.empty(self.shape)
+        self.value(last_price, final)
+        return final, self.trades
+
+
+def run_portfolio(close, first, buy_thresholds, sell_thresholds, buy_cost, sell_keep, weights=None,
+                  allocation='sleeve', initial_capital=INITIAL_CAPITAL):
+    """
+    Runs the portfolio over a (T, N) close matrix in one pass over time; all
+    N tickers advance together as columns. Thresholds, costs and weights are
+    scalars or (N,) vectors. Returns 'equity', 'cash', 'exposure' (share of
+    equity held in positions) and 'traded' (gross notional per bar) of shape
+    (T,), 'holdings' (T, N), and per-ticker 'final' holdings and 'trades'.
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    strategy = PortfolioStrategy(buy_thresholds, sell_thresholds, first, weights, allocation)
+    strategy.start({'close': close, 'buy_cost': buy_cost, 'sell_keep': sell_keep, 'initial_capital': initial_capital})
+
+    n_bars = len(close)
+    holdings = np.empty((n_bars,) + strategy.shape)
+    cash = np.empty(n_bars)
+    traded = np.empty(n_bars)
+    with profiling.phase('portfolio'):
+        for i in range(n_bars):
+            strategy.step(i, close[i])
+            strategy.value(close[i], holdings[i])
+            cash[i] = strategy.cash.sum()
+            traded[i] = strategy.traded
+    final, trades = strategy.finish(close[-1])
+
+    invested = holdings.sum(axis=1)
+    equity = cash + invested
+    return {
+        'equity': equity,
+        'cash': cash,
+        'exposure': invested / equity,
+        'traded': traded,
+        'holdings': holdings,
+        'final': final,
+        'trades': trades
+    }
+
+
+def hold_equity(close, first, buy_cost, sell_keep, weights=None, initial_capital=INITIAL_CAPITAL):
+    """Strategy A for the portfolio: every ticker bought at bar first[k] with its weight of the capital and held."""
+    n_bars, n = close.shape
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    sleeve = weights / weights.sum() * initial_capital
+    entered = np.arange(n_bars)[:, None] >= first
+    # 進場前的 K 棒以進場價代替 (align_closes 已是如此)，每一欄都在第一根 K 棒以進場價買入
+    close = np.where(entered, close, close[first, np.arange(n)])
+    hold = HoldStrategy()
+    hold.start({'close': close, 'buy_cost': buy_cost, 'sell_keep': sell_keep, 'initial_capital': sleeve})
+    equity = np.empty_like(close)
+    hold.scan(close, equity=equity)
+    return np.where(entered, equity, sleeve).sum(axis=1)
+
+
+def summarize(equity, dates, initial_capital, traded=None, exposure=None):
+    """Total / annualized return, max drawdown and, when given, average exposure and annual turnover."""
+    years = max((dates[-1] - dates[0]).days / 365.25, 1 / TRADING_DAYS)
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    growth = equity[-1] / initial_capital
+    out = {
+        'roi': (growth - 1) * 100,
+        'cagr': (growth ** (1 / years) - 1) * 100,
+        'max_drawdown': drawdown.min() * 100
+    }
+    if exposure is not None:
+        out['exposure'] = exposure.mean() * 100
+    if traded is not None:
+        # 年週轉率 = 每年成交金額 / 平均淨值
+        out['turnover'] = traded.sum() / equity.mean() / years * 100
+    return out
+
+
+def print_report(tickers, names, res, stats, hold_stats, allocation, capital):
+    print(f"\n===== 投資組合回測 ({len(tickers)} 檔, 資金配置: {allocation}, 初始資金 {capital:,.0f}) =====")
+    print(f"Strategy B 組合: 報酬率 {stats['roi']:.1f}% | 年化 {stats['cagr']:.1f}% | 最大回撤 {stats['max_drawdown']:.1f}% | "
+          f"平均持股比重 {stats['exposure']:.1f}% | 年週轉率 {stats['turnover']:.0f}%")
+    print(f"Strategy A 組合 (長期持有): 報酬率 {hold_stats['roi']:.1f}% | 年化 {hold_stats['cagr']:.1f}% | "
+          f"最大回撤 {hold_stats['max_drawdown']:.1f}%")
+    print(f"期末現金: {res['cash'][-1]:,.0f} | 總交易次數: {int(res['trades'].sum())}")
+
+    print("\n各標的期末持股價值 (依價值排序):")
+    order = np.argsort(-res['final'], kind='stable')
+    for k in order:
+        state = "持有" if res['final'][k] > 0 else "空手"
+        print(f"  {names[k]} ({tickers[k]}): {res['final'][k]:>12,.0f} | {state} | 交易 {int(res['trades'][k])} 次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Portfolio backtest of Strategy B over the whole watchlist')
+    parser.add_argument('--start', type=str, help='Start date (YYYY-MM-DD), defaults to 5 years before end date')
+    parser.add_argument('--end', type=str, help='End date (YYYY-MM-DD), defaults to today')
+    parser.add_argument('--allocation', choices=ALLOCATIONS, default='sleeve',
+                        help='sleeve: fixed equal capital per ticker; pool: shared cash, entries get an equal share of current equity')
+    parser.add_argument('--capital', type=float, default=INITIAL_CAPITAL, help='Initial portfolio capital')
+    parser.add_argument('--buy_t', type=float, default=None, help='Override every ticker\'s buy threshold (default: its rec %%)')
+    parser.add_argument('--sell_t', type=float, default=None, help='Override every ticker\'s sell threshold (default: its drop %%)')
+    parser.add_argument('--output', type=str, default=None, help='Write the daily equity / exposure / turnover to this CSV')
+    parser.add_argument('--chart', type=str, nargs='?', const=charts.CHART_DIR, default=None, metavar='DIR',
+                        help='Save the portfolio equity chart (portfolio_watchlist.png)')
+    data_provider.add_provider_argument(parser)
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiling.setup(args)
+    if args.provider:
+        data_provider.set_provider(args.provider)
+
+    end_dt = parse_date(args.end) if args.end else datetime.now()
+    start_dt = parse_date(args.start) if args.start else (end_dt - timedelta(days=5*365))
+    if not end_dt or not start_dt:
+        print(f"錯誤: 無法解析日期 '{args.start}' / '{args.end}'")
+        return
+
+    stocks = load_stock_list()
+    if not stocks:
+        return
+    for item in stocks:
+        item['ticker'] = normalize_ticker(item['ticker'])
+    stocks = list({s['ticker']: s for s in stocks}.values())
+
+    tickers = [s['ticker'] for s in stocks]
+    print(f"正在抓取 {len(tickers)} 支標的數據 ({start_dt.date()} ~ {end_dt.date()})...")
+    frames = data_cache.load_many(tickers, start=start_dt, end=end_dt)
+    stocks = [s for s in stocks if frames.get(s['ticker']) is not None and len(frames[s['ticker']]) >= 2]
+    if not stocks:
+        print("沒有任何標的有足夠資料。")
+        return
+    tickers = [s['ticker'] for s in stocks]
+
+    dates, close, first = align_closes(frames, tickers)
+    costs = [engine.fee_model(t) for t in tickers]
+    buy_cost = np.array([c['buy_cost'] for c in costs])
+    sell_keep = np.array([c['sell_keep'] for c in costs])
+    # 設定檔中 rec = 自谷底回升 % (買入)，drop = 自高點回落 % (賣出)
+    buy_t = np.array([s['rec'] / 100.0 for s in stocks]) if args.buy_t is None else args.buy_t
+    sell_t = np.array([s['drop'] / 100.0 for s in stocks]) if args.sell_t is None else args.sell_t
+
+    res = run_portfolio(close, first, buy_t, sell_t, buy_cost, sell_keep,
+                        allocation=args.allocation, initial_capital=args.capital)
+    hold = hold_equity(close, first, buy_cost, sell_keep, initial_capital=args.capital)
+    stats = summarize(res['equity'], dates, args.capital, res['traded'], res['exposure'])
+    print_report(tickers, [s['name'] for s in stocks], res, stats, summarize(hold, dates, args.capital),
+                 args.allocation, args.capital)
+
+    if args.output:
+        import pandas as pd
+
+        pd.DataFrame({'equity': res['equity'], 'hold_equity': hold, 'cash': res['cash'],
+                      'exposure': res['exposure'], 'traded': res['traded']},
+                     index=dates).to_csv(args.output, encoding='utf-8-sig')
+        print(f"\n每日淨值已儲存至: {args.output}")
+    if args.chart is not None:
+        path = charts.render_equity(charts.chart_path("watchlist", args.chart, prefix="portfolio"), dates.to_numpy(), [
+            ('Strategy A (Hold)', hold, {'alpha': 0.5}),
+            (f'Strategy B ({args.allocation})', res['equity'], {})
+        ], f"Portfolio: {len(tickers)} tickers")
+        print(f"圖表已儲存至: {os.path.abspath(path)}")
+
+
+if __name__ == "__main__":
+    main()
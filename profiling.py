@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+import atexit
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 getrusage，峰值 RSS 記為 None
+    resource = None
+
+# ===============================================
+# 分段效能剖析 (牆鐘時間、CPU 時間、峰值記憶體)
+# ===============================================
+# 程式庫以 `with profiling.phase("download"):` 標記各階段；沒有啟用時只是空的 context manager。
+# 腳本加上 --profile 後會在結束時輸出 JSON 報告，--cprofile_phase 另外把指定階段的 cProfile 存檔。
+# 峰值記憶體取自 getrusage 的 ru_maxrss (本行程與已回收的 worker 行程)；tracemalloc 會拖慢
+# 配置密集的程式碼，只有加上 --trace_memory 時才啟用，另外記錄各階段 Python 配置的峰值。
+
+_enabled = False
+_phases = {}
+_stack = []
+_hot = None
+_profiler = None
+_started = None
+_peak = 0
+_config = {}
+
+
+def enabled():
+    return _enabled
+
+
+def enable(hot_phase=None, cprofile_path=None, trace_memory=False):
+    """
+    Starts recording phases; `hot_phase` is additionally run under cProfile and
+    trace_memory also starts tracemalloc.
+    """
+    global _enabled, _hot, _profiler, _started
+    _enabled = True
+    _hot = hot_phase
+    _config['cprofile_path'] = cprofile_path or (f"profile_{hot_phase}.prof" if hot_phase else None)
+    _started = (time.perf_counter(), time.process_time(), os.times(), datetime.now())
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if hot_phase:
+        import cProfile
+        _profiler = cProfile.Profile()
+
+
+def _children_cpu():
+    # process pool 的 worker 結束並被回收後才會計入
+    t = os.times()
+    return t.children_user + t.children_system
+
+
+def _rss():
+    """
+    (this process, largest reaped child) peak resident set size in MB from
+    getrusage, or (None, None) where it is not available.
+    """
+    if resource is None:
+        return None, None
+    # Linux 以 KB 回報，macOS 以 bytes 回報
+    scale = 2**20 if sys.platform == 'darwin' else 2**10
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+
+@contextmanager
+def phase(name):
+    """
+    Records wall time, CPU time (this process plus reaped worker processes),
+    the peak RSS of this process and of the largest reaped worker when the phase
+    ends and, with tracemalloc running, the peak traced memory above the phase's
+    starting point. Repeated phases of the same name are summed; nested phases
+    count towards their parent as well.
+    """
+    global _peak
+    if not _enabled:
+        yield
+        return
+
+    tracing = tracemalloc.is_tracing()
+    current = 0
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if _stack:
+            _stack[-1]['peak'] = max(_stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+    entry = {'peak': 0, 'base': current}
+    _stack.append(entry)
+    hot = name == _hot and _profiler is not None
+    wall0, cpu0, child0 = time.perf_counter(), time.process_time(), _children_cpu()
+    if hot:
+        _profiler.enable()
+    try:
+        yield
+    finally:
+        if hot:
+            _profiler.disable()
+        wall = time.perf_counter() - wall0
+        cpu = time.process_time() - cpu0
+        child = _children_cpu() - child0
+        _stack.pop()
+        rss, child_rss = _rss()
+
+        stats = _phases.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'child_cpu_s': 0.0,
+                                          'max_rss_mb': rss, 'child_max_rss_mb': child_rss})
+        stats['calls'] += 1
+        stats['wall_s'] += wall
+        stats['cpu_s'] += cpu
+        stats['child_cpu_s'] += child
+        if rss is not None:
+            stats['max_rss_mb'] = max(stats['max_rss_mb'], rss)
+            stats['child_max_rss_mb'] = max(stats['child_max_rss_mb'], child_rss)
+
+        if tracing:
+            peak = max(entry['peak'], tracemalloc.get_traced_memory()[1])
+            _peak = max(_peak, peak)
+            tracemalloc.reset_peak()
+            if _stack:
+                _stack[-1]['peak'] = max(_stack[-1]['peak'], peak)
+            stats['traced_peak_mb'] = max(stats.get('traced_peak_mb', 0.0), (peak - entry['base']) / 2**20)
+
+
+def report():
+    """Returns the timing report dict: run metadata, totals and one entry per phase (in first-seen order)."""
+    wall0, cpu0, times0, started = _started
+    rss, child_rss = _rss()
+    return {
+        'script': os.path.basename(sys.argv[0]),
+        'argv': sys.argv[1:],
+        'started': started.isoformat(timespec='seconds'),
+        'total': {
+            'wall_s': time.perf_counter() - wall0,
+            'cpu_s': time.process_time() - cpu0,
+            'child_cpu_s': _children_cpu() - (times0.children_user + times0.children_system),
+            'max_rss_mb': rss,
+            'child_max_rss_mb': child_rss,
+            'traced_peak_mb': max(_peak, tracemalloc.get_traced_memory()[1]) / 2**20 if tracemalloc.is_tracing() else None
+        },
+        'phases': _phases,
+        'cprofile': _config.get('cprofile_path') if _profiler is not None else None
+    }
+
+
+def write_report(path):
+    """Writes the JSON report to `path`, dumps the hot-phase cProfile stats and prints a summary."""
+    data = report()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    if _profiler is not None and _hot in _phases:
+        _profiler.dump_stats(data['cprofile'])
+
+    total = data['total']
+    print(f"\n--- 效能剖析 ({data['script']}, 總計 {total['wall_s']:.2f}s) ---")
+    for name, s in _phases.items():
+        memory = "" if s['max_rss_mb'] is None else f" | RSS {s['max_rss_mb']:.0f} MB (子行程 {s['child_max_rss_mb']:.0f} MB)"
+        if 'traced_peak_mb' in s:
+            memory += f" | 配置峰值 +{s['traced_peak_mb']:.1f} MB"
+        print(f"  {name:<14} x{s['calls']:<4} 牆鐘 {s['wall_s']:>8.3f}s | CPU {s['cpu_s']:>8.3f}s "
+              f"(子行程 {s['child_cpu_s']:.3f}s){memory}")
+    if total['max_rss_mb'] is not None:
+        print(f"峰值 RSS: 本行程 {total['max_rss_mb']:.0f} MB / 最大的子行程 {total['child_max_rss_mb']:.0f} MB")
+    print(f"報告已儲存至: {path}" + (f" (cProfile: {data['cprofile']})" if data['cprofile'] and _hot in _phases else ""))
+    return data
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile', type=str, nargs='?', const='', default=None, metavar='JSON',
+                        help='Write a per-phase timing report (default file: profile_<script>.json)')
+    parser.add_argument('--cprofile_phase', type=str, default=None, metavar='PHASE',
+                        help='With --profile, also dump cProfile stats of this phase (e.g. grid_search)')
+    parser.add_argument('--cprofile_out', type=str, default=None, help='cProfile output (default: profile_<PHASE>.prof)')
+    parser.add_argument('--trace_memory', action='store_true',
+                        help='With --profile, also trace Python allocations per phase with tracemalloc (slower)')
+
+
+def setup(args):
+    """Enables profiling when --profile was given; the report is written when the script exits."""
+    if args.profile is None:
+        return
+    path = args.profile or f"profile_{os.path.splitext(os.path.basename(sys.argv[0]))[0]}.json"
+    enable(args.cprofile_phase, args.cprofile_out, args.trace_memory)
+    atexit.register(write_report, path)
@@ -0,0 +1,228 @@
+import os
+import sys
+import sqlite3
+import argparse
+from datetime import date
+
+import numpy as np
+
+# ===============================================
+# 回測結果資料庫 (SQLite：門檻矩陣與滾動 / walk-forward 視窗，依資料指紋增量計算)
+# ===============================================
+# 每筆結果以 (資料指紋, 策略, 參數, 成本) 為鍵；同樣的資料與參數再跑一次時直接取用，
+# 也可以直接用 SQL 做跨標的查詢，例如:
+#   SELECT ticker, param_a, param_b, roi FROM grid_cells WHERE strategy = 'b' ORDER BY roi DESC LIMIT 20
+RESULTS_DB = os.getenv("RESULTS_DB", "backtest_results.db")
+INITIAL_CAPITAL = 10000
+# 門檻以 arange 產生時會有 0.07000000000000001 這類誤差，存取前一律四捨五入
+DECIMALS = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS grid_cells (
+    ticker TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    param_a REAL NOT NULL,
+    param_b REAL NOT NULL,
+    fee REAL NOT NULL,
+    tax REAL NOT NULL,
+    slippage REAL NOT NULL,
+    final REAL NOT NULL,
+    roi REAL NOT NULL,
+    trades INTEGER NOT NULL,
+    data_start TEXT,
+    data_end TEXT,
+    bars INTEGER,
+    run_date TEXT NOT NULL,
+    PRIMARY KEY (fingerprint, strategy, param_a, param_b, fee, tax, slippage)
+);
+CREATE INDEX IF NOT EXISTS grid_cells_ticker ON grid_cells (ticker, run_date);
+
+CREATE TABLE IF NOT EXISTS rolling_windows (
+    ticker TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    window_start TEXT NOT NULL,
+    window_end TEXT NOT NULL,
+    buy_t REAL NOT NULL,
+    sell_t REAL NOT NULL,
+    fee REAL NOT NULL,
+    tax REAL NOT NULL,
+    slippage REAL NOT NULL,
+    roi_a REAL NOT NULL,
+    roi_b REAL NOT NULL,
+    trades INTEGER NOT NULL,
+    bars INTEGER NOT NULL,
+    run_date TEXT NOT NULL,
+    PRIMARY KEY (fingerprint, buy_t, sell_t, fee, tax, slippage)
+);
+CREATE INDEX IF NOT EXISTS rolling_windows_ticker ON rolling_windows (ticker, window_start);
+"""
+
+
+def _r(values):
+    return np.round(np.asarray(values, dtype=np.float64), DECIMALS)
+
+
+def connect(path=None):
+    """Opens (and creates) the results database; WAL mode lets batch worker processes write concurrently."""
+    conn = sqlite3.connect(path or RESULTS_DB, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class CellStore:
+    """
+    Stored grid cells of one strategy on one price series (identified by its
+    content fingerprint) and cost model. optimizer passes it as `store` so only
+    cells missing from the database are evaluated; `hits` counts reused cells.
+    """
+
+    def __init__(self, conn, ticker, strategy, fingerprint, fee, tax, slippage=0.001,
+                 data_start=None, data_end=None, bars=None):
+        self.conn = conn
+        self.ticker = ticker
+        self.strategy = strategy
+        self.fingerprint = fingerprint
+        self.costs = tuple(float(v) for v in _r([fee, tax, slippage]))
+        self.meta = (data_start, data_end, bars)
+        self.hits = 0
+        self.computed = 0
+        self._known = None
+
+    def _load(self):
+        rows = self.conn.execute(
+            "SELECT param_a, param_b, final, trades FROM grid_cells "
+            "WHERE fingerprint = ? AND strategy = ? AND fee = ? AND tax = ? AND slippage = ?",
+            (self.fingerprint, self.strategy) + self.costs).fetchall()
+        self._known = {(a, b): (final, trades) for a, b, final, trades in rows}
+
+    def lookup(self, param_a, param_b):
+        """Returns (final, trades, found) arrays for the flat parameter vectors."""
+        if self._known is None:
+            self._load()
+        n = len(param_a)
+        final = np.full(n, np.nan)
+        trades = np.full(n, -1, dtype=np.int64)
+        found = np.zeros(n, dtype=bool)
+        for k, cell in enumerate(zip(_r(param_a).tolist(), _r(param_b).tolist())):
+            hit = self._known.get(cell)
+            if hit is not None:
+                final[k], trades[k] = hit
+                found[k] = True
+        self.hits += int(found.sum())
+        return final, trades, found
+
+    def save(self, param_a, param_b, final, trades):
+        run_date = date.today().isoformat()
+        cells = list(zip(_r(param_a).tolist(), _r(param_b).tolist(),
+                         np.asarray(final, dtype=np.float64).tolist(), np.asarray(trades).tolist()))
+        rows = [(self.ticker, self.strategy, self.fingerprint, a, b) + self.costs +
+                (f, (f / INITIAL_CAPITAL - 1) * 100, t) + self.meta + (run_date,)
+                for a, b, f, t in cells]
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO grid_cells VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.computed += len(rows)
+        for a, b, f, t in cells:
+            self._known[(a, b)] = (f, t)
+
+    def summary(self):
+        total = self.hits + self.computed
+        return f"結果資料庫: 沿用 {self.hits} / {total} 組，新增 {self.computed} 組"
+
+
+def cell_store(conn, ticker, strategy, arrays, fee, tax, dates=None, slippage=0.001):
+    """CellStore keyed by the content fingerprint of the price `arrays` the strategy reads."""
+    from indicators import fingerprint
+
+    meta = {}
+    if dates is not None and len(dates):
+        meta = {'data_start': str(dates[0])[:10], 'data_end': str(dates[-1])[:10], 'bars': len(dates)}
+    return CellStore(conn, ticker, strategy, fingerprint(*arrays), fee, tax, slippage, **meta)
+
+
+def incremental_rolling(conn, ticker, close, dates, i0, i1, buy_t, sell_t, fee, tax, compute, slippage=0.001):
+    """
+    Rolling-window results for a (buy_t, sell_t) pair, or for equal-length pair
+    vectors (e.g. the walk-forward threshold grid), which give roi_b / trades a
+    trailing pair axis like run_rolling. Windows whose prices were already
+    evaluated with every pair and the same costs come from the database, the
+    rest from compute(i0, i1) (a run_rolling call) and are stored. Windows are
+    keyed by their own prices, so a window is reused when the same bars come
+    back (a rerun, or a history extended with new bars), not when two windows
+    merely overlap: each window starts its state machine afresh.
+    Returns (result dict like run_rolling, reused window count).
+    """
+    from indicators import fingerprint
+
+    i0 = np.asarray(i0, dtype=np.int64)
+    i1 = np.asarray(i1, dtype=np.int64)
+    pairs = np.ndim(buy_t) > 0
+    cells = list(zip(_r(np.atleast_1d(buy_t)).tolist(), _r(np.atleast_1d(sell_t)).tolist()))
+    costs = tuple(float(v) for v in _r([fee, tax, slippage]))
+    buys = sorted({b for b, _ in cells})
+    sells = sorted({s for _, s in cells})
+    keys = [fingerprint(close[a:b]) for a, b in zip(i0, i1)]
+    stored = {}
+    for start in range(0, len(keys), 200):
+        part = keys[start:start + 200]
+        stored.update({row[:3]: row[3:] for row in conn.execute(
+            f"SELECT fingerprint, buy_t, sell_t, roi_a, roi_b, trades FROM rolling_windows "
+            f"WHERE fingerprint IN ({','.join('?' * len(part))}) AND buy_t IN ({','.join('?' * len(buys))}) "
+            f"AND sell_t IN ({','.join('?' * len(sells))}) AND fee = ? AND tax = ? AND slippage = ?",
+            tuple(part) + tuple(buys) + tuple(sells) + costs)})
+
+    n, n_pairs = len(keys), len(cells)
+    roi_a = np.empty(n)
+    roi_b = np.empty((n, n_pairs))
+    trades = np.empty((n, n_pairs), dtype=np.int64)
+    missing = []
+    for k, key in enumerate(keys):
+        hits = [stored.get((key,) + cell) for cell in cells]
+        if any(hit is None for hit in hits):
+            missing.append(k)
+            continue
+        roi_a[k] = hits[0][0]
+        roi_b[k] = [hit[1] for hit in hits]
+        trades[k] = [hit[2] for hit in hits]
+
+    if missing:
+        res = compute(i0[missing], i1[missing])
+        roi_a[missing] = res['roi_a']
+        roi_b[missing] = np.reshape(res['roi_b'], (len(missing), n_pairs))
+        trades[missing] = np.reshape(res['trades'], (len(missing), n_pairs))
+        run_date = date.today().isoformat()
+        rows = [(ticker, keys[k], str(dates[i0[k]])[:10], str(dates[i1[k] - 1])[:10]) + cell + costs +
+                (float(roi_a[k]), float(roi_b[k, p]), int(trades[k, p]), int(i1[k] - i0[k]), run_date)
+                for k in missing for p, cell in enumerate(cells)]
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO rolling_windows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    out = {'roi_a': roi_a, 'roi_b': roi_b, 'trades': trades}
+    if not pairs:
+        out['roi_b'], out['trades'] = roi_b[:, 0], trades[:, 0]
+    return out, n - len(missing)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the backtest results database')
+    parser.add_argument('sql', nargs='?', help='SQL to run (default: stored results per ticker)')
+    parser.add_argument('--db', type=str, default=RESULTS_DB, help='Database file')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"找不到結果資料庫 '{args.db}'")
+        sys.exit(1)
+    conn = connect(args.db)
+    sql = args.sql or (
+        "SELECT ticker, strategy, COUNT(*) AS cells, MAX(roi) AS best_roi, MAX(run_date) AS last_run "
+        "FROM grid_cells GROUP BY ticker, strategy ORDER BY ticker, strategy")
+    cur = conn.execute(sql)
+    names = [d[0] for d in cur.description or []]
+    print(" | ".join(names))
+    for row in cur:
+        print(" | ".join(f"{v:.4g}" if isinstance(v, float) else str(v) for v in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import data_cache
+import data_provider
+import engine
+import profiling
+from data_provider import parse_date
+from engine import normalize_ticker
+from optimizer import DEFAULT_RANGE, build_thresholds, pct_decimals
+from stock_monitor import load_stock_list
+from strategy_kernel import HoldStrategy, TrendStrategy, as_close_array, run_strategies, threshold_grid
+
+# ===============================================
+# 穩健度分析 (區塊拔靴法重抽報酬路徑，批次跑 Strategy A / B)
+# ===============================================
+
+INITIAL_CAPITAL = 10000
+DEFAULT_PATHS = 2000
+# 20 個交易日 (約一個月) 為一個區塊，保留報酬的短期自相關與波動聚集
+DEFAULT_BLOCK = 20
+DEFAULT_CHUNK = 128
+
+
+def bootstrap_paths(close, n_paths, block=DEFAULT_BLOCK, rng=None):
+    """
+    Moving-block bootstrap of log returns: every path glues randomly chosen
+    `block`-bar stretches of the historical returns back together and starts at
+    close[0]. Returns prices of shape (T, n_paths).
+    """
+    rng = np.random.default_rng(rng)
+    log_ret = np.diff(np.log(close))
+    n_ret = len(log_ret)
+    block = max(1, min(block, n_ret))
+    n_blocks = -(-n_ret // block)
+    starts = rng.integers(0, n_ret - block + 1, size=(n_paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block)).reshape(n_paths, -1)[:, :n_ret]
+    paths = np.empty((n_ret + 1, n_paths))
+    paths[0] = close[0]
+    paths[1:] = close[0] * np.exp(np.cumsum(log_ret[idx].T, axis=0))
+    return paths
+
+
+_CLOSE = None
+
+
+def _init_worker(close):
+    global _CLOSE
+    _CLOSE = close
+
+
+def _run_paths(n_paths, seed, block, buy_grid, sell_grid, buy_cost, sell_keep, close=None):
+    """Generates one chunk of paths and runs A and every (buy_t, sell_t) pair of B on all of them at once."""
+    close = _CLOSE if close is None else close
+    paths = bootstrap_paths(close, n_paths, block, np.random.default_rng(seed))
+    # (T, 路徑, 1) 對上 (門檻組,) 的門檻向量，所有路徑 x 門檻一起前進
+    res_a, res_b = run_strategies(paths[:, :, None], [HoldStrategy(), TrendStrategy(buy_grid, sell_grid)],
+                                  buy_cost, sell_keep, initial_capital=INITIAL_CAPITAL)
+    return res_a['final'][:, 0], res_b['final'], res_b['trades']
+
+
+def run_bootstrap(close, buy_thresholds, sell_thresholds, buy_cost, sell_keep, n_paths=DEFAULT_PATHS,
+                  block=DEFAULT_BLOCK, seed=0, workers=None, chunk_size=DEFAULT_CHUNK):
+    """
+    Runs Strategy A and the whole (buy_t, sell_t) grid of Strategy B over
+    `n_paths` block-bootstrapped price paths, with the cost factors of engine.fee_model.
+
+    Paths are generated and evaluated in chunks of `chunk_size` (in-process or
+    across a process pool); every chunk gets its own child seed of `seed`, so
+    the result does not depend on `workers`. Returns 'buy', 'sell' (the flat
+    grid, buy-major), 'roi_a' (paths,), 'roi_b' and 'trades' (paths, pairs).
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    buy_grid, sell_grid = threshold_grid(buy_thresholds, sell_thresholds)
+    sizes = [min(chunk_size, n_paths - k) for k in range(0, n_paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    workers = workers or os.cpu_count() or 1
+    with profiling.phase('bootstrap'):
+        if workers == 1 or len(sizes) == 1:
+            results = [_run_paths(n, s, block, buy_grid, sell_grid, buy_cost, sell_keep, close)
+                       for n, s in zip(sizes, seeds)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(close,)) as pool:
+                results = list(pool.map(_run_paths, sizes, seeds,
+                                        *[[v] * len(sizes) for v in (block, buy_grid, sell_grid, buy_cost, sell_keep)]))
+
+    final_a = np.concatenate([r[0] for r in results])
+    final_b = np.concatenate([r[1] for r in results])
+    return {
+        'buy': buy_grid,
+        'sell': sell_grid,
+        'roi_a': (final_a / INITIAL_CAPITAL - 1) * 100,
+        'roi_b': (final_b / INITIAL_CAPITAL - 1) * 100,
+        'trades': np.concatenate([r[2] for r in results])
+    }
+
+
+def summarize(res):
+    """Per-pair ROI distribution of B (percentiles, mean) and P(B > A) over the paths."""
+    roi_a = res['roi_a']
+    roi_b = res['roi_b']
+    p5, p50, p95 = np.percentile(roi_b, [5, 50, 95], axis=0)
+    return {
+        'buy': res['buy'],
+        'sell': res['sell'],
+        'p5': p5,
+        'median': p50,
+        'p95': p95,
+        'mean': roi_b.mean(axis=0),
+        'win_prob': (roi_b > roi_a[:, None]).mean(axis=0),
+        'trades': np.median(res['trades'], axis=0),
+        'a': np.percentile(roi_a, [5, 50, 95])
+    }
+
+
+def print_report(ticker, summary, n_paths, block, buy_thresholds, sell_thresholds, top=5):
+    a5, a50, a95 = summary['a']
+    dec = max(pct_decimals(buy_thresholds), pct_decimals(sell_thresholds))
+    print(f"\n===== {ticker} 穩健度分析 ({n_paths} 條路徑, 區塊 {block} 根) =====")
+    print(f"Strategy A (長期持有) 報酬率: 中位數 {a50:.1f}% [5%: {a5:.1f}%, 95%: {a95:.1f}%]")
+
+    divider = "-" * (8 + len(sell_thresholds) * 9)
+    print("\nP(B > A) 矩陣 [列: 買回升, 欄: 賣回落]:")
+    print(divider)
+    print("買\\賣 | " + " | ".join([f"{t*100:>5.{dec}f}%" for t in sell_thresholds]))
+    print(divider)
+    win = summary['win_prob'].reshape(len(buy_thresholds), len(sell_thresholds))
+    for bt, row in zip(buy_thresholds, win):
+        print(f"{bt*100:>3.{dec}f}%  | " + " | ".join([f"{p*100:>5.1f}%" for p in row]))
+    print(divider)
+
+    order = np.argsort(-summary['win_prob'], kind='stable')[:top]
+    print(f"\nP(B > A) 最高的 {len(order)} 組門檻:")
+    for k in order:
+        print(f"  買 {summary['buy'][k]*100:.{dec}f}% / 賣 {summary['sell'][k]*100:.{dec}f}%: "
+              f"P(B>A) {summary['win_prob'][k]*100:.1f}% | 報酬中位數 {summary['median'][k]:.1f}% "
+              f"[5%: {summary['p5'][k]:.1f}%, 95%: {summary['p95'][k]:.1f}%] | 交易 {summary['trades'][k]:.0f} 次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Block-bootstrap robustness analysis of Strategy B vs A')
+    parser.add_argument('--stock', type=str, nargs='+', help='Stock codes (default: every ticker of the stock list)')
+    parser.add_argument('--start', type=str, help='Start date (YYYY-MM-DD), defaults to 5 years before end date')
+    parser.add_argument('--end', type=str, help='End date (YYYY-MM-DD), defaults to today')
+    parser.add_argument('--paths', type=int, default=DEFAULT_PATHS, help='Resampled paths per ticker')
+    parser.add_argument('--block', type=int, default=DEFAULT_BLOCK, help='Bootstrap block length in bars')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--buy_range', type=float, nargs=3, default=list(DEFAULT_RANGE), metavar=('MIN', 'MAX', 'STEP'),
+                        help='Buy threshold grid')
+    parser.add_argument('--sell_range', type=float, nargs=3, default=list(DEFAULT_RANGE), metavar=('MIN', 'MAX', 'STEP'),
+                        help='Sell threshold grid')
+    parser.add_argument('--top', type=int, default=5, help='Pairs listed with their full ROI distribution')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (default: all cores)')
+    data_provider.add_provider_argument(parser)
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiling.setup(args)
+    if args.provider:
+        data_provider.set_provider(args.provider)
+
+    end_dt = parse_date(args.end) if args.end else datetime.now()
+    start_dt = parse_date(args.start) if args.start else (end_dt - timedelta(days=5*365))
+    if not end_dt or not start_dt:
+        print(f"錯誤: 無法解析日期 '{args.start}' / '{args.end}'")
+        return
+
+    if args.stock:
+        tickers = [normalize_ticker(t) for t in args.stock]
+    else:
+        tickers = [normalize_ticker(s['ticker']) for s in load_stock_list()]
+    if not tickers:
+        return
+
+    print(f"正在抓取 {len(tickers)} 支標的數據 ({start_dt.date()} ~ {end_dt.date()})...")
+    frames = data_cache.load_many(tickers, start=start_dt, end=end_dt)
+    buy_thresholds = build_thresholds(*args.buy_range)
+    sell_thresholds = build_thresholds(*args.sell_range)
+
+    for ticker in tickers:
+        df = frames.get(ticker)
+        if df is None or len(df) <= args.block:
+            print(f"警告：{ticker} 沒有足夠資料，略過。")
+            continue
+        costs = engine.fee_model(ticker)
+        res = run_bootstrap(as_close_array(df), buy_thresholds, sell_thresholds, costs['buy_cost'], costs['sell_keep'],
+                            n_paths=args.paths, block=args.block, seed=args.seed, workers=args.workers)
+        print_report(ticker, summarize(res), args.paths, args.block, buy_thresholds, sell_thresholds, top=args.top)
+
+
+if __name__ == "__main__":
+    main()
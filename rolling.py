@@ -0,0 +1,134 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+import profiling
+from strategy_kernel import HoldStrategy, TrendStrategy, advance, trade_factors
+
+# ===============================================
+# 滾動視窗回測引擎
+# ===============================================
+
+INITIAL_CAPITAL = 10000
+
+STEPS = {
+    'weekly': relativedelta(weeks=1),
+    'monthly': relativedelta(months=1),
+    'quarterly': relativedelta(months=3)
+}
+
+
+def window_ranges(start, end, window_months, step='monthly'):
+    """Returns the (window_start, window_end) datetimes of every full window within [start, end]."""
+    length = relativedelta(months=window_months)
+    ranges = []
+    current_start = start
+    while current_start + length <= end:
+        ranges.append((current_start, current_start + length))
+        current_start += STEPS[step]
+    return ranges
+
+
+def window_bounds(dates, ranges):
+    """
+    Maps (window_start, window_end) ranges onto [i0, i1) positions of a sorted date index
+    with one binary search per boundary, instead of a boolean mask per window.
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    starts = np.array([r[0] for r in ranges], dtype='datetime64[ns]')
+    ends = np.array([r[1] for r in ranges], dtype='datetime64[ns]')
+    return np.searchsorted(dates, starts, side='left'), np.searchsorted(dates, ends, side='left')
+
+
+_CLOSE = None
+
+
+def _init_worker(close):
+    global _CLOSE
+    _CLOSE = close
+
+
+def _run_chunk(i0, i1, buy_t, sell_t, fee, tax, slippage, close=None, per_window=False):
+    """
+    Runs A and B on windows close[i0[k]:i1[k]] together, one column per window.
+    With per_window the threshold vectors hold one pair per window instead of a shared pair axis.
+    The windows are gathered into one (steps, windows) matrix, so each chunk copies its bars once.
+    """
+    close = _CLOSE if close is None else close
+    lengths = i1 - i0
+    steps = np.arange(lengths.max())
+    # 較短的視窗以 NaN 補齊：NaN 的比較一律為 False，補齊的 K 棒不會更新任何狀態
+    # (即使門檻為 0 也不會觸發交易)，期末再以各視窗自己的最後收盤價清算
+    idx = i0[None, :] + steps[:, None]
+    padded = steps[:, None] >= lengths[None, :]
+    prices = close[np.where(padded, 0, idx)]
+    prices[padded] = np.nan
+
+    last = close[i1 - 1]
+    buy_cost, sell_keep = trade_factors(fee, tax, slippage)
+    ctx = {'close': prices, 'buy_cost': buy_cost, 'sell_keep': sell_keep, 'initial_capital': INITIAL_CAPITAL}
+    # Strategy A 只看第一根與最後一根 K 棒，不需要逐根前進
+    hold = HoldStrategy()
+    hold.start(ctx)
+    final_a, _ = hold.finish(last)
+
+    buy_t = np.asarray(buy_t, dtype=np.float64)
+    if buy_t.ndim and not per_window:
+        prices = prices[:, :, None]
+        last = last[:, None]
+    strategy = TrendStrategy(buy_t, sell_t)
+    strategy.start(dict(ctx, close=prices))
+    advance([strategy], prices)
+    final_b, trades = strategy.finish(last)
+    return final_a, final_b, trades
+
+
+def run_rolling(close, i0, i1, buy_t, sell_t, fee, tax, slippage=0.001,
+                workers=None, chunk_size=64, per_window=False):
+    """
+    Evaluates Strategy A and B on every non-empty [i0, i1) window of `close` in parallel.
+
+    `buy_t` / `sell_t` are scalars or equal-length pair vectors; with vectors the
+    B results gain a trailing pair axis. With per_window they instead hold one
+    pair per window (walk-forward). Windows are grouped into chunks that run
+    through the vectorized kernel as columns; each worker receives `close` once.
+    Returns a dict with 'roi_a', 'roi_b' (percent) and 'trades'.
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    i0 = np.asarray(i0, dtype=np.int64)
+    i1 = np.asarray(i1, dtype=np.int64)
+    n = len(i0)
+    buy_shape = () if per_window else np.shape(buy_t)
+    final_a = np.empty(n)
+    final_b = np.empty((n,) + buy_shape)
+    trades = np.empty((n,) + buy_shape, dtype=np.int64)
+    if n == 0:
+        return {'roi_a': final_a, 'roi_b': final_b, 'trades': trades}
+
+    chunks = [slice(k, min(k + chunk_size, n)) for k in range(0, n, chunk_size)]
+    if per_window:
+        buy_args = [np.asarray(buy_t, dtype=np.float64)[c] for c in chunks]
+        sell_args = [np.asarray(sell_t, dtype=np.float64)[c] for c in chunks]
+    else:
+        buy_args, sell_args = [buy_t] * len(chunks), [sell_t] * len(chunks)
+
+    workers = workers or os.cpu_count() or 1
+    with profiling.phase('rolling'):
+        if workers == 1 or len(chunks) == 1:
+            results = [_run_chunk(i0[c], i1[c], b, s, fee, tax, slippage, close, per_window)
+                       for c, b, s in zip(chunks, buy_args, sell_args)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(close,)) as pool:
+                results = list(pool.map(_run_chunk, [i0[c] for c in chunks], [i1[c] for c in chunks], buy_args, sell_args,
+                                        *[[v] * len(chunks) for v in (fee, tax, slippage, None, per_window)]))
+
+    for c, (fa, fb, tr) in zip(chunks, results):
+        final_a[c], final_b[c], trades[c] = fa, fb, tr
+
+    return {
+        'roi_a': (final_a / INITIAL_CAPITAL - 1) * 100,
+        'roi_b': (final_b / INITIAL_CAPITAL - 1) * 100,
+        'trades': trades
+    }
@@ -1,12 +1,13 @@
-import yfinance as yf
 import sys
-import numpy as np
-import requests
 import os
-import pandas as pd
 import json
+from datetime import datetime
 from dotenv import load_dotenv
 
+import alert_state
+import data_provider
+import profiling
+
 # 自動載入 .env 檔案中的環境變數
 load_dotenv()
 
@@ -63,64 +64,116 @@ def load_stock_list():
     return []
 
 # ===============================================
-# 函式 1: 計算動態趨勢 (跌幅與回補)
+# 函式 1: 一次計算所有標的的動態趨勢 (跌幅與回補，向量化)
 # ===============================================
-def calculate_dynamic_trends(stock_name, data, drop_threshold, recovery_threshold):
+def calculate_wide_trends(all_data, lookback=30):
     """
-    計算目前價格相對於近期高點的跌幅，以及相對於近期低點的回補程度。
+    Computes price, daily change, peak, valley, drop and recovery for every ticker
+    at once on the wide (field, ticker) frame. Each column keeps its own valid rows
+    (the per-ticker dropna) and its own last `lookback` bars. Returns a DataFrame
+    indexed by ticker; tickers with fewer than two valid bars get NaN rows.
     """
-    try:
-        data = data.dropna()
-        if data.empty or len(data) < 2:
-            return None
-            
-        lookback_period = data.tail(30)
-        peak_price = lookback_period['High'].max()
-        valley_price = lookback_period['Low'].min()
-        
-        latest_price = data['Close'].iloc[-1]
-        prev_price = data['Close'].iloc[-2]
-        
-        daily_change = ((latest_price - prev_price) / prev_price) * 100
-        drop_from_peak = ((latest_price - peak_price) / peak_price) * 100
-        recovery_from_valley = ((latest_price - valley_price) / valley_price) * 100
-        
-        return {
-            "price": latest_price,
-            "daily_change": daily_change,
-            "peak": peak_price,
-            "valley": valley_price,
-            "drop": drop_from_peak,
-            "recovery": recovery_from_valley
-        }
-    except Exception as e:
-        print(f"計算 {stock_name} 時發生錯誤: {e}")
-        return None
+    import numpy as np
+    import pandas as pd
+
+    high = all_data['High']
+    low = all_data['Low']
+    close = all_data['Close'][high.columns]
+    low = low[high.columns]
+
+    valid = high.notna() & low.notna() & close.notna()
+    # 每一列之後 (含該列) 還有幾根有效 K 棒，1 = 最新一根
+    rank_from_end = valid.iloc[::-1].cumsum().iloc[::-1]
+    window = valid & (rank_from_end <= lookback)
+
+    peak = high.where(window).max()
+    valley = low.where(window).min()
+    latest = close.where(valid & (rank_from_end == 1)).max()
+    prev = close.where(valid & (rank_from_end == 2)).max()
+
+    trends = pd.DataFrame({
+        "price": latest,
+        "daily_change": (latest - prev) / prev * 100,
+        "peak": peak,
+        "valley": valley,
+        "drop": (latest - peak) / peak * 100,
+        "recovery": (latest - valley) / valley * 100
+    })
+    trends[valid.sum() < 2] = np.nan
+    return trends
 
 # ===============================================
 # 函式 2: 發送 ntfy.sh 通知
 # ===============================================
 def send_ntfy_notification(topic, title, message):
+    """
+    message 可以是單一字串或報告區塊的 list；過長時會自動拆成多則通知並行送出。
+    回傳發送失敗的通知則數。
+    """
+    import notifier
+
     print(f"\n正在發送通知到 ntfy.sh主題: {topic}")
-    try:
-        response = requests.post(
-            f"https://ntfy.sh/{topic}",
-            data=message.encode('utf-8'),
-            headers={
-                "Title": title.encode('utf-8'),
-                "Priority": "high",
-                "Tags": "chart_with_upwards_trend"
-            }
-        )
-        response.raise_for_status()
+    with profiling.phase('notify'):
+        failed = notifier.send_report(topic, title, message)
+    if failed == 0:
         print("ntfy 通知發送成功！")
-    except requests.exceptions.RequestException as e:
-        print(f"發送 ntfy 通知時發生錯誤: {e}")
+    return failed
+
+# ===============================================
+# 函式 3: 判斷狀態與組成報告區塊
+# ===============================================
+def evaluate_status(cost, is_drop_hit, is_rec_hit):
+    """
+    依是否持有 (cost) 與門檻是否達標，回傳 (狀態標籤, 建議)。
+    """
+    if cost is not None:
+        # 已持有標的
+        if is_drop_hit:
+            return "⚠️ 跌幅達標", "💡 建議：股價回落，考慮部分獲利了結或設置停損。"
+        if is_rec_hit:
+            return "🟢 回補達標", "💡 建議：股價反彈，可考慮逢低加碼或攤平成本。"
+        return "正常", "💡 建議：持有並觀察。"
+
+    # 觀察標的
+    if is_rec_hit:
+        return "🔥 入手時機", "💡 建議：近期強勢回升，可考慮建立首筆部位。"
+    if is_drop_hit:
+        return "⚠️ 觀察中", "💡 建議：持續回落中，先不要急著接刀。"
+    return "正常", "💡 建議：耐心等待信號。"
+
+def format_report_block(name, ticker, res, cost, status_tag, advice):
+    if cost is not None:
+        pnl_pct = ((res["price"] - cost) / cost) * 100
+        holding_info = f"持有成本：{cost:,.2f} (目前損益：{pnl_pct:+.1f}%)\n"
+    else:
+        holding_info = "觀察清單 (未持有)\n"
+
+    return (
+        f"📈 {name} ({ticker}) | {status_tag}\n"
+        f"{holding_info}"
+        f"目前：{res['price']:,.2f} ({res['daily_change']:+.1f}%)\n"
+        f"近期高點：{res['peak']:,.2f} (距高點 {res['drop']:.1f}%)\n"
+        f"近期低點：{res['valley']:,.2f} (距低點 {res['recovery']:+.1f}%)\n"
+        f"{advice}"
+    )
 
 # ===============================================
 # --- 主程式入口 ---
 # ===============================================
 def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Stock trend monitor with ntfy notifications')
+    parser.add_argument('--daemon', action='store_true', help='Keep running, poll prices and alert as soon as a threshold is crossed')
+    parser.add_argument('--interval', type=int, default=300, help='Polling interval in seconds for --daemon')
+    parser.add_argument('--digest', action='store_true', help='Send the full report for every ticker, not only status changes')
+    data_provider.add_provider_argument(parser)
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiling.setup(args)
+    if args.provider:
+        data_provider.set_provider(args.provider)
+
     NTFY_TOPIC = os.getenv("NTFY_TOPIC")
     if not NTFY_TOPIC:
         print("錯誤：找不到 NTFY_TOPIC 環境變數。")
@@ -131,6 +184,16 @@ def main():
         print("沒有配置任何股票標的，任務終止。")
         sys.exit(1)
 
+    if args.daemon:
+        from monitor_daemon import run_daemon
+        run_daemon(STOCK_CONFIG, NTFY_TOPIC, interval=args.interval)
+        return
+
+    # 設定檢查通過後才載入 pandas / numpy 與資料快取
+    import numpy as np
+    import pandas as pd
+    import data_cache
+
     print(f"--- 股市監控任務開始 (標的數量: {len(STOCK_CONFIG)}) ---")
     
     ticker_list = [s["ticker"] for s in STOCK_CONFIG]
@@ -138,84 +201,73 @@ def main():
     report_title = "每日股市監控報告"
 
     print(f"正在下載 {len(ticker_list)} 支股票資料...")
-    all_data = yf.download(tickers=ticker_list, period="3mo", auto_adjust=True)
+    # 透過本地快取取得近 3 個月資料，只會下載快取中缺少的 K 棒
+    start_dt = datetime.now() - pd.DateOffset(months=3)
+    all_data = data_cache.as_wide(data_cache.load_many(ticker_list, start=start_dt))
     
     if all_data.empty:
         send_ntfy_notification(NTFY_TOPIC, report_title, "錯誤：無法下載股市資料。")
         sys.exit(1)
 
-    for item in STOCK_CONFIG:
+    # 所有標的一次計算，門檻判斷以向量化遮罩完成
+    trends = calculate_wide_trends(all_data)
+    item_trends = trends.reindex([s["ticker"] for s in STOCK_CONFIG])
+    drop_hits = item_trends["drop"].to_numpy() <= -np.array([s["drop"] for s in STOCK_CONFIG], dtype=float)
+    rec_hits = item_trends["recovery"].to_numpy() >= np.array([s["rec"] for s in STOCK_CONFIG], dtype=float)
+
+    # 只有狀態改變的標的才組成通知區塊；--digest 或 NTFY_FULL_DIGEST=1 時送出完整報告
+    full_digest = args.digest or os.getenv("NTFY_FULL_DIGEST") == "1"
+    state = alert_state.load_state()
+    changed = []  # 狀態改變的標的，通知送達後才寫入狀態檔
+
+    for i, item in enumerate(STOCK_CONFIG):
         ticker = item["ticker"]
         name = item["name"]
-        drop_thr = item["drop"]
-        rec_thr = item["rec"]
         cost = item.get("cost") # 持有成本
+        previous = state.get(alert_state.state_key(item))
 
-        try:
-            if len(ticker_list) > 1:
-                stock_data = pd.DataFrame({
-                    'High': all_data['High'][ticker],
-                    'Low': all_data['Low'][ticker],
-                    'Close': all_data['Close'][ticker]
-                })
+        res = None
+        if ticker not in trends.index:
+            status_tag = "資料下載異常"
+        else:
+            res = item_trends.iloc[i]
+            if pd.isna(res["price"]):
+                status_tag, res = "計算失敗", None
             else:
-                stock_data = all_data[['High', 'Low', 'Close']]
-        except (KeyError, ValueError):
-            final_report_blocks.append(f"📈 {name} ({ticker})\n (資料下載異常)")
-            continue
-            
-        res = calculate_dynamic_trends(name, stock_data, drop_thr, rec_thr)
-        if res is None:
-            final_report_blocks.append(f"📈 {name} ({ticker})\n (計算失敗)")
+                status_tag, advice = evaluate_status(cost, bool(drop_hits[i]), bool(rec_hits[i]))
+
+        is_changed = alert_state.is_transition(state, item, status_tag)
+        price = None if res is None else res["price"]
+        if is_changed:
+            changed.append((item, status_tag, price))
+        else:
+            alert_state.record(state, item, status_tag, price)
+        if not (is_changed or full_digest):
             continue
 
-        # --- 判斷邏輯與建議 ---
-        status_tag = ""
-        advice = ""
-        
-        is_drop_hit = res["drop"] <= -drop_thr
-        is_rec_hit = res["recovery"] >= rec_thr
-        
-        if cost is not None:
-            # 已持有標的
-            pnl_pct = ((res["price"] - cost) / cost) * 100
-            holding_info = f"持有成本：{cost:,.2f} (目前損益：{pnl_pct:+.1f}%)\n"
-            
-            if is_drop_hit:
-                status_tag = "⚠️ 跌幅達標"
-                advice = "💡 建議：股價回落，考慮部分獲利了結或設置停損。"
-            elif is_rec_hit:
-                status_tag = "🟢 回補達標"
-                advice = "💡 建議：股價反彈，可考慮逢低加碼或攤平成本。"
-            else:
-                status_tag = "正常"
-                advice = "💡 建議：持有並觀察。"
+        if res is None:
+            report_block = f"📈 {name} ({ticker})\n ({status_tag})"
         else:
-            # 觀察標的
-            holding_info = "觀察清單 (未持有)\n"
-            if is_rec_hit:
-                status_tag = "🔥 入手時機"
-                advice = "💡 建議：近期強勢回升，可考慮建立首筆部位。"
-            elif is_drop_hit:
-                status_tag = "⚠️ 觀察中"
-                advice = "💡 建議：持續回落中，先不要急著接刀。"
-            else:
-                status_tag = "正常"
-                advice = "💡 建議：耐心等待信號。"
-
-        report_block = (
-            f"📈 {name} ({ticker}) | {status_tag}\n"
-            f"{holding_info}"
-            f"目前：{res['price']:,.2f} ({res['daily_change']:+.1f}%)\n"
-            f"近期高點：{res['peak']:,.2f} (距高點 {res['drop']:.1f}%)\n"
-            f"近期低點：{res['valley']:,.2f} (距低點 {res['recovery']:+.1f}%)\n"
-            f"{advice}"
-        )
+            report_block = format_report_block(name, ticker, res, cost, status_tag, advice)
+        if is_changed and previous is not None:
+            report_block = f"🔄 {previous['status']} → {status_tag}\n" + report_block
         final_report_blocks.append(report_block)
 
+    print(f"狀態改變的標的: {len(changed)} / {len(STOCK_CONFIG)}")
+
+    failed = 0
     if final_report_blocks:
-        total_report = "\n\n".join(final_report_blocks)
-        send_ntfy_notification(NTFY_TOPIC, report_title, total_report)
+        failed = send_ntfy_notification(NTFY_TOPIC, report_title, final_report_blocks)
+    else:
+        print("沒有狀態變化，不發送通知。")
+
+    # 通知有任何一則失敗時不記錄狀態變化，下次執行會再通知一次
+    if failed:
+        print(f"{failed} 則通知發送失敗，保留 {len(changed)} 支標的的舊狀態。")
+    else:
+        for item, status_tag, price in changed:
+            alert_state.record(state, item, status_tag, price)
+    alert_state.save_state(state)
     
     print("--- 任務完成 ---")
 
@@ -0,0 +1,588 @@
+import numpy as np
+
+import indicators
+
+# ===============================================
+# 向量化策略核心 (策略外掛 + 單次走訪的時間迴圈)
+# ===============================================
+# 每個策略是一個外掛物件：start() 依參數形狀配置狀態，step() 推進一根 K 棒，
+# value() 寫出當下的淨值，finish() 期末清算。run_strategies 只走訪價格一次，
+# 每根 K 棒依序推進所有外掛，所以同時跑 A/B/C/D 只需要一次時間迴圈。
+# 只有單一參數組 (shape == ()) 時，每根 K 棒十多次的小型 NumPy 呼叫成本遠大於運算本身，
+# 這時改由各外掛的 scan() 以純 Python 純量迴圈一次走完整段收盤價 (結果逐位元相同)。
+
+
+def as_close_array(df):
+    """Returns the Close column of a price frame as a contiguous float64 array."""
+    close = df['Close']
+    if getattr(close, 'ndim', 1) > 1:
+        close = close.iloc[:, 0]
+    return np.ascontiguousarray(close.to_numpy(dtype=np.float64))
+
+
+def threshold_grid(buy_thresholds, sell_thresholds):
+    """Expands buy/sell threshold axes into flat (buy_t, sell_t) pair vectors (buy-major)."""
+    bt, st = np.meshgrid(np.asarray(buy_thresholds, dtype=np.float64),
+                         np.asarray(sell_thresholds, dtype=np.float64), indexing='ij')
+    return bt.ravel(), st.ravel()
+
+
+def trade_factors(trading_fee_rate, sell_tax_rate, slippage=0.001):
+    """Returns (buy_cost, sell_keep): cash per share bought, and the share of value kept when selling."""
+    buy_cost = 1 + trading_fee_rate + slippage
+    sell_keep = 1 - trading_fee_rate - sell_tax_rate - slippage
+    return buy_cost, sell_keep
+
+
+def _liquidation_value(cap, shares, in_pos, price, sell_keep, out, tmp):
+    """Cash when flat, shares * price net of the expected exit costs when holding."""
+    np.multiply(shares, price, out=tmp)
+    tmp *= sell_keep
+    np.copyto(out, cap)
+    np.copyto(out, tmp, where=in_pos)
+
+
+class HoldStrategy:
+    """Strategy A: buy on the first bar and hold until the end (one column per close column)."""
+
+    def start(self, ctx):
+        close = ctx['close']
+        self.shape = close.shape[1:]
+        self.sell_keep = ctx['sell_keep']
+        self.shares = (ctx['initial_capital'] / ctx['buy_cost']) / close[0]
+
+    def step(self, i, price):
+        pass
+
+    def scan(self, close, offset=0, equity=None):
+        if equity is not None:
+            equity[...] = (self.shares * close) * self.sell_keep
+
+    def value(self, price, out):
+        out[...] = (self.shares * price) * self.sell_keep
+
+    def finish(self, last_price):
+        return np.asarray((self.shares * last_price) * self.sell_keep), np.ones(self.shape, dtype=np.int64)
+
+
+class TrendStrategy:
+    """
+    Strategy B for many (buy_t, sell_t) pairs. `close` may be (T,) or (T, ...);
+    its trailing dimensions broadcast against the threshold vectors.
+    """
+
+    def __init__(self, buy_thresholds, sell_thresholds):
+        self.buy_t = np.asarray(buy_thresholds, dtype=np.float64)
+        self.sell_t = np.asarray(sell_thresholds, dtype=np.float64)
+
+    def start(self, ctx):
+        close = ctx['close']
+        shape = np.broadcast_shapes(close.shape[1:], self.buy_t.shape, self.sell_t.shape)
+        self.shape = shape
+        self.buy_cost = ctx['buy_cost']
+        self.sell_keep = ctx['sell_keep']
+        self.sell_level = np.broadcast_to(1 - self.sell_t, shape)
+        self.buy_level = np.broadcast_to(1 + self.buy_t, shape)
+
+        first_price = np.broadcast_to(close[0], shape)
+        # 初始買入
+        self.shares = np.array((ctx['initial_capital'] / self.buy_cost) / first_price, dtype=np.float64)
+        self.cap = np.zeros(shape)
+        self.in_pos = np.ones(shape, dtype=bool)
+        self.peak = np.array(first_price, dtype=np.float64)
+        self.valley = self.peak.copy()
+        self.trades = np.ones(shape, dtype=np.int64)
+
+        # 迴圈內重複使用的暫存陣列
+        self.price = np.empty(shape)
+        self.mask = np.empty(shape, dtype=bool)
+        self.out = np.empty(shape, dtype=bool)
+        self.sell = np.empty(shape, dtype=bool)
+        self.buy = np.empty(shape, dtype=bool)
+        self.tmp = np.empty(shape)
+
+    def step(self, i, close_i):
+        price, peak, valley, shares, cap = self.price, self.peak, self.valley, self.shares, self.cap
+        in_pos, mask, out, sell, buy, tmp = self.in_pos, self.mask, self.out, self.sell, self.buy, self.tmp
+        price[...] = close_i
+        np.logical_not(in_pos, out=out)
+
+        # 持有中：更新高峰，跌破高峰 * (1 - 賣出門檻) 則賣出
+        np.greater(price, peak, out=mask)
+        mask &= in_pos
+        np.copyto(peak, price, where=mask)
+        np.multiply(peak, self.sell_level, out=tmp)
+        np.less_equal(price, tmp, out=sell)
+        sell &= in_pos
+        np.multiply(shares, price, out=tmp)
+        tmp *= self.sell_keep
+        np.copyto(cap, tmp, where=sell)
+        np.copyto(shares, 0.0, where=sell)
+        np.copyto(valley, price, where=sell)
+        self.trades += sell
+
+        # 空手中：更新谷底，自谷底回升 * (1 + 買入門檻) 則買入
+        np.less(price, valley, out=mask)
+        mask &= out
+        np.copyto(valley, price, where=mask)
+        np.multiply(valley, self.buy_level, out=tmp)
+        np.greater_equal(price, tmp, out=buy)
+        buy &= out
+        np.divide(cap, self.buy_cost, out=tmp)
+        tmp /= price
+        np.copyto(shares, tmp, where=buy)
+        np.copyto(cap, 0.0, where=buy)
+        np.copyto(peak, price, where=buy)
+        self.trades += buy
+
+        in_pos ^= sell
+        in_pos |= buy
+
+    def scan(self, close, offset=0, equity=None):
+        """Scalar fast path: step() and value() over a whole 1-D chunk for a single (buy_t, sell_t) pair."""
+        buy_cost, sell_keep = self.buy_cost, self.sell_keep
+        sell_level, buy_level = float(self.sell_level), float(self.buy_level)
+        cap, shares, peak, valley = float(self.cap), float(self.shares), float(self.peak), float(self.valley)
+        in_pos, trades = bool(self.in_pos), int(self.trades)
+        values = [] if equity is not None else None
+        for price in close.tolist():
+            if in_pos:
+                if price > peak:
+                    peak = price
+                if price <= peak * sell_level:
+                    cap = (shares * price) * sell_keep
+                    shares = 0.0
+                    valley = price
+                    in_pos = False
+                    trades += 1
+            else:
+                if price < valley:
+                    valley = price
+                if price >= valley * buy_level:
+                    shares = (cap / buy_cost) / price
+                    cap = 0.0
+                    peak = price
+                    in_pos = True
+                    trades += 1
+            if values is not None:
+                values.append((shares * price) * sell_keep if in_pos else cap)
+        self.cap[...], self.shares[...], self.peak[...], self.valley[...] = cap, shares, peak, valley
+        self.in_pos[...], self.trades[...] = in_pos, trades
+        if values is not None:
+            equity[...] = values
+
+    def value(self, close_i, out):
+        # 持有中紀錄扣除預期清算成本後的「實拿」價值
+        self.price[...] = close_i
+        _liquidation_value(self.cap, self.shares, self.in_pos, self.price, self.sell_keep, out, self.tmp)
+
+    def finish(self, last_close):
+        final = np.empty(self.shape)
+        self.value(last_close, final)
+        return final, self.trades
+
+
+# ===============================================
+# Strategy C (SMA + 冷卻期) 與 Strategy D (ATR 自適應) 向量化核心
+# ===============================================
+
+
+def _unique_columns(values):
+    """Returns (unique values, index of each value's column) for a parameter vector."""
+    uniq, inverse = np.unique(np.asarray(values), return_inverse=True)
+    return uniq, inverse.reshape(np.shape(values))
+
+
+def sma_matrix(close, windows, key=None):
+    """Returns a (T, U) matrix of rolling means, one column per unique window (pandas semantics)."""
+    data = {'close': close}
+    key = key or indicators.fingerprint(close)
+    return np.column_stack([indicators.get('sma', w, data, key) for w in windows])
+
+
+def atr_matrix(high, low, close, windows, key=None):
+    """Returns a (T, U) matrix of ATR (rolling mean of true range), one column per unique window."""
+    data = {'high': high, 'low': low, 'close': close}
+    key = key or indicators.fingerprint(high, low, close)
+    return np.column_stack([indicators.get('atr', w, data, key) for w in windows])
+
+
+class SmaStrategy:
+    """
+    Strategy C (price crosses SMA, then a cool-down in bars) for every
+    (sma_window, cooldown) pair. Starts in cash. `sma` may pass a precomputed
+    (T, U) matrix for the unique windows.
+    """
+
+    # load_chunk() 需要的價格欄位
+    fields = ('close',)
+
+    def __init__(self, sma_windows, cooldowns, sma=None):
+        self.windows, col = _unique_columns(sma_windows)
+        cooldowns = np.asarray(cooldowns, dtype=np.int64)
+        self.shape = np.broadcast_shapes(col.shape, cooldowns.shape)
+        self.col = np.broadcast_to(col, self.shape)
+        self.cooldown = np.broadcast_to(cooldowns, self.shape)
+        self.sma = sma
+        self.offset = 0
+
+    def start(self, ctx):
+        shape = self.shape
+        # 串流模式由 load_chunk() 逐段提供指標
+        if self.sma is None and not ctx.get('streaming'):
+            self.sma = sma_matrix(ctx['close'], self.windows, key=ctx.get('key'))
+        self.buy_cost = ctx['buy_cost']
+        self.sell_keep = ctx['sell_keep']
+        self.cap = np.full(shape, float(ctx['initial_capital']))
+        self.shares = np.zeros(shape)
+        self.in_pos = np.zeros(shape, dtype=bool)
+        self.last_trans = np.full(shape, -999, dtype=np.int64)
+        self.trades = np.zeros(shape, dtype=np.int64)
+
+        self.ready = np.empty(shape, dtype=bool)
+        self.buy = np.empty(shape, dtype=bool)
+        self.sell = np.empty(shape, dtype=bool)
+        self.tmp = np.empty(shape)
+
+    def step(self, i, price):
+        cap, shares, in_pos, ready, buy, sell, tmp = (self.cap, self.shares, self.in_pos,
+                                                      self.ready, self.buy, self.sell, self.tmp)
+        current_sma = self.sma[i - self.offset][self.col]
+        # SMA 尚未形成 (NaN) 時比較結果為 False，等同略過
+        np.less_equal(self.last_trans, i - self.cooldown, out=ready)
+        ready &= ~np.isnan(current_sma)
+
+        np.greater(price, current_sma, out=buy)
+        buy &= ready
+        buy &= ~in_pos
+        np.less(price, current_sma, out=sell)
+        sell &= ready
+        sell &= in_pos
+
+        np.divide(cap, self.buy_cost, out=tmp)
+        tmp /= price
+        np.copyto(shares, tmp, where=buy)
+        np.copyto(cap, 0.0, where=buy)
+
+        np.multiply(shares, price, out=tmp)
+        tmp *= self.sell_keep
+        np.copyto(cap, tmp, where=sell)
+        np.copyto(shares, 0.0, where=sell)
+
+        in_pos |= buy
+        in_pos ^= sell
+        self.trades += buy
+        self.trades += sell
+        np.copyto(self.last_trans, i, where=buy | sell)
+
+    def scan(self, close, offset=0, equity=None):
+        """Scalar fast path of step() over a whole 1-D chunk for a single (sma_window, cooldown) pair."""
+        buy_cost, sell_keep = self.buy_cost, self.sell_keep
+        row = offset - self.offset
+        sma = self.sma[row:row + len(close), int(self.col)].tolist()
+        cooldown = int(self.cooldown)
+        cap, shares, in_pos = float(self.cap), float(self.shares), bool(self.in_pos)
+        last_trans, trades = int(self.last_trans), int(self.trades)
+        values = [] if equity is not None else None
+        for j, (price, current_sma) in enumerate(zip(close.tolist(), sma)):
+            # NaN != NaN：SMA 尚未形成時略過
+            if current_sma == current_sma and last_trans <= offset + j - cooldown:
+                if price > current_sma and not in_pos:
+                    shares = (cap / buy_cost) / price
+                    cap = 0.0
+                    in_pos = True
+                    trades += 1
+                    last_trans = offset + j
+                elif price < current_sma and in_pos:
+                    cap = (shares * price) * sell_keep
+                    shares = 0.0
+                    in_pos = False
+                    trades += 1
+                    last_trans = offset + j
+            if values is not None:
+                values.append((shares * price) * sell_keep if in_pos else cap)
+        self.cap[...], self.shares[...], self.in_pos[...] = cap, shares, in_pos
+        self.last_trans[...], self.trades[...] = last_trans, trades
+        if values is not None:
+            equity[...] = values
+
+    def load_chunk(self, chunk, offset):
+        """Computes the SMA rows of one streamed chunk, prefixed by the tail of the previous one."""
+        close = chunk['close']
+        if offset:
+            close = np.concatenate([self._tail, close])
+        head = len(close) - len(chunk['close'])
+        self.sma = np.column_stack([indicators.compute_sma(close, w) for w in self.windows])[head:]
+        self.offset = offset
+        self._tail = close[max(0, len(close) - (int(self.windows.max()) - 1)):]
+
+    def value(self, price, out):
+        _liquidation_value(self.cap, self.shares, self.in_pos, price, self.sell_keep, out, self.tmp)
+
+    def finish(self, last_price):
+        final = np.empty(self.shape)
+        self.value(last_price, final)
+        return final, self.trades
+
+
+class AtrStrategy:
+    """
+    Strategy D (dual threshold = ATR * multiplier / price) for every
+    (atr_window, multiplier) pair. Bars whose ATR is not yet defined leave the
+    state untouched. `atr` may pass a precomputed (T, U) matrix for the unique windows.
+    """
+
+    fields = ('high', 'low', 'close')
+
+    def __init__(self, atr_windows, multipliers, atr=None):
+        self.windows, col = _unique_columns(atr_windows)
+        mult = np.asarray(multipliers, dtype=np.float64)
+        self.shape = np.broadcast_shapes(col.shape, mult.shape)
+        self.col = np.broadcast_to(col, self.shape)
+        self.mult = np.broadcast_to(mult, self.shape)
+        self.atr = atr
+        self.offset = 0
+
+    def start(self, ctx):
+        shape = self.shape
+        close = ctx['close']
+        if self.atr is None and not ctx.get('streaming'):
+            self.atr = atr_matrix(ctx['high'], ctx['low'], close, self.windows, key=ctx.get('key'))
+        self.buy_cost = ctx['buy_cost']
+        self.sell_keep = ctx['sell_keep']
+
+        first_price = close[0]
+        self.shares = np.full(shape, (ctx['initial_capital'] / self.buy_cost) / first_price)
+        self.cap = np.zeros(shape)
+        self.in_pos = np.ones(shape, dtype=bool)
+        self.peak = np.full(shape, first_price)
+        self.valley = np.full(shape, first_price)
+        self.trades = np.ones(shape, dtype=np.int64)
+
+        self.active = np.empty(shape, dtype=bool)
+        self.holding = np.empty(shape, dtype=bool)
+        self.waiting = np.empty(shape, dtype=bool)
+        self.mask = np.empty(shape, dtype=bool)
+        self.sell = np.empty(shape, dtype=bool)
+        self.buy = np.empty(shape, dtype=bool)
+        self.dynamic_t = np.empty(shape)
+        self.tmp = np.empty(shape)
+
+    def step(self, i, price):
+        cap, shares, in_pos, peak, valley = self.cap, self.shares, self.in_pos, self.peak, self.valley
+        active, holding, waiting, mask = self.active, self.holding, self.waiting, self.mask
+        sell, buy, dynamic_t, tmp = self.sell, self.buy, self.dynamic_t, self.tmp
+
+        current_atr = self.atr[i - self.offset][self.col]
+        np.logical_not(np.isnan(current_atr), out=active)
+        np.multiply(current_atr, self.mult, out=dynamic_t)
+        dynamic_t /= price
+        np.logical_and(in_pos, active, out=holding)
+        np.logical_not(in_pos, out=waiting)
+        waiting &= active
+
+        np.greater(price, peak, out=mask)
+        mask &= holding
+        np.copyto(peak, price, where=mask)
+        np.subtract(1, dynamic_t, out=tmp)
+        tmp *= peak
+        np.less_equal(price, tmp, out=sell)
+        sell &= holding
+        np.multiply(shares, price, out=tmp)
+        tmp *= self.sell_keep
+        np.copyto(cap, tmp, where=sell)
+        np.copyto(shares, 0.0, where=sell)
+        np.copyto(valley, price, where=sell)
+
+        np.less(price, valley, out=mask)
+        mask &= waiting
+        np.copyto(valley, price, where=mask)
+        np.add(1, dynamic_t, out=tmp)
+        tmp *= valley
+        np.greater_equal(price, tmp, out=buy)
+        buy &= waiting
+        np.divide(cap, self.buy_cost, out=tmp)
+        tmp /= price
+        np.copyto(shares, tmp, where=buy)
+        np.copyto(cap, 0.0, where=buy)
+        np.copyto(peak, price, where=buy)
+
+        in_pos ^= sell
+        in_pos |= buy
+        self.trades += sell
+        self.trades += buy
+
+    def scan(self, close, offset=0, equity=None):
+        """Scalar fast path of step() over a whole 1-D chunk for a single (atr_window, multiplier) pair."""
+        buy_cost, sell_keep = self.buy_cost, self.sell_keep
+        row = offset - self.offset
+        atr = self.atr[row:row + len(close), int(self.col)].tolist()
+        mult = float(self.mult)
+        cap, shares, peak, valley = float(self.cap), float(self.shares), float(self.peak), float(self.valley)
+        in_pos, trades = bool(self.in_pos), int(self.trades)
+        values = [] if equity is not None else None
+        for price, current_atr in zip(close.tolist(), atr):
+            if current_atr == current_atr:
+                dynamic_t = (current_atr * mult) / price
+                if in_pos:
+                    if price > peak:
+                        peak = price
+                    if price <= peak * (1 - dynamic_t):
+                        cap = (shares * price) * sell_keep
+                        shares = 0.0
+                        valley = price
+                        in_pos = False
+                        trades += 1
+                else:
+                    if price < valley:
+                        valley = price
+                    if price >= valley * (1 + dynamic_t):
+                        shares = (cap / buy_cost) / price
+                        cap = 0.0
+                        peak = price
+                        in_pos = True
+                        trades += 1
+            if values is not None:
+                values.append((shares * price) * sell_keep if in_pos else cap)
+        self.cap[...], self.shares[...], self.peak[...], self.valley[...] = cap, shares, peak, valley
+        self.in_pos[...], self.trades[...] = in_pos, trades
+        if values is not None:
+            equity[...] = values
+
+    def load_chunk(self, chunk, offset):
+        """
+        Computes the ATR rows of one streamed chunk. The previous chunk's last
+        max(window) bars are kept so true range and the rolling mean see the same bars.
+        """
+        arrays = [chunk['high'], chunk['low'], chunk['close']]
+        if offset:
+            arrays = [np.concatenate([t, a]) for t, a in zip(self._tail, arrays)]
+        head = len(arrays[2]) - len(chunk['close'])
+        true_range = indicators.compute_true_range(*arrays)
+        self.atr = np.column_stack([indicators.compute_sma(true_range, w) for w in self.windows])[head:]
+        self.offset = offset
+        keep = int(self.windows.max())
+        self._tail = [a[max(0, len(a) - keep):] for a in arrays]
+
+    def value(self, price, out):
+        _liquidation_value(self.cap, self.shares, self.in_pos, price, self.sell_keep, out, self.tmp)
+
+    def finish(self, last_price):
+        final = np.empty(self.shape)
+        self.value(last_price, final)
+        return final, self.trades
+
+
+class StrategyResult:
+    """
+    Outcome of one strategy plugin: 'final' and 'trades' arrays (one entry per
+    parameter cell) and the optional (T, ...) 'equity' array. Slots keep the
+    object small; item access is kept so results read like the former dicts.
+    """
+
+    __slots__ = ('final', 'trades', 'equity')
+
+    def __init__(self, final, trades, equity=None):
+        self.final = final
+        self.trades = trades
+        self.equity = equity
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.final, self.trades, self.equity) if a is not None)
+
+
+def advance(strategies, close, offset=0, equities=None):
+    """
+    Steps every started plugin through `close`, whose first bar is bar `offset`
+    of the whole series. Row j of each array in `equities` receives bar j's value.
+    When every plugin holds a single parameter cell and provides scan(), each
+    plugin runs its scalar loop over the whole array instead (the plugins are
+    independent, so the order of the loops does not matter).
+    """
+    if close.ndim == 1 and all(s.shape == () and hasattr(s, 'scan') for s in strategies):
+        for k, strategy in enumerate(strategies):
+            strategy.scan(close, offset, None if equities is None else equities[k])
+        return
+    for j in range(len(close)):
+        price = close[j]
+        i = offset + j
+        for strategy in strategies:
+            strategy.step(i, price)
+        if equities is not None:
+            for strategy, equity in zip(strategies, equities):
+                strategy.value(price, equity[j, ...])
+
+
+def run_strategies(close, strategies, buy_cost, sell_keep, initial_capital=10000,
+                   record_equity=False, high=None, low=None, key=None, equity_dtype=np.float64):
+    """
+    Advances every strategy plugin through `close` in one time loop. Equity
+    curves are preallocated as (T, *strategy.shape) arrays of `equity_dtype`
+    (float32 halves their size) only when record_equity is set. `high`/`low`
+    feed indicator-based plugins and `key` names the data in the indicator
+    cache. Returns one StrategyResult per strategy.
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    ctx = {
+        'close': close,
+        'high': high,
+        'low': low,
+        'key': key,
+        'buy_cost': buy_cost,
+        'sell_keep': sell_keep,
+        'initial_capital': initial_capital
+    }
+    for strategy in strategies:
+        strategy.start(ctx)
+    equities = None
+    if record_equity:
+        equities = [np.empty((len(close),) + strategy.shape, dtype=equity_dtype) for strategy in strategies]
+    advance(strategies, close, equities=equities)
+
+    results = []
+    for k, strategy in enumerate(strategies):
+        final, trades = strategy.finish(close[-1])
+        results.append(StrategyResult(final, trades, None if equities is None else equities[k]))
+    return results
+
+
+def run_trend_kernel(close, buy_thresholds, sell_thresholds, trading_fee_rate, sell_tax_rate,
+                     slippage=0.001, initial_capital=10000, record_equity=False):
+    """
+    Runs Strategy B for many (buy_t, sell_t) pairs in a single pass over time.
+
+    `close` has shape (T,) or (T, ...); its trailing dimensions broadcast against the
+    threshold vectors, so every pair advances its peak/valley/in-position state
+    together at each bar. Returns a StrategyResult with 'final' and 'trades' (one entry
+    per pair) and 'equity' of shape (T, ...) when record_equity is set, otherwise None.
+    The accounting matches the scalar loop of run_backtest bar for bar.
+    """
+    buy_cost, sell_keep = trade_factors(trading_fee_rate, sell_tax_rate, slippage)
+    return run_strategies(close, [TrendStrategy(buy_thresholds, sell_thresholds)], buy_cost, sell_keep,
+                          initial_capital=initial_capital, record_equity=record_equity)[0]
+
+
+def run_sma_kernel(close, sma_windows, cooldowns, trading_fee_rate, sell_tax_rate,
+                   slippage=0.001, initial_capital=10000, record_equity=False, sma=None):
+    """
+    Runs Strategy C for every (sma_window, cooldown) pair in one pass over time.
+    Returns 'final', 'trades' and optional 'equity' like run_trend_kernel.
+    """
+    buy_cost, sell_keep = trade_factors(trading_fee_rate, sell_tax_rate, slippage)
+    return run_strategies(close, [SmaStrategy(sma_windows, cooldowns, sma=sma)], buy_cost, sell_keep,
+                          initial_capital=initial_capital, record_equity=record_equity)[0]
+
+
+def run_atr_kernel(high, low, close, atr_windows, multipliers, trading_fee_rate, sell_tax_rate,
+                   slippage=0.001, initial_capital=10000, record_equity=False, atr=None):
+    """
+    Runs Strategy D for every (atr_window, multiplier) pair in one pass over time.
+    Returns the same StrategyResult as run_trend_kernel.
+    """
+    buy_cost, sell_keep = trade_factors(trading_fee_rate, sell_tax_rate, slippage)
+    return run_strategies(close, [AtrStrategy(atr_windows, multipliers, atr=atr)], buy_cost, sell_keep,
+                          initial_capital=initial_capital, record_equity=record_equity, high=high, low=low)[0]
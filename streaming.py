@@ -0,0 +1,166 @@
+import os
+import time
+
+import numpy as np
+
+import data_cache
+import engine
+import profiling
+from strategy_kernel import StrategyResult, advance
+
+# ===============================================
+# 串流回測 (分段讀取分K 等大型資料，記憶體用量與歷史長度無關)
+# ===============================================
+DEFAULT_CHUNK_SIZE = 1_000_000
+FIELDS = ('close', 'high', 'low')
+
+
+def iter_npy_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields {'close', 'high', 'low'} chunks from a memory-mapped .npy file: either
+    data_cache records (RECORD_DTYPE) or a plain 1-D array of closes.
+    Only the current chunk is copied into memory.
+    """
+    records = np.load(path, mmap_mode='r')
+    for i0 in range(0, len(records), chunk_size):
+        part = records[i0:i0 + chunk_size]
+        if records.dtype.names:
+            yield {f: np.array(part[f.capitalize()], dtype=np.float64) for f in FIELDS if f.capitalize() in records.dtype.names}
+        else:
+            yield {'close': np.array(part, dtype=np.float64)}
+
+
+def iter_parquet_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields {'close', 'high', 'low'} chunks from a Parquet file, one row-group batch at a time (needs pyarrow)."""
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(path)
+    columns = [c for c in pf.schema_arrow.names if c.lower() in FIELDS]
+    for batch in pf.iter_batches(batch_size=chunk_size, columns=columns):
+        yield {name.lower(): batch.column(k).to_numpy(zero_copy_only=False).astype(np.float64)
+               for k, name in enumerate(batch.schema.names)}
+
+
+def iter_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        return iter_npy_chunks(path, chunk_size)
+    if ext in ('.parquet', '.pq'):
+        return iter_parquet_chunks(path, chunk_size)
+    raise ValueError(f"不支援的串流檔案格式: {path} (需為 .npy 或 .parquet)")
+
+
+def available_fields(path):
+    """Returns which of FIELDS a .npy / .parquet bar file provides, without reading its rows."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        names = np.load(path, mmap_mode='r').dtype.names
+        return tuple(f for f in FIELDS if f.capitalize() in names) if names else ('close',)
+    if ext in ('.parquet', '.pq'):
+        import pyarrow.parquet as pq
+
+        names = {c.lower() for c in pq.ParquetFile(path).schema_arrow.names}
+        return tuple(f for f in FIELDS if f in names)
+    raise ValueError(f"不支援的串流檔案格式: {path} (需為 .npy 或 .parquet)")
+
+
+def save_records(df, path):
+    """Stages an OHLCV DataFrame (e.g. minute bars read from CSV) as a memory-mappable .npy file."""
+    np.save(path, data_cache.frame_to_records(df))
+
+
+def run_stream(chunks, stock_code, strategies, initial_capital=10000, equity_every=0, slippage=engine.SLIPPAGE):
+    """
+    Runs named strategy plugins ({name: plugin}) over an iterable of chunks,
+    carrying every plugin's state across chunk boundaries. Indicator plugins
+    receive each chunk through load_chunk() together with the look-back tail of
+    the previous one. With `equity_every` > 0 the equity of every N-th bar is
+    sampled; otherwise no curve is kept. Returns the same layout as
+    engine.run_backtest plus 'bars' and 'chunks'.
+    """
+    costs = engine.fee_model(stock_code, slippage)
+    names = list(strategies)
+    plugins = [strategies[n] for n in names]
+    samples = [[] for _ in plugins]
+    sample_index = []
+    offset = 0
+    n_chunks = 0
+    last_price = None
+
+    for chunk in chunks:
+        close = np.ascontiguousarray(chunk['close'], dtype=np.float64)
+        if len(close) == 0:
+            continue
+        chunk = dict(chunk, close=close)
+        if offset == 0:
+            for name, plugin in zip(names, plugins):
+                missing = [f for f in getattr(plugin, 'fields', ()) if f not in chunk]
+                if missing:
+                    raise ValueError(f"Strategy {name.upper()} 需要 {', '.join(missing)} 欄位，串流資料只有 {', '.join(chunk)}")
+            ctx = {
+                'close': close,
+                'high': chunk.get('high'),
+                'low': chunk.get('low'),
+                'buy_cost': costs['buy_cost'],
+                'sell_keep': costs['sell_keep'],
+                'initial_capital': initial_capital,
+                'streaming': True
+            }
+            for plugin in plugins:
+                plugin.start(ctx)
+        for plugin in plugins:
+            if hasattr(plugin, 'load_chunk'):
+                plugin.load_chunk(chunk, offset)
+
+        # 淨值只在本段內暫存，取樣後即丟棄
+        equities = [np.empty((len(close),) + p.shape) for p in plugins] if equity_every else None
+        advance(plugins, close, offset=offset, equities=equities)
+        if equity_every:
+            first = (-offset) % equity_every
+            sample_index.extend(range(offset + first, offset + len(close), equity_every))
+            for buf, equity in zip(samples, equities):
+                buf.append(equity[first::equity_every])
+
+        offset += len(close)
+        n_chunks += 1
+        last_price = close[-1]
+
+    if last_price is None:
+        raise ValueError("串流資料是空的")
+
+    out = {}
+    for name, plugin, buf in zip(names, plugins, samples):
+        final, trades = plugin.finish(last_price)
+        out[name] = StrategyResult(final, trades, np.concatenate(buf) if equity_every else None)
+    out['equity_index'] = np.asarray(sample_index, dtype=np.int64) if equity_every else None
+    out['costs'] = costs
+    out['bars'] = offset
+    out['chunks'] = n_chunks
+    return out
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux 回傳 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def report(path, stock_code, strategies, chunk_size=DEFAULT_CHUNK_SIZE, initial_capital=10000):
+    """Streams `path` through the strategies and prints ROI / trades per strategy."""
+    print(f"--- 串流回測 {stock_code} ({path}, 每段 {chunk_size:,} 根) ---")
+    t0 = time.perf_counter()
+    with profiling.phase('stream'):
+        res = run_stream(iter_chunks(path, chunk_size), stock_code, strategies, initial_capital=initial_capital)
+    elapsed = time.perf_counter() - t0
+
+    print(f"市場: {res['costs']['market']} | K 棒: {res['bars']:,} | 分段: {res['chunks']} | 耗時: {elapsed:.1f}s")
+    for name in strategies:
+        roi = (float(res[name]['final']) / initial_capital - 1) * 100
+        print(f"Strategy {name.upper()}: 報酬率 {roi:.1f}% (交易次數: {int(res[name]['trades'])})")
+    peak = _peak_rss_mb()
+    if peak is not None:
+        print(f"峰值記憶體 (RSS): {peak:.0f} MB")
+    return res
@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import ai_analysis
+
+pytest.importorskip("google.genai")
+
+
+class FakeGemini:
+    """Local stand-in for the Gemini generateContent endpoint (GEMINI_BASE_URL)."""
+
+    def __init__(self, text="假的量化分析", delay=0.0):
+        self.paths = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                stub.paths.append(self.path)
+                time.sleep(delay)
+                body = json.dumps({'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]},
+                                                   'finishReason': 'STOP'}]}).encode('utf-8')
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except OSError:
+                    # client 已因逾時斷線
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def gemini(tmp_path, monkeypatch):
+    servers = []
+
+    def start(**kwargs):
+        server = FakeGemini(**kwargs)
+        servers.append(server)
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(ai_analysis, 'BASE_URL', server.url)
+        monkeypatch.setattr(ai_analysis, '_client', None)
+        return server
+
+    monkeypatch.setattr(ai_analysis, 'AI_CACHE_DIR', str(tmp_path / "ai_cache"))
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_analysis_is_fetched_once_then_cached(gemini):
+    server = gemini()
+    args = ("2330.TW", "2020-01-01~2024-12-31", "買\\賣 | ...\n", 85.0, 60.0)
+
+    assert ai_analysis.wait(ai_analysis.submit_analysis(*args), timeout=30) == "假的量化分析"
+    assert server.paths == [f"/v1beta/models/{ai_analysis.MODEL_ID}:generateContent"]
+    assert ai_analysis.get_ai_analysis(*args) == "假的量化分析"
+    assert len(server.paths) == 1
+    # 不同的矩陣是不同的提示，會再呼叫一次
+    ai_analysis.get_ai_analysis(*args[:2], "另一個矩陣\n", 85.0, 60.0)
+    assert len(server.paths) == 2
+
+
+def test_wait_times_out_and_client_timeout_ends_the_request(gemini, monkeypatch):
+    gemini(delay=3.0)
+    monkeypatch.setattr(ai_analysis, 'AI_TIMEOUT', 0.5)
+
+    t0 = time.perf_counter()
+    future = ai_analysis.submit_analysis("AAPL", "2020~2024", "matrix\n", 10.0, 5.0)
+    assert "逾時" in ai_analysis.wait(future, timeout=0.1)
+    # 已送出的請求由 client 的 HTTP 逾時結束，不會等到伺服器回應
+    assert future.result(timeout=10).startswith("AI 分析失敗")
+    assert time.perf_counter() - t0 < 3.0
+
+
+def test_wait_all_shares_one_deadline(gemini, monkeypatch):
+    gemini(delay=1.0)
+    monkeypatch.setattr(ai_analysis, 'AI_TIMEOUT', 3.0)
+    futures = {t: ai_analysis.submit_analysis(t, "2020~2024", f"{t} matrix\n", 10.0, 5.0) for t in ("A", "B", "C")}
+
+    t0 = time.perf_counter()
+    reports = ai_analysis.wait_all(futures, timeout=0.3)
+    # 一次等待就涵蓋所有分析，而不是每份各等 0.3 秒
+    assert time.perf_counter() - t0 < 0.6
+    assert list(reports) == ["A", "B", "C"]
+    assert all("逾時" in text for text in reports.values())
+
+
+def test_wait_all_returns_every_finished_analysis(gemini):
+    gemini()
+    futures = {t: ai_analysis.submit_analysis(t, "2020~2024", f"{t} matrix\n", 10.0, 5.0) for t in ("A", "B")}
+    assert ai_analysis.wait_all(futures, timeout=30) == {"A": "假的量化分析", "B": "假的量化分析"}
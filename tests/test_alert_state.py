@@ -0,0 +1,49 @@
+import alert_state
+
+
+ITEM = {"ticker": "2330.TW", "name": "台積電"}
+
+
+def test_first_seen_normal_does_not_alert():
+    assert not alert_state.is_transition({}, ITEM, "正常")
+
+
+def test_first_seen_non_normal_alerts():
+    assert alert_state.is_transition({}, ITEM, "⚠️ 跌幅達標")
+
+
+def test_status_change_alerts():
+    state = {}
+    alert_state.record(state, ITEM, "正常", 100)
+    assert not alert_state.is_transition(state, ITEM, "正常")
+    assert alert_state.is_transition(state, ITEM, "⚠️ 跌幅達標")
+
+
+def test_transient_status_keeps_previous_record():
+    state = {}
+    alert_state.record(state, ITEM, "⚠️ 跌幅達標", 100)
+    before = dict(state[alert_state.state_key(ITEM)])
+    for status in alert_state.TRANSIENT_STATUSES:
+        assert not alert_state.is_transition(state, ITEM, status)
+        alert_state.record(state, ITEM, status)
+    assert state[alert_state.state_key(ITEM)] == before
+    assert not alert_state.is_transition(state, ITEM, "⚠️ 跌幅達標")
+
+
+def test_state_round_trip(tmp_path):
+    path = str(tmp_path / "state.json")
+    state = {}
+    alert_state.record(state, ITEM, "🔥 入手時機", 512.5)
+    alert_state.save_state(state, path)
+    assert alert_state.load_state(path) == state
+
+
+def test_corrupt_state_file_is_recovered(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text('{"2330.TW|台積電": {"status": ', encoding='utf-8')
+    state = alert_state.load_state(str(path))
+    assert state == {}
+    # 壞掉的狀態檔視為首次執行，之後可以正常覆寫
+    alert_state.record(state, ITEM, "正常", 100)
+    alert_state.save_state(state, str(path))
+    assert alert_state.load_state(str(path)) == state
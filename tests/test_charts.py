@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import charts
+
+
+def reference_lttb(y, n_out):
+    """Textbook LTTB, one bucket at a time."""
+    n = len(y)
+    x = np.arange(n, dtype=np.float64)
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    out, a = [0], 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out.append(a)
+    return np.array(out + [n - 1])
+
+
+@pytest.mark.parametrize("n, n_out", [(3800, 2000), (10_000, 500), (2001, 2000), (60, 12)])
+def test_lttb_keeps_endpoints_and_extremes(n, n_out):
+    rng = np.random.default_rng(n)
+    y = 10000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    # 明顯的尖峰與深谷一定要留下來
+    y[n // 3] *= 3
+    y[2 * n // 3] /= 3
+    idx = charts.lttb(y, n_out)
+
+    assert len(idx) == n_out
+    assert idx[0] == 0 and idx[-1] == n - 1
+    assert np.all(np.diff(idx) > 0)
+    assert np.argmax(y) in idx and np.argmin(y) in idx
+    np.testing.assert_array_equal(idx, reference_lttb(y, n_out))
+
+
+def test_lttb_returns_everything_when_short():
+    y = np.arange(10.0)
+    np.testing.assert_array_equal(charts.lttb(y, 20), np.arange(10))
+    np.testing.assert_array_equal(charts.lttb(y, 2), np.arange(10))
+
+
+def test_render_decimates_every_curve_longer_than_max_points(tmp_path, monkeypatch):
+    pytest.importorskip("matplotlib")
+    calls = []
+    lttb = charts.lttb
+    monkeypatch.setattr(charts, 'lttb', lambda y, n_out, x=None: calls.append((len(y), n_out)) or lttb(y, n_out, x))
+
+    n = 3800
+    dates = pd.bdate_range("2010-01-01", periods=n).to_numpy()
+    series = [('A', np.linspace(1, 2, n), {}), ('B', None, {})]
+    path = charts.render_equity(str(tmp_path / "c.png"), dates, series, "t", max_points=2000)
+    assert (tmp_path / "c.png").exists() and path.endswith("c.png")
+    assert calls == [(n, 2000)]
+
+    calls.clear()
+    charts.render_equity(str(tmp_path / "d.png"), dates[:2000], [('A', np.ones(2000), {})], "t", max_points=2000)
+    assert calls == []
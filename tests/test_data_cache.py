@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+import data_cache
+import data_provider
+
+
+def test_local_files_without_open_or_volume(tmp_path, monkeypatch):
+    pd.DataFrame({
+        'date': pd.date_range("2024-01-01", periods=5, freq="D").strftime("%Y-%m-%d"),
+        'high': [11.0, 12, 13, 14, 15],
+        'low': [9.0, 10, 11, 12, 13],
+        'close': [10.0, 11, 12, 13, 14]
+    }).to_csv(tmp_path / "TEST.csv", index=False)
+    monkeypatch.setattr(data_provider, '_active', data_provider.LocalFileProvider(str(tmp_path)))
+
+    frames = data_cache.load_many(["TEST"], "2024-01-01", "2024-02-01")
+    df = frames["TEST"]
+    assert list(df.columns) == data_cache.COLUMNS
+    assert df.index.name == 'Date'
+    assert df['Open'].isna().all() and df['Volume'].isna().all()
+    np.testing.assert_array_equal(df['Close'].to_numpy(), [10.0, 11, 12, 13, 14])
+
+
+class AdjustingProvider:
+    """Cacheable stand-in for yfinance whose adjusted prices can be rescaled, like after a split."""
+
+    name = "adjusting"
+    cacheable = True
+
+    def __init__(self):
+        self.index = pd.bdate_range("2024-01-01", periods=120)
+        self.close = np.linspace(100.0, 130.0, len(self.index))
+        self.scale = 1.0
+        self.calls = []
+
+    def fetch(self, tickers, start, end):
+        self.calls.append((start, end))
+        mask = (self.index >= pd.Timestamp(start)) & (self.index < pd.Timestamp(end))
+        close = self.close[mask] * self.scale
+        df = pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1.0},
+                          index=self.index[mask])
+        return {t: df for t in tickers}
+
+
+def test_cache_is_rebuilt_when_the_adjustment_basis_changes(tmp_path, monkeypatch):
+    from datetime import timedelta
+
+    provider = AdjustingProvider()
+    monkeypatch.setattr(data_cache, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(data_cache, 'FRESHNESS', timedelta(0))
+    monkeypatch.setattr(data_provider, '_active', provider)
+
+    # 先快取前 100 根，再延長：價格基準不變時只補抓尾端
+    provider.index, full_index = provider.index[:100], provider.index
+    provider.close, full_close = provider.close[:100], provider.close
+    data_cache.load_many(["TEST"], "2024-01-01")
+    provider.index, provider.close = full_index, full_close
+    df = data_cache.load_many(["TEST"], "2024-01-01")["TEST"]
+    assert len(provider.calls) == 2 and provider.calls[1][0] == full_index[98].to_pydatetime()
+    np.testing.assert_allclose(df['Close'].to_numpy(), full_close)
+
+    # 1 拆 2 之後整段歷史都會改變，快取必須整段重抓而不是只接上新的 K 棒
+    provider.scale = 0.5
+    df = data_cache.load_many(["TEST"], "2024-01-01")["TEST"]
+    assert len(provider.calls) == 4 and provider.calls[3][0] == full_index[0].to_pydatetime()
+    np.testing.assert_allclose(df['Close'].to_numpy(), full_close * 0.5)
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+from data_provider import synthetic_ohlcv
+from strategy_kernel import run_atr_kernel, run_sma_kernel
+
+FEE = 0.005
+TAX = 0.0
+
+
+def reference_c_d(df, sma_window=20, cooldown=3, atr_window=14, multiplier=3.0,
+                  trading_fee_rate=FEE, sell_tax_rate=TAX, initial_capital=10000):
+    """The original Strategy C and D loops of backtest_trand.run_backtest, with their constants as arguments."""
+    slippage = 0.001
+    first_price = float(df['Close'].iloc[0])
+    last_price = float(df['Close'].iloc[-1])
+
+    df_c = df.copy()
+    df_c['SMA'] = df_c['Close'].rolling(window=sma_window).mean()
+    cap_c = initial_capital
+    shares_c = 0
+    in_pos_c = False
+    last_trans_day_c = -999
+    history_c = []
+    trans_c = 0
+
+    for i, (idx, row) in enumerate(df_c.iterrows()):
+        current_price = float(row['Close'])
+        current_sma = float(row['SMA'])
+        if pd.isna(current_sma):
+            pass
+        else:
+            if (i - last_trans_day_c) >= cooldown:
+                if current_price > current_sma and not in_pos_c:
+                    cap_c = (cap_c / (1 + trading_fee_rate + slippage))
+                    shares_c = cap_c / current_price
+                    cap_c = 0
+                    in_pos_c = True
+                    trans_c += 1
+                    last_trans_day_c = i
+                elif current_price < current_sma and in_pos_c:
+                    sell_proceeds = shares_c * current_price
+                    cap_c = sell_proceeds * (1 - trading_fee_rate - sell_tax_rate - slippage)
+                    shares_c = 0
+                    in_pos_c = False
+                    trans_c += 1
+                    last_trans_day_c = i
+
+        current_val_c = cap_c
+        if in_pos_c:
+            current_val_c = (shares_c * current_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
+        history_c.append(current_val_c)
+
+    df_d = df.copy()
+    high_low = df_d['High'] - df_d['Low']
+    high_close = (df_d['High'] - df_d['Close'].shift()).abs()
+    low_close = (df_d['Low'] - df_d['Close'].shift()).abs()
+    ranges = pd.concat([high_low, high_close, low_close], axis=1)
+    true_range = ranges.max(axis=1)
+    df_d['ATR'] = true_range.rolling(atr_window).mean()
+
+    cap_d = initial_capital
+    shares_d = (cap_d / (1 + trading_fee_rate + slippage)) / first_price
+    cap_d = 0
+    in_pos_d = True
+    peak_price = first_price
+    valley_price = first_price
+    history_d = []
+    trans_d = 1
+
+    for i, (idx, row) in enumerate(df_d.iterrows()):
+        current_price = float(row['Close'])
+        current_atr = float(row['ATR'])
+
+        if pd.isna(current_atr):
+            pass
+        else:
+            dynamic_t = (current_atr * multiplier) / current_price
+            if in_pos_d:
+                if current_price > peak_price: peak_price = current_price
+                if current_price <= peak_price * (1 - dynamic_t):
+                    sell_proceeds = shares_d * current_price
+                    cap_d = sell_proceeds * (1 - trading_fee_rate - sell_tax_rate - slippage)
+                    shares_d = 0
+                    in_pos_d = False
+                    valley_price = current_price
+                    trans_d += 1
+            else:
+                if current_price < valley_price: valley_price = current_price
+                if current_price >= valley_price * (1 + dynamic_t):
+                    cap_d = (cap_d / (1 + trading_fee_rate + slippage))
+                    shares_d = cap_d / current_price
+                    cap_d = 0
+                    in_pos_d = True
+                    peak_price = current_price
+                    trans_d += 1
+
+        current_val_d = cap_d
+        if in_pos_d:
+            current_val_d = (shares_d * current_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
+        history_d.append(current_val_d)
+
+    final_val_c = cap_c
+    if in_pos_c:
+        final_val_c = (shares_c * last_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
+    final_val_d = cap_d
+    if in_pos_d:
+        final_val_d = (shares_d * last_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
+    return (final_val_c, trans_c, np.array(history_c)), (final_val_d, trans_d, np.array(history_d))
+
+
+def ohlcv(seed, n=800):
+    df = synthetic_ohlcv(n, seed=seed)
+    df.iloc[[40, 41, 500], :] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("sma_window, cooldown, atr_window, multiplier",
+                         [(20, 3, 14, 3.0), (5, 0, 3, 0.5), (10, 1, 7, 1.5), (30, 10, 28, 4.0)])
+def test_engine_matches_reference_loops(seed, sma_window, cooldown, atr_window, multiplier):
+    df = ohlcv(seed)
+    res = engine.run_backtest(df, "TEST", engine.standard_strategies(
+        sma_window=sma_window, cooldown=cooldown, atr_window=atr_window, atr_multiplier=multiplier))
+    (final_c, trans_c, history_c), (final_d, trans_d, history_d) = reference_c_d(
+        df, sma_window, cooldown, atr_window, multiplier)
+
+    assert float(res['c']['final']) == final_c
+    assert int(res['c']['trades']) == trans_c
+    np.testing.assert_array_equal(res['c']['equity'], history_c)
+    assert float(res['d']['final']) == final_d
+    assert int(res['d']['trades']) == trans_d
+    np.testing.assert_array_equal(res['d']['equity'], history_d)
+
+
+def test_parameter_sweeps_match_reference_loops():
+    df = ohlcv(2)
+    close, high, low = (df[c].to_numpy() for c in ('Close', 'High', 'Low'))
+    windows = np.array([5, 5, 20, 20, 30])
+    cooldowns = np.array([0, 2, 3, 1, 5])
+    multipliers = np.array([0.5, 1.0, 2.0, 3.0, 4.5])
+    sma = run_sma_kernel(close, windows, cooldowns, FEE, TAX)
+    atr = run_atr_kernel(high, low, close, windows, multipliers, FEE, TAX)
+
+    for k in range(len(windows)):
+        (final_c, trans_c, _), (final_d, trans_d, _) = reference_c_d(
+            df, windows[k], cooldowns[k], windows[k], multipliers[k])
+        assert sma['final'][k] == final_c
+        assert sma['trades'][k] == trans_c
+        assert atr['final'][k] == final_d
+        assert atr['trades'][k] == trans_d
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from monitor_daemon import RollingExtremes
+
+
+def daily_bars(seed, n=200):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = close * (1 + rng.normal(0, 0.01, n))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, n))
+    # 重複的高低點，檢查相等值在佇列中的處理
+    high[n // 4:n // 4 + 5] = high[n // 4:n // 4 + 5].max()
+    low[n // 3:n // 3 + 4] = low[n // 3:n // 3 + 4].min()
+    days = pd.bdate_range("2024-01-01", periods=n).date
+    return days, open_, high, low, close
+
+
+@pytest.mark.parametrize("lookback", [2, 5, 30])
+def test_rolling_extremes_match_pandas_rolling(lookback):
+    days, open_, high, low, close = daily_bars(lookback)
+    expected_peak = pd.Series(high).rolling(lookback, min_periods=1).max().to_numpy()
+    expected_valley = pd.Series(low).rolling(lookback, min_periods=1).min().to_numpy()
+
+    extremes = RollingExtremes(lookback)
+    for k, day in enumerate(days):
+        # 每天兩筆報價：開盤時只知道開盤價，收盤時才有完整的高低點
+        extremes.update(day, open_[k])
+        extremes.update(day, close[k], high[k], low[k])
+        res = extremes.trends()
+        if k == 0:
+            assert res is None
+            continue
+        assert res['peak'] == expected_peak[k]
+        assert res['valley'] == expected_valley[k]
+        assert res['price'] == close[k]
+        assert res['daily_change'] == pytest.approx((close[k] - close[k - 1]) / close[k - 1] * 100)
+        # 佇列最多只保留視窗內的 K 棒
+        assert len(extremes._max) <= lookback and len(extremes._min) <= lookback
+
+
+def test_seeded_window_matches_pandas_rolling():
+    days, _, high, low, close = daily_bars(1, n=60)
+    df = pd.DataFrame({'High': high, 'Low': low, 'Close': close}, index=pd.DatetimeIndex(days))
+    extremes = RollingExtremes(30)
+    extremes.seed(df)
+    res = extremes.trends()
+    assert res['peak'] == high[-30:].max()
+    assert res['valley'] == low[-30:].min()
+    assert res['price'] == close[-1]
+
+
+def test_spike_evicted_exactly_at_window_edge():
+    lookback = 5
+    days = pd.bdate_range("2024-01-01", periods=12).date
+    extremes = RollingExtremes(lookback)
+    peaks = []
+    for k, day in enumerate(days):
+        price = 200.0 if k == 3 else 100.0
+        extremes.update(day, price)
+        peaks.append(extremes.trends()['peak'] if k else None)
+    # 第 3 天的高點在第 3..7 天都在視窗內，第 8 天剛好被移出
+    assert peaks[3:8] == [200.0] * lookback
+    assert peaks[8] == 100.0
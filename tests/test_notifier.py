@@ -0,0 +1,91 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import notifier
+
+
+class StubNtfy:
+    """Local stand-in for an ntfy server: records every POST and answers with scripted status codes."""
+
+    def __init__(self, statuses=(), default=200):
+        self.statuses = list(statuses)
+        self.default = default
+        self.requests = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+                title = self.headers['Title'].encode('latin-1').decode('utf-8')
+                with stub.lock:
+                    stub.requests.append((self.path, title, body))
+                    status = stub.statuses.pop(0) if stub.statuses else stub.default
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    calls = []
+    monkeypatch.setattr(notifier.time, 'sleep', calls.append)
+    return calls
+
+
+def test_oversized_report_is_split_and_delivered(monkeypatch, sleeps):
+    blocks = [f"📈 標的 {i:03d}\n" + "價格變動 " * 60 for i in range(40)]
+    with StubNtfy() as stub:
+        monkeypatch.setenv("NTFY_SERVER", stub.url)
+        failed = notifier.send_report("topic", "每日報告", blocks)
+
+    assert failed == 0
+    assert len(stub.requests) > 1
+    assert all(len(body.encode('utf-8')) <= notifier.MAX_MESSAGE_BYTES for _, _, body in stub.requests)
+    assert {path for path, _, _ in stub.requests} == {"/topic"}
+    total = len(stub.requests)
+    assert sorted(title for _, title, _ in stub.requests) == sorted(f"每日報告 ({i}/{total})" for i in range(1, total + 1))
+    # 區塊不會被切開，每個區塊都完整出現在恰好一則通知中
+    for block in blocks:
+        assert sum(block in body for _, _, body in stub.requests) == 1
+    assert sleeps == []
+
+
+def test_retries_server_errors_with_exponential_backoff(sleeps):
+    with StubNtfy(statuses=[503, 502]) as stub:
+        failed = notifier.send_report("topic", "報告", "內容", server=stub.url)
+
+    assert failed == 0
+    assert len(stub.requests) == 3
+    assert sleeps == [notifier.BACKOFF, notifier.BACKOFF * 2]
+
+
+def test_counts_messages_that_still_fail(sleeps):
+    blocks = ["x" * 3000, "y" * 3000]
+    with StubNtfy(default=500) as stub:
+        failed = notifier.send_report("topic", "報告", blocks, server=stub.url)
+    assert failed == 2
+    assert len(stub.requests) == 2 * (notifier.RETRIES + 1)
+
+    # 4xx 不重試，直接計為失敗
+    with StubNtfy(default=404) as stub:
+        failed = notifier.send_report("topic", "報告", "內容", server=stub.url)
+    assert failed == 1
+    assert len(stub.requests) == 1
@@ -0,0 +1,30 @@
+import numpy as np
+
+import optimizer
+from data_provider import synthetic_ohlcv
+
+
+def test_adaptive_search_reuses_one_pool_across_rounds(monkeypatch):
+    close = synthetic_ohlcv(2_000, seed=1)['Close'].to_numpy()
+    thresholds = np.linspace(0.01, 0.3, 30)
+    pools = []
+    make_pool = optimizer._pool
+    monkeypatch.setattr(optimizer, '_pool', lambda data, workers: pools.append(workers) or make_pool(data, workers))
+
+    parallel = optimizer.optimize_grid(close, thresholds, thresholds, 0.005, 0.0, workers=2, chunk_size=16,
+                                       search='adaptive', budget=300, progress=False)
+    serial = optimizer.optimize_grid(close, thresholds, thresholds, 0.005, 0.0, workers=1,
+                                     search='adaptive', budget=300, progress=False)
+    assert pools == [2]
+    np.testing.assert_array_equal(parallel['final'], serial['final'])
+    np.testing.assert_array_equal(parallel['trades'], serial['trades'])
+
+
+def test_parallel_sweeps_match_in_process():
+    df = synthetic_ohlcv(2_000, seed=2)
+    high, low, close = (df[c].to_numpy() for c in ('High', 'Low', 'Close'))
+    windows, multipliers = np.array([7, 14, 21]), np.array([1.5, 2.5, 3.5])
+    parallel = optimizer.sweep_atr(high, low, close, windows, multipliers, 0.005, 0.0, workers=2, chunk_size=2,
+                                   progress=False)
+    serial = optimizer.sweep_atr(high, low, close, windows, multipliers, 0.005, 0.0, workers=1, progress=False)
+    np.testing.assert_array_equal(parallel['final'], serial['final'])
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from portfolio import INITIAL_CAPITAL, hold_equity, run_portfolio
+from strategy_kernel import HoldStrategy, TrendStrategy, run_strategies
+
+
+def panel(seed, n_bars=500, n=6, first=None):
+    """(T, N) closes where bars before first[k] repeat the first quote, as align_closes produces."""
+    rng = np.random.default_rng(seed)
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.025, (n_bars, n)), axis=0))
+    first = np.zeros(n, dtype=np.int64) if first is None else np.asarray(first, dtype=np.int64)
+    for k, f in enumerate(first):
+        close[:f, k] = close[f, k]
+    return close, first
+
+
+def costs(n):
+    buy_cost = np.where(np.arange(n) % 2 == 0, 1.002, 1.006)
+    return buy_cost, 2 - buy_cost
+
+
+@pytest.mark.parametrize("first", [None, [0, 5, 120, 0, 300, 499]])
+def test_sleeve_equals_sum_of_per_ticker_strategy_b(first):
+    close, first = panel(1, first=first)
+    n = close.shape[1]
+    buy_cost, sell_keep = costs(n)
+    buy_t = np.linspace(0.03, 0.15, n)
+    sell_t = np.linspace(0.12, 0.04, n)
+    weights = np.arange(1, n + 1, dtype=np.float64)
+    res = run_portfolio(close, first, buy_t, sell_t, buy_cost, sell_keep, weights=weights, allocation='sleeve')
+
+    sleeves = weights / weights.sum() * INITIAL_CAPITAL
+    finals = []
+    for k in range(n):
+        # 每檔標的等同從進場那根 K 棒開始，以自己的資金單獨跑 Strategy B
+        b = run_strategies(close[first[k]:, k], [TrendStrategy(buy_t[k], sell_t[k])], buy_cost[k], sell_keep[k],
+                           initial_capital=sleeves[k])[0]
+        finals.append(float(b['final']))
+        assert res['trades'][k] == int(b['trades'])
+    assert res['equity'][-1] == pytest.approx(sum(finals), rel=1e-12)
+
+
+def test_pool_never_spends_more_than_it_holds():
+    close, first = panel(2, n=12, first=[0, 0, 0, 0, 3, 3, 40, 40, 40, 41, 200, 200])
+    buy_cost, sell_keep = costs(12)
+    weights = np.where(first > 0, 20.0, 1.0)
+    res = run_portfolio(close, first, 0.02, 0.02, buy_cost, sell_keep, weights=weights, allocation='pool')
+
+    assert np.all(res['cash'] >= -1e-9 * INITIAL_CAPITAL)
+    np.testing.assert_allclose(res['equity'], res['cash'] + res['holdings'].sum(axis=1), rtol=1e-12)
+    assert np.all(res['exposure'] <= 1 + 1e-12)
+
+
+def test_pool_scales_entries_down_to_the_cash_it_holds():
+    # 標的 0 一路上漲、一直持有；標的 1 在第 10 根賣出、第 12 根買回。
+    # 買回時依權重要求 0.5 x 組合淨值，但現金池只有賣出所得，只能全數投入
+    close = np.empty((20, 2))
+    close[:, 0] = np.linspace(100, 200, 20)
+    close[:, 1] = 100.0
+    close[10:12, 1] = 80.0
+    close[12:, 1] = 90.0
+    res = run_portfolio(close, np.zeros(2, dtype=np.int64), 0.1, 0.1, 1.0, 1.0, allocation='pool')
+
+    proceeds = INITIAL_CAPITAL / 2 / 100 * 80
+    assert res['cash'][10] == pytest.approx(proceeds)
+    assert 0.5 * res['equity'][12] > proceeds
+    assert abs(res['cash'][12]) < 1e-6
+    assert res['holdings'][12, 1] == pytest.approx(proceeds)
+    assert np.all(res['cash'] >= -1e-9)
+
+
+def test_single_ticker_pool_matches_strategy_b():
+    close, first = panel(3, n=1)
+    res = run_portfolio(close, first, 0.08, 0.06, 1.004, 0.993, allocation='pool')
+    b = run_strategies(close[:, 0], [TrendStrategy(0.08, 0.06)], 1.004, 0.993, initial_capital=INITIAL_CAPITAL,
+                       record_equity=True)[0]
+    np.testing.assert_allclose(res['equity'], b['equity'], rtol=1e-12)
+
+
+def test_hold_equity_matches_hold_strategy_per_ticker():
+    close, first = panel(4, first=[0, 10, 0, 250, 30, 499])
+    n = close.shape[1]
+    buy_cost, sell_keep = costs(n)
+    equity = hold_equity(close, first, buy_cost, sell_keep)
+
+    sleeve = INITIAL_CAPITAL / n
+    expected = np.zeros(len(close))
+    for k in range(n):
+        a = run_strategies(close[first[k]:, k], [HoldStrategy()], buy_cost[k], sell_keep[k],
+                           initial_capital=sleeve, record_equity=True)[0]
+        expected[:first[k]] += sleeve
+        expected[first[k]:] += a['equity']
+    np.testing.assert_allclose(equity, expected, rtol=1e-12)
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+import results_store
+from backtest_time import walk_forward
+from data_provider import synthetic_ohlcv
+from rolling import run_rolling, window_ranges
+
+FEE = 0.005
+TAX = 0.0
+
+
+def test_incremental_rolling_reuses_windows_for_scalar_and_grid_thresholds(tmp_path):
+    conn = results_store.connect(str(tmp_path / "results.db"))
+    df = synthetic_ohlcv(1_000, seed=2)
+    close = df['Close'].to_numpy()
+    i0 = np.arange(0, 600, 50)
+    i1 = i0 + 300
+    buy, sell = np.array([0.03, 0.05, 0.1]), np.array([0.1, 0.05, 0.03])
+
+    for buy_t, sell_t in [(0.1, 0.1), (buy, sell)]:
+        calls = []
+
+        def compute(a, b):
+            calls.append(len(a))
+            return run_rolling(close, a, b, buy_t, sell_t, FEE, TAX, workers=1)
+
+        first, reused = results_store.incremental_rolling(conn, "TEST", close, df.index, i0, i1,
+                                                          buy_t, sell_t, FEE, TAX, compute)
+        assert reused == 0
+        again, reused = results_store.incremental_rolling(conn, "TEST", close, df.index, i0, i1,
+                                                          buy_t, sell_t, FEE, TAX, compute)
+        assert reused == len(i0) and calls == [len(i0)]
+        for name in ('roi_a', 'roi_b', 'trades'):
+            assert np.shape(again[name]) == np.shape(first[name])
+            np.testing.assert_array_equal(again[name], first[name])
+
+
+def test_walk_forward_uses_the_results_store(tmp_path):
+    df = synthetic_ohlcv(1_500, seed=3, index=pd.bdate_range("2015-01-01", periods=1_500))
+    start, end = df.index[0].to_pydatetime(), df.index[-1].to_pydatetime()
+    ranges = window_ranges(start, end, 12, 'quarterly')
+    grid = np.array([0.03, 0.06, 0.09])
+    args = (df, "TEST", ranges, end, grid, grid, relativedelta(months=3))
+
+    plain, cached = walk_forward(*args, workers=1)
+    assert plain and cached == 0
+    conn = results_store.connect(str(tmp_path / "results.db"))
+    stored, cached = walk_forward(*args, workers=1, conn=conn)
+    assert cached == 0
+    rerun, cached = walk_forward(*args, workers=1, conn=conn)
+    assert cached == len(plain)
+    assert [(r['buy_t'], r['sell_t'], r['roi_b']) for r in rerun] == [(r['buy_t'], r['sell_t'], r['roi_b']) for r in plain]
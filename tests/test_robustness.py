@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import engine
+from robustness import bootstrap_paths, run_bootstrap
+from strategy_kernel import run_trend_kernel
+
+COSTS = engine.fee_model("2330.TW")
+
+
+def random_close(seed, n=300):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+
+
+@pytest.mark.parametrize("block", [1, 7, 20, 299])
+def test_paths_are_glued_blocks_of_historical_returns(block):
+    close = random_close(1)
+    log_ret = np.diff(np.log(close))
+    paths = bootstrap_paths(close, 40, block, rng=123)
+    assert paths.shape == (len(close), 40)
+    assert np.all(paths[0] == close[0])
+    np.testing.assert_array_equal(paths, bootstrap_paths(close, 40, block, rng=123))
+
+    path_ret = np.diff(np.log(paths), axis=0)
+    for p in range(paths.shape[1]):
+        for j in range(0, len(log_ret), block):
+            chunk = path_ret[j:j + block, p]
+            # 每個區塊的第一筆報酬決定它在歷史中的起點，整段都要是連續的歷史報酬
+            start = np.argmin(np.abs(log_ret - chunk[0]))
+            assert start + block <= len(log_ret)
+            np.testing.assert_allclose(chunk, log_ret[start:start + len(chunk)], rtol=0, atol=1e-12)
+
+
+def test_full_length_block_reproduces_the_original_series():
+    close = random_close(2)
+    paths = bootstrap_paths(close, 5, block=len(close) - 1, rng=0)
+    np.testing.assert_allclose(paths, np.repeat(close[:, None], 5, axis=1), rtol=1e-12)
+    # 區塊長度超過報酬筆數時也截成整段
+    np.testing.assert_array_equal(paths, bootstrap_paths(close, 5, block=10 * len(close), rng=0))
+
+
+def test_run_bootstrap_shapes_and_full_block_matches_history():
+    close = random_close(3)
+    buy, sell = [0.05, 0.1], [0.05, 0.1, 0.15]
+    res = run_bootstrap(close, buy, sell, COSTS['buy_cost'], COSTS['sell_keep'], n_paths=10,
+                        block=len(close), workers=1, chunk_size=4)
+    assert res['roi_a'].shape == (10,)
+    assert res['roi_b'].shape == res['trades'].shape == (10, 6)
+
+    hold = (COSTS['sell_keep'] / COSTS['buy_cost'] * close[-1] / close[0] - 1) * 100
+    np.testing.assert_allclose(res['roi_a'], hold, rtol=1e-9)
+    for k, (b, s) in enumerate(zip(res['buy'], res['sell'])):
+        single = run_trend_kernel(close, b, s, COSTS['fee'], COSTS['tax'])
+        np.testing.assert_allclose(res['roi_b'][:, k], (float(single['final']) / 10000 - 1) * 100, rtol=1e-9)
+        assert np.all(res['trades'][:, k] == int(single['trades']))
+
+
+def test_result_does_not_depend_on_workers():
+    close = random_close(4)
+    args = (close, [0.05, 0.1], [0.1], COSTS['buy_cost'], COSTS['sell_keep'])
+    one = run_bootstrap(*args, n_paths=20, block=10, seed=5, workers=1, chunk_size=8)
+    two = run_bootstrap(*args, n_paths=20, block=10, seed=5, workers=2, chunk_size=8)
+    for key in ('roi_a', 'roi_b', 'trades'):
+        np.testing.assert_array_equal(one[key], two[key])
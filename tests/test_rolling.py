@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from rolling import run_rolling
+from strategy_kernel import run_trend_kernel
+
+FEE = 0.005
+TAX = 0.0
+
+
+@pytest.mark.parametrize("buy_t, sell_t", [(0.1, 0.1), (0.0, 0.05), (0.05, 0.0)])
+def test_windows_of_different_length_match_single_window_runs(buy_t, sell_t):
+    rng = np.random.default_rng(7)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 400)))
+    i0 = np.array([0, 30, 100, 250])
+    i1 = np.array([200, 90, 380, 400])
+    res = run_rolling(close, i0, i1, buy_t, sell_t, FEE, TAX, workers=1)
+
+    for k, (a, b) in enumerate(zip(i0, i1)):
+        single = run_trend_kernel(close[a:b], buy_t, sell_t, FEE, TAX)
+        assert res['roi_b'][k] == (float(single['final']) / 10000 - 1) * 100
+        assert res['trades'][k] == int(single['trades'])
+
+
+def test_pair_axis_matches_scalar_runs():
+    rng = np.random.default_rng(8)
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.03, 300)))
+    i0, i1 = np.array([0, 120]), np.array([150, 300])
+    buy_t, sell_t = np.array([0.0, 0.1]), np.array([0.1, 0.0])
+    res = run_rolling(close, i0, i1, buy_t, sell_t, FEE, TAX, workers=1)
+    for p, (bt, st) in enumerate(zip(buy_t, sell_t)):
+        scalar = run_rolling(close, i0, i1, bt, st, FEE, TAX, workers=1)
+        np.testing.assert_array_equal(res['roi_b'][:, p], scalar['roi_b'])
+        np.testing.assert_array_equal(res['roi_a'], scalar['roi_a'])
+
+
+def test_padding_of_short_windows_does_not_trade_with_zero_buy_threshold():
+    close = np.linspace(100, 120, 200)
+    # 短視窗的最後一根大跌而賣出；以 0 買入門檻時，補齊的 K 棒若等於最後收盤價就會立刻買回
+    close[49] = 90
+    res = run_rolling(close, np.array([0, 0]), np.array([50, 200]), 0.0, 0.1, FEE, TAX, workers=1)
+    single = run_trend_kernel(close[:50], 0.0, 0.1, FEE, TAX)
+    assert res['trades'][0] == int(single['trades']) == 2
+    assert res['roi_b'][0] == (float(single['final']) / 10000 - 1) * 100
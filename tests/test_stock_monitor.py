@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from stock_monitor import calculate_wide_trends
+
+
+def reference_trends(data):
+    """The original per-ticker calculate_dynamic_trends (dropna, last 30 bars)."""
+    data = data.dropna()
+    if data.empty or len(data) < 2:
+        return None
+    lookback_period = data.tail(30)
+    peak_price = lookback_period['High'].max()
+    valley_price = lookback_period['Low'].min()
+    latest_price = data['Close'].iloc[-1]
+    prev_price = data['Close'].iloc[-2]
+    return {
+        "price": latest_price,
+        "daily_change": ((latest_price - prev_price) / prev_price) * 100,
+        "peak": peak_price,
+        "valley": valley_price,
+        "drop": ((latest_price - peak_price) / peak_price) * 100,
+        "recovery": ((latest_price - valley_price) / valley_price) * 100
+    }
+
+
+def wide_frame(seed=0, n=90, tickers=("AAA", "BBB", "CCC", "DDD", "EEE")):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2024-01-01", periods=n)
+    fields = {}
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n, len(tickers))), axis=0))
+    fields['Close'] = close
+    fields['High'] = close * (1 + rng.uniform(0, 0.02, close.shape))
+    fields['Low'] = close * (1 - rng.uniform(0, 0.02, close.shape))
+    frames = {f: pd.DataFrame(v, index=index, columns=list(tickers)) for f, v in fields.items()}
+
+    # 上市日期錯開、零星缺值 (只缺單一欄位也算整列無效)，以及幾乎沒有資料的標的
+    frames['Close'].loc[:index[40], 'BBB'] = np.nan
+    frames['High'].loc[:index[40], 'BBB'] = np.nan
+    frames['Low'].loc[:index[40], 'BBB'] = np.nan
+    for f in ('Close', 'High', 'Low'):
+        frames[f].loc[:index[-2], 'EEE'] = np.nan
+        frames[f].iloc[rng.choice(n, 12, replace=False), 0] = np.nan
+    frames['High'].iloc[[-1, -5], 2] = np.nan
+    frames['Close'].iloc[-1, 3] = np.nan
+    return pd.concat(frames, axis=1)
+
+
+def test_wide_trends_match_per_ticker_reference():
+    all_data = wide_frame()
+    trends = calculate_wide_trends(all_data)
+
+    for ticker in all_data['Close'].columns:
+        stock_data = pd.DataFrame({f: all_data[f][ticker] for f in ('High', 'Low', 'Close')})
+        expected = reference_trends(stock_data)
+        row = trends.loc[ticker]
+        if expected is None:
+            assert row.isna().all(), ticker
+            continue
+        for field, value in expected.items():
+            assert np.isclose(row[field], value, rtol=1e-12), (ticker, field)
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+from strategy_kernel import run_trend_kernel
+
+FEE = 0.001425 * 0.65
+TAX = 0.003
+
+
+def price_frame(seed, n=600, nan_bars=()):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    close[list(nan_bars)] = np.nan
+    index = pd.date_range("2015-01-01", periods=n, freq="B")
+    return pd.DataFrame({'Close': close}, index=index)
+
+
+def reference_backtest(df, buy_threshold, sell_threshold, trading_fee_rate=FEE, sell_tax_rate=TAX,
+                       initial_capital=10000):
+    """The original iterrows loop of backtest.run_backtest (Strategy A and B)."""
+    slippage = 0.001
+
+    first_price = float(df['Close'].iloc[0])
+    last_price = float(df['Close'].iloc[-1])
+    shares_a = (initial_capital / (1 + trading_fee_rate + slippage)) / first_price
+    final_a = (shares_a * last_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
+
+    cap_b = initial_capital
+    shares_b = (cap_b / (1 + trading_fee_rate + slippage)) / first_price
+    cap_b = 0
+    in_pos_b = True
+    peak_price = first_price
+    valley_price = first_price
+    history_b = []
+    trans_b = 1
+
+    for _, row in df.iterrows():
+        current_price = float(row['Close'])
+        if in_pos_b:
+            if current_price > peak_price: peak_price = current_price
+            if current_price <= peak_price * (1 - sell_threshold):
+                sell_proceeds = shares_b * current_price
+                cap_b = sell_proceeds * (1 - trading_fee_rate - sell_tax_rate - slippage)
+                shares_b = 0
+                in_pos_b = False
+                valley_price = current_price
+                trans_b += 1
+        else:
+            if current_price < valley_price: valley_price = current_price
+            if current_price >= valley_price * (1 + buy_threshold):
+                cap_b = (cap_b / (1 + trading_fee_rate + slippage))
+                shares_b = cap_b / current_price
+                cap_b = 0
+                in_pos_b = True
+                peak_price = current_price
+                trans_b += 1
+
+        current_val = cap_b
+        if in_pos_b:
+            current_val = (shares_b * current_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
+        history_b.append(current_val)
+
+    final_val_b = cap_b
+    if in_pos_b:
+        final_val_b = (shares_b * last_price) * (1 - trading_fee_rate - sell_tax_rate - slippage)
+    return final_a, final_val_b, trans_b, np.array(history_b)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("nan_bars", [(), (50, 51, 300)])
+def test_trend_kernel_matches_reference_loop(seed, nan_bars):
+    df = price_frame(seed, nan_bars=nan_bars)
+    buy_t = np.array([0.0, 0.02, 0.05, 0.1, 0.15])
+    sell_t = np.array([0.03, 0.0, 0.08, 0.1, 0.2])
+    res = run_trend_kernel(df['Close'].to_numpy(), buy_t, sell_t, FEE, TAX, record_equity=True)
+
+    for k, (bt, st) in enumerate(zip(buy_t, sell_t)):
+        _, final_b, trans_b, history_b = reference_backtest(df, bt, st)
+        assert res['final'][k] == final_b
+        assert res['trades'][k] == trans_b
+        np.testing.assert_array_equal(res['equity'][:, k], history_b)
+
+
+def test_engine_matches_reference_loop_with_trailing_liquidation():
+    df = price_frame(3)
+    # 最後一根大跌，讓期末那根觸發賣出；另一組門檻則持有到期末清算
+    df.iloc[-1, 0] = df['Close'].iloc[-2] * 0.7
+    for bt, st, holding in [(0.1, 0.1, False), (0.1, 0.5, True)]:
+        res = engine.run_backtest(df, "2330.TW", engine.standard_strategies(bt, st))
+        final_a, final_b, trans_b, history_b = reference_backtest(df, bt, st)
+        assert float(res['a']['final']) == final_a
+        assert float(res['b']['final']) == final_b
+        assert int(res['b']['trades']) == trans_b
+        np.testing.assert_array_equal(res['b']['equity'], history_b)
+        # 交易次數為奇數代表期末仍持有 (初始買入算一次)
+        assert (trans_b % 2 == 1) == holding
+
+
+def test_scalar_scan_matches_vectorized_step():
+    from data_provider import synthetic_ohlcv
+    from strategy_kernel import AtrStrategy, HoldStrategy, SmaStrategy, TrendStrategy
+
+    df = synthetic_ohlcv(5_000, seed=9)
+    df.iloc[[10, 11, 2_000]] = np.nan
+
+    def plugins(wrap):
+        # 單一參數組走 scan()，長度 1 的參數向量走逐根 K 棒的 step()
+        return {'a': HoldStrategy(), 'b': TrendStrategy(wrap(0.05), wrap(0.0)),
+                'c': SmaStrategy(wrap(20), wrap(0)), 'd': AtrStrategy(wrap(14), wrap(2.5))}
+
+    scalar = engine.run_backtest(df, "TEST", plugins(lambda v: v))
+    vector = engine.run_backtest(df, "TEST", plugins(lambda v: np.array([v])))
+    for name in 'bcd':
+        assert float(scalar[name]['final']) == vector[name]['final'][0]
+        assert int(scalar[name]['trades']) == vector[name]['trades'][0]
+        np.testing.assert_array_equal(scalar[name]['equity'], vector[name]['equity'][:, 0])
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import engine
+import streaming
+from data_provider import synthetic_ohlcv
+
+
+def strategies():
+    return engine.standard_strategies(0.05, 0.05, sma_window=20, cooldown=3, atr_window=14, atr_multiplier=2.5)
+
+
+@pytest.mark.parametrize("chunk_size", [997, 5000, 100_000])
+def test_stream_matches_in_memory_backtest(tmp_path, chunk_size):
+    df = synthetic_ohlcv(12_000, seed=4)
+    path = str(tmp_path / "bars.npy")
+    streaming.save_records(df, path)
+
+    whole = engine.run_backtest(df, "TEST.TW", strategies(), record_equity=False)
+    streamed = streaming.run_stream(streaming.iter_chunks(path, chunk_size), "TEST.TW", strategies())
+    assert streamed['bars'] == len(df)
+    for name in 'abcd':
+        assert float(streamed[name]['final']) == float(whole[name]['final'])
+        assert int(streamed[name]['trades']) == int(whole[name]['trades'])
+
+
+def test_close_only_file_needs_high_low_for_strategy_d(tmp_path):
+    path = str(tmp_path / "close.npy")
+    np.save(path, synthetic_ohlcv(1_000, seed=1)['Close'].to_numpy())
+    assert streaming.available_fields(path) == ('close',)
+
+    with pytest.raises(ValueError, match="high, low"):
+        streaming.run_stream(streaming.iter_chunks(path, 300), "TEST", strategies())
+
+    res = streaming.run_stream(streaming.iter_chunks(path, 300), "TEST",
+                               engine.standard_strategies(0.05, 0.05, sma_window=20))
+    assert res['bars'] == 1_000 and int(res['c']['trades']) > 0